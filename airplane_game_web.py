@@ -1,16 +1,34 @@
-import pygame
-import random
-import math
-import json
 import asyncio
-from datetime import datetime
+import os
+import sys
+import time
+from startup import StartupTimer  # 起動時間の原点になるので pygame より先に読む
+import pygame
+from frame_clock import FixedStepClock
+from ghost import GhostError, GhostRecorder, GhostStore, GhostTrack
+from simulation import (
+    WIDTH, HEIGHT, ITEM_TYPES, INPUT_LEFT, INPUT_RIGHT,
+    ITEM_TYPE_NAMES, EVENT_CRASH, EVENT_PICKUP, Simulation, difficulty_level
+)
+from profiler import FrameProfiler
+from quality import QualityGovernor
+from renderer import DirtyRenderer, make_gradient_surface
+from sprites import COLORKEY, SpriteAtlas, make_sprite
+from text_cache import TextCache
+
+# 起動時間（startup.py）。最初のフレームと、プレイできるようになった時点を記録する
+startup = StartupTimer()
+STARTUP_LOG_PATH = "startup_times.jsonl"
 
 # Pygame-Web用の初期化
+# ここではメニューを出すのに要るものだけを用意し、NumPy を使うもの（シミュレーション・
+# パーティクル）、スプライト、ランキングはメニューを出したあとで load_game_steps() が読む
 pygame.init()
-WIDTH, HEIGHT = 800, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("ANA SKY NAVIGATOR - Web版")
 clock = pygame.time.Clock()
+# ルールは固定ティック、描画は 60/30/20fps のうち間に合うもの（frame_clock.py）
+frame_clock = FixedStepClock()
 
 # ANA風カラーパレット
 ANA_BLUE = (0, 51, 153)
@@ -28,195 +46,383 @@ PURPLE = (138, 43, 226)
 CYAN = (0, 255, 255)
 BLACK = (0, 0, 0)
 
-# Web版用スコア管理（localStorage代替）
-web_scores = []
-
-def save_web_score(name, score, time_survived):
-    global web_scores
-    new_score = {
-        "name": name,
-        "score": score,
-        "time": time_survived,
-        "date": datetime.now().strftime("%m-%d %H:%M")
-    }
-    web_scores.append(new_score)
-    web_scores.sort(key=lambda x: x["score"], reverse=True)
-    web_scores = web_scores[:10]  # トップ10のみ保持
+# 描画モード（False でダーティ矩形を使わず毎フレーム全面 flip）
+USE_DIRTY_RECTS = True
+# False で飛行機・雲・アイテムを毎フレーム図形として描く
+USE_SPRITE_ATLAS = True
+
+# 背景グラデーションは起動時に一度だけ描く
+background = make_gradient_surface(WIDTH, HEIGHT, SKY_BLUE, (200, 220, 255)).convert()
+renderer = DirtyRenderer(screen, background, USE_DIRTY_RECTS)
+flat_background = None
+
+# 画質（quality.py）。プレイ中の処理時間を見て段階的に落とし、余裕が戻れば戻す
+quality = QualityGovernor()
+# 内部解像度を下げる段で使う {縮小率: (描画先, アトラス)} と縮小した背景
+low_res_layers = {}
+low_res_background = None
+
+# Web版用スコア管理（追記ログ + 上位10件のヒープ。初回は ranking-data.json を取り込む）
+# 全記録の順位インデックスも持ち、全体順位と自己ベスト順位をその場で引ける
+LEADERBOARD_DIR = "leaderboard_data"
+leaderboard = None
+
+def save_web_score(name, score, time_survived, replay=None):
+    # replay は replay.py で検証できる入力記録。登録番号（seq）を返す
+    return leaderboard.submit(make_entry(name, score, time_survived, replay=replay))
 
 def get_web_ranking():
-    return web_scores
+    return leaderboard.top()
+
+def get_web_position(score, seq=None):
+    # 全プレイ中の順位（seq なしは未登録の得点として）と件数
+    index = leaderboard.index
+    return index.run_rank(score, seq), index.run_count()
 
-# アイテムタイプ定義
-ITEM_TYPES = {
-    "coin": {"points": 10, "color": GOLD, "size": 15},
-    "gem": {"points": 50, "color": CYAN, "size": 18},
-    "star": {"points": 100, "color": PINK, "size": 20},
-    "diamond": {"points": 200, "color": WHITE, "size": 22}
-}
+def get_player_standing(name):
+    # 自己ベストの順位・プレイヤー数・自己ベスト。記録がなければ None
+    index = leaderboard.index
+    best = index.player_best(name)
+    if best is None:
+        return None
+    return index.player_rank(name), index.player_count(), best
 
 # ゲーム状態
 game_state = "menu"
 player_name = ""
 input_active = False
 score_saved = False
+run_position = None
+
+# フレームプロファイラ（F3 でオーバーレイ表示、終了時に PROFILE_TRACE_PATH へ書き出し）
+profiler = FrameProfiler()
+PROFILE_TRACE_PATH = "profile_trace.json"
+
+# ゲーム本体（ルールは simulation.py）とリプレイ記録
+sim = None
+recorder = None
+# プレイ中のイベントの記録（telemetry.py）。集計は python telemetry.py TELEMETRY_DIR/*.snt
+TELEMETRY_DIR = os.path.join(LEADERBOARD_DIR, "telemetry")
+telemetry = None
 
-# 飛行機
-plane_x, plane_y = WIDTH // 2, HEIGHT - 100
-plane_speed = 6
-
-# ゲーム要素
-obstacles = []
-items = []
-particles = []
-game_time = 0
-start_time = 0
-score = 0
-
-# フォント設定（Web版用）
-try:
-    font = pygame.font.Font(None, 48)
-    small_font = pygame.font.Font(None, 28)
-    tiny_font = pygame.font.Font(None, 20)
-except:
-    font = pygame.font.SysFont("arial", 48)
-    small_font = pygame.font.SysFont("arial", 28)
-    tiny_font = pygame.font.SysFont("arial", 20)
-
-def get_difficulty_settings(time_elapsed):
-    base_obstacle_freq = max(30 - time_elapsed // 10, 10)
-    base_obstacle_speed = min(3 + time_elapsed // 15, 8)
-    base_scroll_speed = min(2 + time_elapsed // 20, 5)
+# ゴースト（ghost.py）。名前付きのプレイが上位 GHOST_COUNT 件に入れば登録番号ごとに軌跡を保存し
+# （圏外に押し出された軌跡は消す）、プレイ開始時にその GHOST_COUNT 件を開いて一緒に飛ばす
+GHOST_DIR = os.path.join(LEADERBOARD_DIR, "ghosts")
+GHOST_COUNT = 3
+ghost_recorder = GhostRecorder()
+# 保存してある上位 GHOST_COUNT 件（GhostStore.best）と、その書き込み・削除
+ghost_store = None
+# [(GhostTrack, 機体と名前を重ねた画像, 画像の中心 x)]
+ghosts = []
+ghost_sprite = None
+# 名前ごとの画像（make_ghost_image）。プレイのたびに作り直さない
+ghost_images = {}
+GHOST_ALPHA = 110
+
+# パーティクル（上限を超えると古いものから上書き）
+MAX_PARTICLES = 256
+particle_pool = None
+
+# フォント設定（Web版用）。各大きさを初めて使うときに読み込む
+class LazyFonts:
+    SIZES = {"large": 48, "small": 28, "tiny": 20}
     
-    return {
-        "obstacle_freq": base_obstacle_freq,
-        "obstacle_speed": base_obstacle_speed,
-        "scroll_speed": base_scroll_speed
-    }
-
-def draw_gradient_bg():
-    for y in range(HEIGHT):
-        ratio = y / HEIGHT
-        r = int(135 + (200 - 135) * ratio)
-        g = int(206 + (220 - 206) * ratio)
-        b = int(235 + (255 - 235) * ratio)
-        pygame.draw.line(screen, (r, g, b), (0, y), (WIDTH, y))
+    def __getattr__(self, name):
+        size = self.SIZES[name]
+        try:
+            loaded = pygame.font.Font(None, size)
+        except:
+            loaded = pygame.font.SysFont("arial", size)
+        setattr(self, name, loaded)
+        return loaded
+
+fonts = LazyFonts()
+
+# 文字列サーフェスのキャッシュ（HUD・アイテムラベル・各画面の固定文字列）
+text_cache = TextCache(max_entries=256)
+
+# HUDパネルは表示内容が変わったときだけ作り直す
+HUD_RECT = pygame.Rect(10, 10, 250, 100)
+hud_surface = None
+hud_key = None
 
 def draw_rounded_rect(surface, color, rect, radius):
     pygame.draw.rect(surface, color, rect, border_radius=radius)
 
-def create_obstacle():
-    x = random.randint(50, WIDTH - 50)
-    y = -50
-    obstacles.append([x, y, 60, 40])
-
 def draw_obstacle(obs):
-    pygame.draw.ellipse(screen, WHITE, obs)
+    renderer.mark(pygame.draw.ellipse(screen, WHITE, obs[:4]))
     pygame.draw.ellipse(screen, GRAY, [obs[0]+5, obs[1]+5, obs[2]-10, obs[3]-10])
 
-def create_item():
-    x = random.randint(50, WIDTH - 50)
-    y = -30
-    
-    if game_time > 60:
-        item_type = random.choices(
-            ["coin", "gem", "star", "diamond"],
-            weights=[40, 30, 20, 10]
-        )[0]
-    elif game_time > 30:
-        item_type = random.choices(
-            ["coin", "gem", "star"],
-            weights=[50, 30, 20]
-        )[0]
-    else:
-        item_type = random.choices(
-            ["coin", "gem"],
-            weights=[70, 30]
-        )[0]
-    
-    items.append([x, y, ITEM_TYPES[item_type]["size"], ITEM_TYPES[item_type]["size"], item_type])
-
-def draw_item(item):
-    item_type = item[4]
-    item_data = ITEM_TYPES[item_type]
+def draw_item(item, label=True):
+    item_data = ITEM_TYPES[ITEM_TYPE_NAMES[item[4]]]
     center_x = item[0] + item[2] // 2
     center_y = item[1] + item[3] // 2
     
-    pygame.draw.circle(screen, item_data["color"], (center_x, center_y), item_data["size"]//2)
+    renderer.mark(pygame.draw.circle(screen, item_data["color"], (center_x, center_y), item_data["size"]//2))
     
     # ポイント表示
-    points_text = tiny_font.render(str(item_data["points"]), True, BLACK)
+    if not label:
+        return
+    points_text = text_cache.render(fonts.tiny, str(item_data["points"]), BLACK)
     text_rect = points_text.get_rect(center=(center_x, center_y))
-    screen.blit(points_text, text_rect)
+    renderer.mark(screen.blit(points_text, text_rect))
+
+def build_sprite_atlas(scale=1):
+    # scale > 1 なら等倍で描いてから 1/scale に縮めたもの（内部解像度を下げる段用）
+    atlas = SpriteAtlas()
+    
+    def add(name, surface, offset=(0, 0), alpha=False):
+        if scale > 1:
+            w, h = surface.get_size()
+            surface = pygame.transform.scale(surface, (max(w // scale, 1), max(h // scale, 1)))
+            offset = (offset[0] // scale, offset[1] // scale)
+        atlas.add(name, surface, offset, alpha)
+    
+    def plane(surface):
+        pygame.draw.polygon(surface, ANA_BLUE, [(12, 0), (0, 30), (24, 30)])
+        pygame.draw.polygon(surface, WHITE, [(12, 10), (4, 25), (20, 25)])
+    add("plane", make_sprite(25, 31, plane), (-12, 0))
+    
+    def cloud(surface):
+        pygame.draw.ellipse(surface, WHITE, [0, 0, 60, 40])
+        pygame.draw.ellipse(surface, GRAY, [5, 5, 50, 30])
+    add("obstacle", make_sprite(60, 40, cloud))
+    
+    # アイテムは中心基準。丸とポイント表示は別スプライト
+    for name, item_data in ITEM_TYPES.items():
+        radius = item_data["size"] // 2
+        add(f"item:{name}", make_sprite(
+            radius * 2, radius * 2,
+            lambda surface, color=item_data["color"], r=radius: pygame.draw.circle(surface, color, (r, r), r)
+        ), (-radius, -radius))
+        label = text_cache.render(fonts.tiny, str(item_data["points"]), BLACK)
+        add(f"label:{name}", label, (-(label.get_width() // 2), -(label.get_height() // 2)), alpha=True)
+    return atlas.build()
+
+sprite_atlas = None
+ITEM_SPRITES = [(f"item:{name}", f"label:{name}") for name in ITEM_TYPE_NAMES]
+
+def draw_entities(alpha=1.0, surface=None, atlas=None, scale=1):
+    # 雲・アイテム・飛行機を一回の blits で描く。
+    # alpha は直前のティックから今のティックまでのどこを描くか（0〜1）。
+    # 雲・アイテムは直前のティックの移動量だけ、飛行機は左右の移動量だけ戻して補間する。
+    # surface / atlas / scale は縮小サーフェスに描くとき（座標を 1/scale にする）
+    dy = -round(sim.last_speed * (1 - alpha))
+    plane_x = round(sim.prev_plane_x + (sim.plane_x - sim.prev_plane_x) * alpha)
+    labels = quality.tier["labels"]
+    if not USE_SPRITE_ATLAS:
+        for x, y, w, h, kind in sim.obstacles.rows():
+            draw_obstacle((x, y + dy, w, h, kind))
+        for x, y, w, h, kind in sim.items.rows():
+            draw_item((x, y + dy, w, h, kind), labels)
+        draw_plane(plane_x, sim.plane_y)
+        return
+    
+    entry = (atlas or sprite_atlas).entry
+    batch = [entry("obstacle", x // scale, (y + dy) // scale) for x, y, w, h, kind in sim.obstacles.rows()]
+    for x, y, w, h, kind in sim.items.rows():
+        center_x = (x + w // 2) // scale
+        center_y = (y + h // 2 + dy) // scale
+        item_sprite, label_sprite = ITEM_SPRITES[kind]
+        batch.append(entry(item_sprite, center_x, center_y))
+        if labels:
+            batch.append(entry(label_sprite, center_x, center_y))
+    batch.append(entry("plane", plane_x // scale, sim.plane_y // scale))
+    if surface is not None:
+        surface.blits(batch, doreturn=False)
+        return
+    for rect in screen.blits(batch):
+        renderer.mark(rect)
 
 def draw_plane(x, y):
     # 簡単な飛行機の描画
-    pygame.draw.polygon(screen, ANA_BLUE, [(x, y), (x-12, y+30), (x+12, y+30)])
+    renderer.mark(pygame.draw.polygon(screen, ANA_BLUE, [(x, y), (x-12, y+30), (x+12, y+30)]))
     pygame.draw.polygon(screen, WHITE, [(x, y+10), (x-8, y+25), (x+8, y+25)])
 
-def check_collision(px, py, obstacles):
-    plane_rect = pygame.Rect(px-12, py, 24, 50)
-    for obs in obstacles:
-        obs_rect = pygame.Rect(obs[0], obs[1], obs[2], obs[3])
-        if plane_rect.colliderect(obs_rect):
-            return True
-    return False
-
-def check_item_collision(px, py, items):
-    plane_rect = pygame.Rect(px-12, py, 24, 50)
-    collected_items = []
-    for i, item in enumerate(items):
-        item_rect = pygame.Rect(item[0], item[1], item[2], item[3])
-        if plane_rect.colliderect(item_rect):
-            collected_items.append((i, item[4]))
-    return collected_items
-
-def add_particle(x, y, color):
-    particles.append([x, y, random.uniform(-2, 2), random.uniform(-3, -1), color, 30])
-
-def update_particles():
-    for particle in particles[:]:
-        particle[0] += particle[2]
-        particle[1] += particle[3]
-        particle[5] -= 1
-        if particle[5] <= 0:
-            particles.remove(particle)
-
 def draw_particles():
-    for particle in particles:
-        pygame.draw.circle(screen, particle[4], (int(particle[0]), int(particle[1])), 3)
+    for rect in particle_pool.draw(screen):
+        renderer.mark(rect)
+
+def low_res_layer(scale):
+    # 縮小描画用の (描画先, アトラス)。その縮小率を初めて使うときに作る
+    layer = low_res_layers.get(scale)
+    if layer is None:
+        view = pygame.Surface((WIDTH // scale, HEIGHT // scale)).convert()
+        layer = low_res_layers[scale] = (view, build_sprite_atlas(scale))
+    return layer
+
+def apply_quality():
+    # 今の段の設定をパーティクル・背景に反映する。背景を落とすのはプレイ中だけで、
+    # メニューなど他の画面はいつものグラデーションで描く
+    global low_res_background
+    tier = quality.tier
+    particle_pool.set_budget(tier["particles"])
+    flat = game_state == "playing" and not tier["gradient"]
+    renderer.set_background(flat_background if flat else background)
+    if tier["scale"] > 1:
+        view, _ = low_res_layer(tier["scale"])
+        low_res_background = pygame.transform.scale(renderer.background, view.get_size())
+
+def close_ghosts():
+    for track, _, _ in ghosts:
+        track.close()
+    ghosts.clear()
+
+def make_ghost_image(name):
+    # 機体と名前を1枚に重ねておき、毎フレーム1回の転送で済ませる
+    # （名前はアンチエイリアスなし、全体をカラーキー + 全体アルファ + RLE）
+    label = fonts.tiny.render(name, False, WHITE)
+    sprite_w, sprite_h = ghost_sprite.get_size()
+    width = max(sprite_w, label.get_width())
+    image = pygame.Surface((width, sprite_h + 1 + label.get_height())).convert()
+    image.fill(COLORKEY)
+    image.blit(ghost_sprite, ((width - sprite_w) // 2, 0))
+    image.blit(label, ((width - label.get_width()) // 2, sprite_h + 1))
+    image.set_colorkey(COLORKEY, pygame.RLEACCEL)
+    image.set_alpha(GHOST_ALPHA, pygame.RLEACCEL)
+    return image, width // 2
+
+def open_ghosts(paths_and_names):
+    # 開けなかったファイル（書き込み途中・壊れたもの）は飛ばす
+    close_ghosts()
+    for path, name in paths_and_names:
+        try:
+            track = GhostTrack(path)
+        except (OSError, GhostError):
+            continue
+        ghosts.append((track, *ghost_images.setdefault(name, make_ghost_image(name))))
+
+def open_top_ghosts():
+    # 直前のプレイの軌跡がまだ書き込み中なら待つ（ふつうはメニューにいる間に終わっている）
+    ghost_store.wait()
+    open_ghosts([(path, name) for _, _, path, name in ghost_store.best])
+
+def draw_ghosts(alpha, tick):
+    # ゴーストは tick まで進めて、飛行機と同じく補間して描く
+    index = max(tick - 1, 0)
+    y = sim.plane_y
+    batch = []
+    for track, image, center in ghosts:
+        if track.advance(index):
+            x = round(track.prev_x + (track.x - track.prev_x) * alpha)
+            batch.append((image, (x - center, y)))
+    for rect in screen.blits(batch):
+        renderer.mark(rect)
+
+def draw_playfield(alpha):
+    # 雲・アイテム・飛行機・パーティクル。縮小率 > 1 の段では縮小サーフェスに描いて
+    # 画面全体に拡大する（パーティクルは小さいので拡大後に等倍で重ねる）
+    scale = quality.tier["scale"]
+    if scale == 1 or not USE_SPRITE_ATLAS:
+        draw_entities(alpha)
+        draw_ghosts(alpha, sim.tick)
+        draw_particles()
+        return
+    view, atlas = low_res_layer(scale)
+    view.blit(low_res_background, (0, 0))
+    draw_entities(alpha, view, atlas, scale)
+    pygame.transform.scale(view, (WIDTH, HEIGHT), screen)
+    renderer.mark(screen.get_rect())
+    draw_ghosts(alpha, sim.tick)
+    draw_particles()
+
+# プレイ・ランキングに要るもの。メニューを出したあと1フレームに1段ずつ用意する
+game_ready = False
+# あとから読むモジュールの名前（load_game_steps() が入れる）
+Leaderboard = make_entry = ReplayRecorder = encode_text = None
+
+def load_game_steps(telemetry_dir=TELEMETRY_DIR):
+    global sim, recorder, telemetry, particle_pool, sprite_atlas, flat_background, ghost_sprite, leaderboard
+    global ghost_store
+    global game_ready, ReplayRecorder, encode_text, Leaderboard, make_entry
+    if game_ready:
+        return
+    # telemetry_dir=None なら記録しない（ベンチマークが本物の記録を汚さないように）
+    if telemetry_dir:
+        from telemetry import TelemetryRecorder
+        telemetry = TelemetryRecorder(telemetry_dir)
+    # entities / collision（NumPy）はここで初めて読まれる
+    sim = Simulation(profiler=profiler, telemetry=telemetry)
+    from replay import ReplayRecorder, encode_text
+    recorder = ReplayRecorder(sim.seed)
+    yield
+    from particles import ParticlePool
+    particle_pool = ParticlePool(MAX_PARTICLES)
+    yield
+    sprite_atlas = build_sprite_atlas()
+    flat_background = pygame.Surface((WIDTH, HEIGHT)).convert()
+    flat_background.fill(SKY_BLUE)
+    # ゴーストは白い半透明の機体。半透明にするのは名前と重ねた画像の方
+    # （カラーキー + 全体アルファは RLE にすると数倍速い）
+    ghost_sprite = make_sprite(25, 31, lambda surface: pygame.draw.polygon(
+        surface, WHITE, [(12, 0), (0, 30), (24, 30)])).convert()
+    yield
+    from leaderboard import Leaderboard, make_entry
+    leaderboard = Leaderboard(LEADERBOARD_DIR, k=10, seed_files=["ranking-data.json"], index=True)
+    yield
+    ghost_store = GhostStore(GHOST_DIR, GHOST_COUNT)
+    game_ready = True
+
+def load_game(telemetry_dir=TELEMETRY_DIR):
+    # まとめて同期で用意する（ベンチマーク用。用意済みなら何もしない）
+    for _ in load_game_steps(telemetry_dir):
+        pass
+
+async def preload_game():
+    # メニューの裏で読み込む。Pyodide では NumPy パッケージのダウンロードもここで待つ
+    if sys.platform == "emscripten":
+        import pyodide_js
+        await pyodide_js.loadPackage("numpy")
+    for _ in load_game_steps():
+        await asyncio.sleep(0)
+    startup.mark("interactive")
+    startup.save(STARTUP_LOG_PATH)
+
+def start_run():
+    # 新しいプレイを始める（リプレイ・軌跡の記録とゴーストも用意し直す）
+    global game_state, recorder, ghost_recorder, score_saved
+    game_state = "playing"
+    sim.reset()
+    if telemetry:
+        telemetry.start_run()
+    recorder = ReplayRecorder(sim.seed)
+    ghost_recorder = GhostRecorder()
+    open_top_ghosts()
+    frame_clock.reset()
+    apply_quality()
+    score_saved = False
 
 def draw_menu():
-    draw_gradient_bg()
-    
-    title = font.render("ANA SKY NAVIGATOR", True, WHITE)
+    title = text_cache.render(fonts.large, "ANA SKY NAVIGATOR", WHITE)
     screen.blit(title, (WIDTH//2 - 200, 100))
     
-    subtitle = small_font.render("Web版", True, GOLD)
+    subtitle = text_cache.render(fonts.small, "Web版", GOLD)
     screen.blit(subtitle, (WIDTH//2 - 30, 150))
     
     if player_name:
-        name_display = tiny_font.render(f"パイロット: {player_name}", True, ANA_BLUE)
+        name_display = text_cache.render(fonts.tiny, f"パイロット: {player_name}", ANA_BLUE)
         screen.blit(name_display, (WIDTH//2 - 60, 200))
     
     start_button = pygame.Rect(WIDTH//2 - 80, 300, 160, 50)
     draw_rounded_rect(screen, PINK, start_button, 15)
-    start_text = small_font.render("ゲーム開始", True, WHITE)
+    if game_ready:
+        start_text = text_cache.render(fonts.small, "ゲーム開始", WHITE)
+    else:
+        start_text = text_cache.render(fonts.small, "読み込み中...", WHITE)
     screen.blit(start_text, (WIDTH//2 - 50, 320))
     
     name_button = pygame.Rect(WIDTH//2 - 80, 370, 160, 40)
     draw_rounded_rect(screen, CYAN, name_button, 10)
-    name_text = tiny_font.render("名前設定 (N)", True, WHITE)
+    name_text = text_cache.render(fonts.tiny, "名前設定 (N)", WHITE)
     screen.blit(name_text, (WIDTH//2 - 45, 385))
     
     rank_button = pygame.Rect(WIDTH//2 - 80, 420, 160, 40)
     draw_rounded_rect(screen, GOLD, rank_button, 10)
-    rank_text = tiny_font.render("ランキング (R)", True, WHITE)
+    rank_text = text_cache.render(fonts.tiny, "ランキング (R)", WHITE)
     screen.blit(rank_text, (WIDTH//2 - 50, 435))
 
 def draw_name_input():
-    draw_gradient_bg()
-    
-    title = font.render("名前入力", True, WHITE)
+    title = text_cache.render(fonts.large, "名前入力", WHITE)
     screen.blit(title, (WIDTH//2 - 80, 150))
     
     input_rect = pygame.Rect(WIDTH//2 - 150, 250, 300, 40)
@@ -224,22 +430,20 @@ def draw_name_input():
     draw_rounded_rect(screen, WHITE, input_rect, 10)
     pygame.draw.rect(screen, color, input_rect, 3, border_radius=10)
     
-    name_text = small_font.render(player_name, True, BLACK)
+    name_text = text_cache.render(fonts.small, player_name, BLACK)
     screen.blit(name_text, (WIDTH//2 - 140, 265))
     
-    help_text = tiny_font.render("Enter: 決定 / Escape: キャンセル", True, WHITE)
+    help_text = text_cache.render(fonts.tiny, "Enter: 決定 / Escape: キャンセル", WHITE)
     screen.blit(help_text, (WIDTH//2 - 100, 350))
 
 def draw_ranking():
-    draw_gradient_bg()
-    
-    title = font.render("トップ10ランキング", True, WHITE)
+    title = text_cache.render(fonts.large, "トップ10ランキング", WHITE)
     screen.blit(title, (WIDTH//2 - 120, 80))
     
     ranking = get_web_ranking()
     
     if not ranking:
-        no_data_text = small_font.render("まだ記録がありません", True, GRAY)
+        no_data_text = text_cache.render(fonts.small, "まだ記録がありません", GRAY)
         screen.blit(no_data_text, (WIDTH//2 - 80, HEIGHT//2))
     else:
         y_start = 150
@@ -252,38 +456,78 @@ def draw_ranking():
             seconds = score_data["time"] % 60
             time_text = f" ({minutes:02d}:{seconds:02d})"
             
-            rank_surface = tiny_font.render(rank_text + time_text, True, rank_color)
+            rank_surface = text_cache.render(fonts.tiny, rank_text + time_text, rank_color)
             screen.blit(rank_surface, (WIDTH//2 - 150, y_pos))
     
-    back_text = tiny_font.render("Escapeキーで戻る", True, WHITE)
+    standing = get_player_standing(player_name) if player_name else None
+    if standing:
+        rank, players, best = standing
+        standing_text = text_cache.render(
+            fonts.tiny, f"{player_name}: {rank}位 / {players}人 (自己ベスト {best['score']}点)", ANA_BLUE)
+        screen.blit(standing_text, (WIDTH//2 - 150, 490))
+    
+    back_text = text_cache.render(fonts.tiny, "Escapeキーで戻る", WHITE)
     screen.blit(back_text, (WIDTH//2 - 60, 520))
 
+def build_hud(name, game_time, score):
+    surface = pygame.Surface(HUD_RECT.size, pygame.SRCALPHA)
+    draw_rounded_rect(surface, WHITE, surface.get_rect(), 15)
+    
+    if name:
+        name_text = text_cache.render(fonts.tiny, f"パイロット: {name}", ANA_BLUE)
+        surface.blit(name_text, (10, 10))
+        y_start = 30
+    else:
+        y_start = 15
+    
+    minutes = game_time // 60
+    seconds = game_time % 60
+    time_text = text_cache.render(fonts.small, f"時間 {minutes:02d}:{seconds:02d}", PURPLE)
+    surface.blit(time_text, (10, y_start))
+    
+    score_text = text_cache.render(fonts.tiny, f"得点: {score}", ORANGE)
+    surface.blit(score_text, (10, y_start + 25))
+    
+    diff_text = text_cache.render(fonts.tiny, f"難易度: Lv.{difficulty_level(game_time)}", GREEN)
+    surface.blit(diff_text, (10, y_start + 45))
+    return surface
+
+def draw_hud():
+    global hud_surface, hud_key
+    key = (player_name, sim.game_time, sim.score)
+    if key != hud_key:
+        hud_surface = build_hud(*key)
+        hud_key = key
+    renderer.mark(screen.blit(hud_surface, HUD_RECT))
+
 async def main():
-    global game_state, player_name, input_active, score_saved
-    global plane_x, plane_y, obstacles, items, game_time, start_time, score
+    global game_state, player_name, input_active, score_saved, run_position
     
     running = True
+    preload = asyncio.ensure_future(preload_game())
     
     while running:
+        profiler.begin_frame()
+        frame_started = time.perf_counter()
+        # 前のフレームからの経過時間ぶんのティック数（上限あり）
+        steps = frame_clock.advance(clock.get_time() / 1000)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             
             if event.type == pygame.KEYDOWN:
-                if game_state == "menu":
-                    if event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
-                        game_state = "playing"
-                        plane_x, plane_y = WIDTH // 2, HEIGHT - 100
-                        obstacles.clear()
-                        items.clear()
-                        score = 0
-                        game_time = 0
-                        start_time = 0
-                        score_saved = False
+                if event.key == pygame.K_F3:
+                    profiler.toggle_overlay()
+                    renderer.invalidate()
+                
+                elif game_state == "menu":
+                    # 開始とランキングは読み込みが終わるまで受け付けない（名前入力はできる）
+                    if (event.key == pygame.K_RETURN or event.key == pygame.K_SPACE) and game_ready:
+                        start_run()
                     elif event.key == pygame.K_n:
                         game_state = "name_input"
                         input_active = True
-                    elif event.key == pygame.K_r:
+                    elif event.key == pygame.K_r and game_ready:
                         game_state = "ranking"
                 
                 elif game_state == "name_input":
@@ -305,18 +549,18 @@ async def main():
                 
                 elif game_state == "game_over":
                     if event.key == pygame.K_r or event.key == pygame.K_SPACE:
-                        game_state = "playing"
-                        plane_x, plane_y = WIDTH // 2, HEIGHT - 100
-                        obstacles.clear()
-                        items.clear()
-                        score = 0
-                        game_time = 0
-                        start_time = 0
-                        score_saved = False
+                        start_run()
                     elif event.key == pygame.K_m or event.key == pygame.K_ESCAPE:
                         game_state = "menu"
         
-        # ゲーム画面の処理
+        profiler.mark("events")
+        
+        # ゲーム画面の処理（プレイ中だけ差分描画、他の画面は全面描画）。
+        # 内部解像度を下げている段のプレイ画面は拡大で全面を上書きするので背景を塗らない
+        low_res = game_state == "playing" and quality.tier["scale"] > 1 and USE_SPRITE_ATLAS
+        renderer.begin_frame(partial=game_state == "playing" and not low_res, clear=not low_res)
+        profiler.mark("background")
+        
         if game_state == "menu":
             draw_menu()
         
@@ -327,129 +571,109 @@ async def main():
             draw_ranking()
         
         elif game_state == "playing":
-            # 時間更新
-            if start_time == 0:
-                start_time = pygame.time.get_ticks()
-            game_time = (pygame.time.get_ticks() - start_time) // 1000
-            
-            current_settings = get_difficulty_settings(game_time)
-            
             # キー入力
             keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] and plane_x > 25:
-                plane_x -= plane_speed
-            if keys[pygame.K_RIGHT] and plane_x < WIDTH - 25:
-                plane_x += plane_speed
-            
-            # 障害物生成
-            if random.randint(1, current_settings["obstacle_freq"]) == 1:
-                create_obstacle()
+            inputs = 0
+            if keys[pygame.K_LEFT]:
+                inputs |= INPUT_LEFT
+            if keys[pygame.K_RIGHT]:
+                inputs |= INPUT_RIGHT
+            profiler.mark("input")
             
-            # アイテム生成
-            if random.randint(1, current_settings["obstacle_freq"] * 2) == 1:
-                create_item()
+            # ルール更新（固定ティックを steps 回。墜落したらそこで止める）
+            for _ in range(steps):
+                recorder.record(inputs)
+                events = sim.step(inputs)
+                ghost_recorder.record(sim.plane_x)
+                for event in events:
+                    if event[0] == EVENT_CRASH:
+                        particle_pool.emit(sim.plane_x, sim.plane_y, [RED, GOLD, WHITE], 15)
+                        game_state = "game_over"
+                    elif event[0] == EVENT_PICKUP:
+                        effect_color = ITEM_TYPES[event[1]]["color"]
+                        particle_pool.emit(sim.plane_x, sim.plane_y, [effect_color, WHITE, GOLD], 10)
+                particle_pool.update()
+                if sim.game_over:
+                    break
+            profiler.mark("particles")
             
-            # 障害物移動
-            for obs in obstacles[:]:
-                obs[1] += current_settings["obstacle_speed"] + current_settings["scroll_speed"]
-                if obs[1] > HEIGHT:
-                    obstacles.remove(obs)
-                    score += 10
-            
-            # アイテム移動
-            for item in items[:]:
-                item[1] += current_settings["obstacle_speed"] + current_settings["scroll_speed"]
-                if item[1] > HEIGHT:
-                    items.remove(item)
-            
-            # 衝突判定
-            if check_collision(plane_x, plane_y, obstacles):
-                for _ in range(15):
-                    add_particle(plane_x, plane_y, random.choice([RED, GOLD, WHITE]))
-                game_state = "game_over"
-            
-            # アイテム取得
-            collected = check_item_collision(plane_x, plane_y, items)
-            for i, item_type in reversed(collected):
-                items.pop(i)
-                points = ITEM_TYPES[item_type]["points"]
-                score += points
-                effect_color = ITEM_TYPES[item_type]["color"]
-                for _ in range(10):
-                    add_particle(plane_x, plane_y, random.choice([effect_color, WHITE, GOLD]))
-            
-            update_particles()
-            
-            # 描画
-            draw_gradient_bg()
-            
-            for obs in obstacles:
-                draw_obstacle(obs)
-            
-            for item in items:
-                draw_item(item)
-            
-            draw_plane(plane_x, plane_y)
-            draw_particles()
+            # 描画（墜落したフレームは補間せず最後のティックを描く）
+            draw_playfield(1.0 if sim.game_over else frame_clock.alpha)
             
             # UI
-            ui_panel = pygame.Rect(10, 10, 250, 100)
-            draw_rounded_rect(screen, (255, 255, 255, 150), ui_panel, 15)
-            
-            if player_name:
-                name_text = tiny_font.render(f"パイロット: {player_name}", True, ANA_BLUE)
-                screen.blit(name_text, (20, 20))
-                y_start = 40
-            else:
-                y_start = 25
-            
-            minutes = game_time // 60
-            seconds = game_time % 60
-            time_text = small_font.render(f"時間 {minutes:02d}:{seconds:02d}", True, PURPLE)
-            screen.blit(time_text, (20, y_start))
-            
-            score_text = tiny_font.render(f"得点: {score}", True, ORANGE)
-            screen.blit(score_text, (20, y_start + 25))
-            
-            difficulty_level = min(game_time // 15 + 1, 10)
-            diff_text = tiny_font.render(f"難易度: Lv.{difficulty_level}", True, GREEN)
-            screen.blit(diff_text, (20, y_start + 45))
-        
+            draw_hud()
+            if game_state != "playing":
+                # 墜落したら次のフレームから背景を戻し、そのプレイの記録を書き込みに回す
+                apply_quality()
+                if telemetry:
+                    telemetry.flush()
+
         elif game_state == "game_over":
-            draw_gradient_bg()
-            update_particles()
+            for _ in range(steps):
+                particle_pool.update()
             draw_particles()
             
             if not score_saved:
                 if player_name:
-                    save_web_score(player_name, score, game_time)
+                    replay = encode_text(recorder.encode(sim.score, sim.game_time))
+                    seq = save_web_score(player_name, sim.score, sim.game_time, replay)
+                    ghost_store.save(ghost_recorder, seq, sim.score, player_name)
+                    run_position = get_web_position(sim.score, seq)
+                else:
+                    run_position = get_web_position(sim.score)
                 score_saved = True
             
             panel_rect = pygame.Rect(WIDTH//2 - 160, HEIGHT//2 - 100, 320, 200)
             draw_rounded_rect(screen, (255, 255, 255, 200), panel_rect, 25)
             pygame.draw.rect(screen, RED, panel_rect, 4, border_radius=25)
             
-            text = font.render("ゲーム終了", True, RED)
+            text = text_cache.render(fonts.large, "ゲーム終了", RED)
             screen.blit(text, (WIDTH//2 - 80, HEIGHT//2 - 80))
             
             if player_name:
-                name_text = tiny_font.render(f"{player_name} さん", True, ANA_BLUE)
+                name_text = text_cache.render(fonts.tiny, f"{player_name} さん", ANA_BLUE)
                 screen.blit(name_text, (WIDTH//2 - 30, HEIGHT//2 - 50))
             
-            minutes = game_time // 60
-            seconds = game_time % 60
-            time_text = small_font.render(f"生存時間: {minutes:02d}:{seconds:02d}", True, GREEN)
+            minutes = sim.game_time // 60
+            seconds = sim.game_time % 60
+            time_text = text_cache.render(fonts.small, f"生存時間: {minutes:02d}:{seconds:02d}", GREEN)
             screen.blit(time_text, (WIDTH//2 - 70, HEIGHT//2 - 20))
             
-            score_text = small_font.render(f"最終得点: {score}", True, PURPLE)
+            score_text = text_cache.render(fonts.small, f"最終得点: {sim.score}", PURPLE)
             screen.blit(score_text, (WIDTH//2 - 60, HEIGHT//2 + 10))
             
-            restart_text = tiny_font.render("Space: 再開 / Escape: メニュー", True, ORANGE)
+            restart_text = text_cache.render(fonts.tiny, "Space: 再開 / Escape: メニュー", ORANGE)
             screen.blit(restart_text, (WIDTH//2 - 80, HEIGHT//2 + 50))
+            
+            rank, total = run_position
+            position_text = text_cache.render(fonts.tiny, f"全体順位: {rank}位 / {total}件", ANA_BLUE)
+            screen.blit(position_text, (WIDTH//2 - 70, HEIGHT//2 + 72))
         
-        pygame.display.flip()
+        profiler.mark("draw")
+        renderer.mark(profiler.draw_overlay(screen, fonts.tiny))
+        profiler.mark("overlay")
+        
+        renderer.present()
+        startup.mark("first_frame")
+        profiler.mark("flip")
+        work = time.perf_counter() - frame_started
+        frame_clock.end_frame(work)
+        if game_state == "playing" and quality.update(work):
+            apply_quality()
         await asyncio.sleep(0)  # Pygame-Web用の非同期処理
-        clock.tick(60)
+        clock.tick(frame_clock.target_fps)
+        profiler.mark("idle")
+        profiler.end_frame()
+    
+    profiler.dump(PROFILE_TRACE_PATH)
+    preload.cancel()
+    close_ghosts()
+    if ghost_store:
+        ghost_store.close()
+    if telemetry:
+        telemetry.close()
+    if leaderboard:
+        leaderboard.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,324 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation import (DIFFICULTY, EVENT_PICKUP, INPUT_LEFT, INPUT_RIGHT, ITEM_TYPES, ITEM_WEIGHTS, MAX_LEVEL,
+                        PLANE_H, PLANE_W, TICK_RATE, WIDTH, Simulation, difficulty_level, random_policy)
+
+# 難易度バランスの Monte Carlo 計測
+# ボット（POLICIES）× 難易度の案（variant）ごとに大量のゲームを描画なしで回し、
+# 得点・生存時間の分布を難易度レベル別のパーセンタイル表にまとめる。
+# ・仕事はシード範囲（シャード）単位で ProcessPoolExecutor に配る。ゲームは
+#   シードだけで決まるので、同じ引数なら何度回しても同じ結果になる
+# ・結果は1ゲーム1行の JSON Lines として、終わったシャードから順に追記する。
+#   --resume なら書き終えたシャードは飛ばす。中断で途中まで書かれた末尾の行は
+#   切り捨て、行数の足りないシャードはやり直す（集計ではシードの重複を除く）
+# ・各行には案の中身と --max-ticks のハッシュ（settings）を入れる。設定を変えて
+#   --resume したときは古い行を使い回さず、集計からも外す
+#
+# python balance.py --games 5000 --policies random dodge greedy \
+#     --variant fast:speed_max=10,scroll_max=6 --variants-file variants.json
+
+LOOKAHEAD = 160
+SHARD_SIZE = 250
+PERCENTILES = (10, 50, 90, 99)
+
+
+def _threats(sim, margin):
+    # 飛行機の進路（前方 LOOKAHEAD px）に入っている障害物 (距離, 中心x) の一覧
+    store = sim.obstacles
+    n = store.count
+    left = sim.plane_x - PLANE_W // 2 - margin
+    right = sim.plane_x + PLANE_W // 2 + margin
+    top = sim.plane_y - LOOKAHEAD
+    bottom = sim.plane_y + PLANE_H
+    return [(sim.plane_y - (y + h), x + w // 2)
+            for x, y, w, h in zip(store.x[:n].tolist(), store.y[:n].tolist(),
+                                  store.w[:n].tolist(), store.h[:n].tolist())
+            if y + h > top and y < bottom and x < right and left < x + w]
+
+
+def _steer_away(sim, center):
+    # 障害物の中心から離れる向き。壁際なら反対へ
+    if center >= sim.plane_x:
+        return INPUT_LEFT if sim.plane_x > 60 else INPUT_RIGHT
+    return INPUT_RIGHT if sim.plane_x < WIDTH - 60 else INPUT_LEFT
+
+
+def dodge_policy(sim, rng):
+    # 一番近い障害物からだけ逃げる。危険がなければ中央へ戻る
+    threats = _threats(sim, 10)
+    if threats:
+        return _steer_away(sim, min(threats)[1])
+    if abs(sim.plane_x - WIDTH // 2) > 40:
+        return INPUT_LEFT if sim.plane_x > WIDTH // 2 else INPUT_RIGHT
+    return 0
+
+
+def greedy_policy(sim, rng):
+    # 危険がなければ一番近い（下にある）アイテムへ向かう
+    threats = _threats(sim, 10)
+    if threats:
+        return _steer_away(sim, min(threats)[1])
+    store = sim.items
+    n = store.count
+    best = None
+    for x, y, w in zip(store.x[:n].tolist(), store.y[:n].tolist(), store.w[:n].tolist()):
+        if y < sim.plane_y + PLANE_H and (best is None or y > best[0]):
+            best = (y, x + w // 2)
+    if best is None or abs(best[1] - sim.plane_x) < 4:
+        return 0
+    return INPUT_RIGHT if best[1] > sim.plane_x else INPUT_LEFT
+
+
+POLICIES = {
+    "random": random_policy,
+    "dodge": dodge_policy,
+    "greedy": greedy_policy,
+}
+
+
+def run_game(seed, policy, variant, max_ticks):
+    sim = Simulation(seed, difficulty=variant["difficulty"], item_weights=variant["item_weights"])
+    policy_rng = random.Random(seed)
+    items = 0
+    while not sim.game_over and sim.tick < max_ticks:
+        for event in sim.step(policy(sim, policy_rng)):
+            if event[0] == EVENT_PICKUP:
+                items += 1
+    return {"seed": seed, "score": sim.score, "time": sim.game_time, "ticks": sim.tick,
+            "level": difficulty_level(sim.game_time), "items": items, "crashed": sim.game_over}
+
+
+def settings_key(variant, max_ticks):
+    # 結果を左右する設定（案の中身と打ち切りティック数）のハッシュ
+    data = json.dumps([variant["difficulty"], variant["item_weights"], max_ticks], sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+def run_shard(task):
+    policy_name, variant_name, variant, first_seed, last_seed, max_ticks, settings = task
+    policy = POLICIES[policy_name]
+    rows = []
+    for seed in range(first_seed, last_seed):
+        row = run_game(seed, policy, variant, max_ticks)
+        row.update(policy=policy_name, variant=variant_name, shard=first_seed, settings=settings)
+        rows.append(row)
+    return rows
+
+
+def parse_variant(text):
+    # "名前:キー=値,キー=値"。キーは simulation.DIFFICULTY のもの
+    name, _, assignments = text.partition(":")
+    difficulty = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        if key not in DIFFICULTY:
+            raise ValueError(f"unknown difficulty key {key!r} (choose from {', '.join(DIFFICULTY)})")
+        difficulty[key] = int(value)
+    return name, {"difficulty": difficulty}
+
+
+def parse_item_weights(name, stages):
+    # [[しきい値, {"coin": 重み, ...}], ...] を ITEM_WEIGHTS の形にする。
+    # 0 秒目にも使う段がないと build_difficulty_table が組めないので、しきい値が負の段を必須にする
+    try:
+        item_weights = tuple((threshold, tuple(weights), tuple(weights.values()))
+                             for threshold, weights in stages)
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f"{name}: item_weights must be a list of [threshold, {{item: weight}}] pairs")
+    for threshold, names, weights in item_weights:
+        if not isinstance(threshold, int) or isinstance(threshold, bool):
+            raise ValueError(f"{name}: item_weights threshold {threshold!r} is not an integer")
+        if not names:
+            raise ValueError(f"{name}: item_weights stage {threshold} has no items")
+        for item, weight in zip(names, weights):
+            if item not in ITEM_TYPES:
+                raise ValueError(f"{name}: unknown item {item!r} (choose from {', '.join(ITEM_TYPES)})")
+            if not isinstance(weight, (int, float)) or isinstance(weight, bool) or weight <= 0:
+                raise ValueError(f"{name}: weight of {item!r} must be a positive number")
+    if not any(threshold < 0 for threshold, _, _ in item_weights):
+        raise ValueError(f"{name}: item_weights needs a stage with a negative threshold (used from second 0)")
+    return item_weights
+
+
+def load_variants(args):
+    # 各案は DIFFICULTY / ITEM_WEIGHTS との差分。baseline は常に含める
+    specs = {"baseline": {}}
+    if args.variants_file:
+        # {"名前": {"difficulty": {...}, "item_weights": [[しきい値, {"coin": 重み, ...}], ...]}}
+        with open(args.variants_file, encoding="utf-8") as f:
+            specs.update(json.load(f))
+    for text in args.variant:
+        name, spec = parse_variant(text)
+        specs[name] = spec
+    variants = {}
+    for name, spec in specs.items():
+        item_weights = ITEM_WEIGHTS
+        if "item_weights" in spec:
+            item_weights = parse_item_weights(name, spec["item_weights"])
+        variants[name] = {"difficulty": {**DIFFICULTY, **spec.get("difficulty", {})},
+                          "item_weights": item_weights}
+    return variants
+
+
+def read_rows(path):
+    # 結果ファイルの行を順に返す。壊れた行は飛ばして件数を知らせる
+    bad = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                bad += 1
+    if bad:
+        print(f"{path}: skipped {bad} malformed line(s)", file=sys.stderr)
+
+
+def completed_shards(path):
+    # (policy, variant, shard, settings) ごとの出力済み行数。書き込み途中で止まった
+    # 末尾の行は、続けて追記すると次の行とつながってしまうので切り捨てる
+    counts = {}
+    if not os.path.exists(path):
+        return counts
+    good_offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            good_offset += len(line)
+    if good_offset != os.path.getsize(path):
+        print(f"{path}: dropped a partial last line", file=sys.stderr)
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+    for row in read_rows(path):
+        key = (row["policy"], row["variant"], row["shard"], row.get("settings"))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def percentiles(values):
+    if not len(values):
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def summarize(path, settings):
+    # 結果ファイルを読み直して (policy, variant) ごとに集計する。やり直した
+    # シャードの行はシードが重なるが、結果は同じなのでシードごとに1件だけ数える。
+    # settings（案の名前 → settings_key）と合わない行は別の設定で回した古い結果なので数えない
+    groups = {}
+    stale = 0
+    for row in read_rows(path):
+        if row.get("settings") != settings.get(row["variant"]):
+            stale += 1
+            continue
+        group = groups.setdefault((row["policy"], row["variant"]), {})
+        group[row["seed"]] = (row["score"], row["time"], row["level"], row["items"])
+    if stale:
+        print(f"{path}: ignored {stale} row(s) from other settings", file=sys.stderr)
+    summary = []
+    for (policy_name, variant_name), by_seed in sorted(groups.items()):
+        rows = list(by_seed.values())
+        data = np.array(rows, dtype=np.int64)
+        scores, times, levels, items = data.T
+        levels_table = []
+        for level in range(1, MAX_LEVEL + 1):
+            reached = levels >= level
+            died = levels == level
+            levels_table.append({
+                "level": level,
+                "reached": int(reached.sum()),
+                "reached_share": float(reached.mean()),
+                "ended": int(died.sum()),
+                "score": percentiles(scores[died]),
+                "time": percentiles(times[died]),
+            })
+        summary.append({
+            "policy": policy_name, "variant": variant_name, "games": len(rows),
+            "score": percentiles(scores), "time": percentiles(times), "items": percentiles(items),
+            "levels": levels_table,
+        })
+    return summary
+
+
+def print_summary(summary):
+    def fmt(stats):
+        return " ".join("    -" if stats[f"p{p}"] is None else f"{stats[f'p{p}']:5.0f}" for p in PERCENTILES)
+
+    header = " ".join(f"{'p' + str(p):>5}" for p in PERCENTILES)
+    for group in summary:
+        print(f"\n[{group['policy']} / {group['variant']}] {group['games']} games")
+        print(f"  score {fmt(group['score'])}   time {fmt(group['time'])}   items {fmt(group['items'])}")
+        print(f"  {'lv':>3} {'reached':>8} {'ended':>6}   score({header})   time({header})")
+        for row in group["levels"]:
+            if row["reached"]:
+                print(f"  {row['level']:>3} {row['reached_share']:>7.1%} {row['ended']:>6}   "
+                      f"      {fmt(row['score'])}         {fmt(row['time'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator Monte Carlo balancing runner")
+    parser.add_argument("--games", type=int, default=2000, help="policy × variant ごとのゲーム数")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--variant", action="append", default=[],
+                        help="名前:キー=値,... （simulation.DIFFICULTY の差し替え）")
+    parser.add_argument("--variants-file", help="案を JSON で与える（item_weights も指定可）")
+    parser.add_argument("--max-ticks", type=int, default=TICK_RATE * 600)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="balance_results.jsonl")
+    parser.add_argument("--summary", default="balance_summary.json")
+    parser.add_argument("--resume", action="store_true", help="出力済みのシャードを飛ばして追記する")
+    args = parser.parse_args(argv)
+
+    try:
+        variants = load_variants(args)
+    except ValueError as e:
+        parser.error(str(e))
+    written = completed_shards(args.output) if args.resume else {}
+    if not args.resume and os.path.exists(args.output):
+        os.remove(args.output)
+    last_seed = args.first_seed + args.games
+    settings = {name: settings_key(variant, args.max_ticks) for name, variant in variants.items()}
+    shards = [(policy_name, variant_name, variant, first, min(first + args.shard_size, last_seed), args.max_ticks,
+               settings[variant_name])
+              for policy_name in args.policies
+              for variant_name, variant in variants.items()
+              for first in range(args.first_seed, last_seed, args.shard_size)]
+    tasks = [task for task in shards
+             if written.get((task[0], task[1], task[3], task[6])) != task[4] - task[3]]
+    done = len(shards) - len(tasks)
+
+    started = time.perf_counter()
+    games = ticks = 0
+    with open(args.output, "a", encoding="utf-8") as out, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for i, rows in enumerate(pool.map(run_shard, tasks), 1):
+            out.write("".join(json.dumps(row) + "\n" for row in rows))
+            out.flush()
+            games += len(rows)
+            ticks += sum(row["ticks"] for row in rows)
+            elapsed = time.perf_counter() - started
+            print(f"\rshard {i}/{len(tasks)}  {games:,} games  {ticks / max(elapsed, 1e-9):,.0f} ticks/s",
+                  end="", flush=True)
+    print(f"\n{games:,} games ({done} shards skipped) in {time.perf_counter() - started:.1f}s")
+
+    summary = summarize(args.output, settings)
+    with open(args.summary, "w", encoding="utf-8") as f:
+        json.dump({"variants": {name: {"difficulty": v["difficulty"], "item_weights": v["item_weights"]}
+                                for name, v in variants.items()},
+                   "groups": summary}, f, indent=1)
+    print_summary(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from simulation import (DT, HEIGHT, INPUT_LEFT, INPUT_RIGHT, ITEM_KIND, ITEM_TYPES, ITEM_TYPE_NAMES,
+                        ITEM_WEIGHTS, OBSTACLE_H, OBSTACLE_W, PLANE_H, PLANE_SPEED, PLANE_START_X,
+                        PLANE_START_Y, PLANE_W, TICK_RATE, WIDTH, get_difficulty_settings,
+                        run_headless)
+
+# 多数のゲームを同時に進めるバッチシミュレータ（難易度調整用）
+# N ゲーム分の状態を NumPy 配列で持ち、全ゲームを1ティックずつ揃えて進める。
+# 障害物・アイテムはゲームごとに固定数のスロットを持つ (N, スロット数) の表で、
+# 空きが足りなくなったら表を広げる。ルールは Simulation.step と同じだが、
+# 乱数は NumPy の Generator で一括に引くので、同じシードでも Simulation と
+# 同じ展開にはならない（分布が同じ）。
+#
+# python batch_sim.py --games 4096 --compare 200
+
+
+def _item_thresholds():
+    # ITEM_WEIGHTS の段ごとに、種類番号順の累積確率（最後の種類を除く）を1行に
+    table = np.zeros((len(ITEM_WEIGHTS), len(ITEM_TYPE_NAMES)))
+    for row, (_, names, weights) in enumerate(ITEM_WEIGHTS):
+        for name, weight in zip(names, weights):
+            table[row, ITEM_KIND[name]] = weight
+    return (np.cumsum(table, axis=1) / table.sum(axis=1, keepdims=True))[:, :-1]
+
+
+_ITEM_THRESHOLDS = _item_thresholds()
+_ITEM_STAGE_LIMITS = np.array([threshold for threshold, _, _ in ITEM_WEIGHTS])
+_ITEM_SIZE = np.array([ITEM_TYPES[name]["size"] for name in ITEM_TYPE_NAMES], dtype=np.int32)
+_ITEM_POINTS = np.array([ITEM_TYPES[name]["points"] for name in ITEM_TYPE_NAMES], dtype=np.int64)
+
+
+class SlotTable:
+    # ゲームごとのエンティティ表。空きスロットは active が False
+    def __init__(self, games, capacity):
+        self.x = np.zeros((games, capacity), dtype=np.int32)
+        self.y = np.zeros((games, capacity), dtype=np.int32)
+        self.size = np.zeros((games, capacity), dtype=np.int32)
+        self.kind = np.zeros((games, capacity), dtype=np.int8)
+        self.active = np.zeros((games, capacity), dtype=bool)
+
+    def _grow(self):
+        for name in ("x", "y", "size", "kind", "active"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros_like(column)], axis=1))
+
+    def spawn(self, rows, x, y, size, kind=0):
+        # rows の各ゲームの最初の空きスロットに1体ずつ置く
+        slots = np.argmin(self.active[rows], axis=1)
+        if self.active[rows, slots].any():
+            self._grow()
+            slots = np.argmin(self.active[rows], axis=1)
+        self.x[rows, slots] = x
+        self.y[rows, slots] = y
+        self.size[rows, slots] = size
+        self.kind[rows, slots] = kind
+        self.active[rows, slots] = True
+
+    def move(self, dy):
+        # 画面外（HEIGHT を超えた）に出たものを外し、ゲームごとの数を返す
+        self.y += dy
+        off = self.active & (self.y > HEIGHT)
+        self.active &= ~off
+        return off.sum(axis=1)
+
+    def hits(self, plane_left, w, h):
+        # 飛行機の矩形と重なるスロットのマスク（pygame.Rect.colliderect と同じ判定）
+        y = self.y
+        return (self.active & (self.x < plane_left[:, None] + PLANE_W) & (plane_left[:, None] < self.x + w)
+                & (y < PLANE_START_Y + PLANE_H) & (PLANE_START_Y < y + h))
+
+    def keep(self, rows):
+        for name in ("x", "y", "size", "kind", "active"):
+            setattr(self, name, getattr(self, name)[rows])
+
+
+class BatchSimulation:
+    def __init__(self, games, seed=None, capacity=32):
+        self.games = games
+        self.rng = np.random.default_rng(seed)
+        # 終了したゲームの結果（元の並び順）
+        self.scores = np.zeros(games, dtype=np.int64)
+        self.game_times = np.zeros(games, dtype=np.int64)
+        self.ticks = np.zeros(games, dtype=np.int64)
+        self.done = np.zeros(games, dtype=bool)
+        # 以下は進行中のゲームだけの行。ids は元のゲーム番号
+        self.ids = np.arange(games)
+        self.plane_x = np.full(games, PLANE_START_X, dtype=np.int32)
+        self.score = np.zeros(games, dtype=np.int64)
+        self.tick = 0
+        self.obstacles = SlotTable(games, capacity)
+        self.items = SlotTable(games, capacity)
+
+    def live_count(self):
+        return len(self.ids)
+
+    def step(self, inputs):
+        # 進行中の全ゲームを1ティック進める。inputs は進行中の行ごとの INPUT_* ビット和
+        # （dt は DT 固定なので、経過秒数はティック数から決まり全ゲーム共通）
+        game_time = int(self.tick * DT + 1e-9)
+        settings = get_difficulty_settings(game_time)
+        obstacle_freq = settings["obstacle_freq"]
+        speed = settings["obstacle_speed"] + settings["scroll_speed"]
+        n = len(self.ids)
+        rng = self.rng
+
+        # 入力
+        left = (inputs & INPUT_LEFT).astype(bool) & (self.plane_x > 25)
+        self.plane_x -= PLANE_SPEED * left
+        right = (inputs & INPUT_RIGHT).astype(bool) & (self.plane_x < WIDTH - 25)
+        self.plane_x += PLANE_SPEED * right
+
+        # 生成（randint(1, freq) == 1 と同じ確率で判定）
+        rolls = rng.integers(0, obstacle_freq * 2, size=(2, n))
+        rows = np.flatnonzero(rolls[0] < 2)
+        if len(rows):
+            self.obstacles.spawn(rows, rng.integers(50, WIDTH - 50, size=len(rows), endpoint=True), -50, 0)
+        rows = np.flatnonzero(rolls[1] == 0)
+        if len(rows):
+            stage = int(np.argmax(game_time > _ITEM_STAGE_LIMITS))
+            kinds = np.searchsorted(_ITEM_THRESHOLDS[stage], rng.random(len(rows)), side="right")
+            self.items.spawn(rows, rng.integers(50, WIDTH - 50, size=len(rows), endpoint=True), -30,
+                             _ITEM_SIZE[kinds], kinds)
+
+        # 移動（画面外に出た障害物1つにつき10点）
+        self.score += 10 * self.obstacles.move(speed)
+        self.items.move(speed)
+
+        # 衝突・アイテム取得（衝突したティックでも取得は有効）
+        plane_left = self.plane_x - PLANE_W // 2
+        crashed = self.obstacles.hits(plane_left, OBSTACLE_W, OBSTACLE_H).any(axis=1)
+        collected = self.items.hits(plane_left, self.items.size, self.items.size)
+        if collected.any():
+            self.score += np.where(collected, _ITEM_POINTS[self.items.kind], 0).sum(axis=1)
+            self.items.active &= ~collected
+
+        self.tick += 1
+        if crashed.any():
+            self._finish(crashed, game_time)
+        return crashed
+
+    def _finish(self, crashed, game_time):
+        ids = self.ids[crashed]
+        self.scores[ids] = self.score[crashed]
+        self.game_times[ids] = game_time
+        self.ticks[ids] = self.tick
+        self.done[ids] = True
+        keep = ~crashed
+        self.ids = self.ids[keep]
+        self.plane_x = self.plane_x[keep]
+        self.score = self.score[keep]
+        self.obstacles.keep(keep)
+        self.items.keep(keep)
+
+    def run(self, policy=None, max_ticks=TICK_RATE * 600):
+        # 全ゲームが終わる（または max_ticks に達する）まで回し、結果の辞書を返す
+        policy = policy or random_policy
+        while len(self.ids) and self.tick < max_ticks:
+            self.step(policy(self, self.rng))
+        if len(self.ids):
+            # 打ち切り：最後のティックの時点で記録する
+            self.scores[self.ids] = self.score
+            self.game_times[self.ids] = int((self.tick - 1) * DT + 1e-9)
+            self.ticks[self.ids] = self.tick
+        return {"score": self.scores, "time": self.game_times, "ticks": self.ticks, "crashed": self.done}
+
+
+def random_policy(batch, rng):
+    # simulation.random_policy と同じく 0 / 左 / 右 を等確率で
+    return rng.integers(0, 3, size=len(batch.ids), dtype=np.int32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator batched simulator")
+    parser.add_argument("--games", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", type=int, default=0,
+                        help="Simulation で同じ数だけ回し、平均を比べる（0 で省略）")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    result = BatchSimulation(args.games, args.seed).run()
+    elapsed = time.perf_counter() - started
+    total_ticks = int(result["ticks"].sum())
+    print(f"batch: {args.games} games, {total_ticks:,} game-ticks in {elapsed:.2f}s "
+          f"({total_ticks / elapsed:,.0f} game-ticks/s)")
+    print(f"  score mean {result['score'].mean():.1f}  p50 {np.median(result['score']):.0f}  "
+          f"time mean {result['time'].mean():.2f}s  ticks mean {result['ticks'].mean():.1f}")
+
+    if args.compare:
+        started = time.perf_counter()
+        sims = [run_headless(seed) for seed in range(args.compare)]
+        elapsed = time.perf_counter() - started
+        scores = np.array([sim.score for sim in sims])
+        ticks = np.array([sim.tick for sim in sims])
+        print(f"scalar: {args.compare} games, {int(ticks.sum()):,} ticks in {elapsed:.2f}s "
+              f"({ticks.sum() / elapsed:,.0f} ticks/s)")
+        print(f"  score mean {scores.mean():.1f}  p50 {np.median(scores):.0f}  "
+              f"time mean {np.mean([sim.game_time for sim in sims]):.2f}s  ticks mean {ticks.mean():.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
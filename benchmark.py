@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# ヘッドレスのフレーム時間ベンチマーク
+# SDL_VIDEODRIVER=dummy で両ビルドを読み込み、障害物・アイテム・パーティクルを
+# 指定数だけ並べた状態から、実際の更新・衝突・描画関数をフェーズごとに計測する。
+# 各フレームの前に同じ盤面へ戻すので、エンティティ数は計測中一定に保たれる。
+# 結果は JSON に書き出し、--compare で以前の結果と中央値を比べられる。
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+DEFAULT_COUNTS = (10, 100, 1000, 10000)
+PERCENTILES = (50, 90, 99)
+# web+ghosts で一緒に描くゴーストの数
+GHOST_BENCH_COUNT = 10
+
+
+def summarize(samples):
+    # ミリ秒単位の統計（最近傍順位法のパーセンタイル）
+    ordered = sorted(samples)
+    stats = {"mean": sum(ordered) / len(ordered), "max": ordered[-1]}
+    for q in PERCENTILES:
+        rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+        stats[f"p{q}"] = ordered[rank]
+    return {k: round(v * 1000, 4) for k, v in stats.items()}
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def run(self, phase, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.samples.setdefault(phase, []).append(time.perf_counter() - started)
+        return result
+
+    def results(self):
+        return {phase: summarize(samples) for phase, samples in self.samples.items()}
+
+
+def populate_store(store, count, rng, width, height, make):
+    # ゲームと同じく y が添字順に非増加になるよう上から積む
+    store.clear()
+    for y in sorted(rng.integers(-40, height, count).tolist(), reverse=True):
+        make(int(rng.integers(50, width - 50)), y)
+
+
+def write_ghosts(directory, count, ticks, rng):
+    # 左右にランダムに動く軌跡を count 本書き、(パス, 名前) のリストを返す
+    from ghost import GhostRecorder
+
+    paths = []
+    for i in range(count):
+        recorder = GhostRecorder()
+        steps = rng.integers(-1, 2, ticks) * 6
+        for x in np.clip(np.cumsum(steps) + 400, 25, 775).tolist():
+            recorder.record(x)
+        path = os.path.join(directory, f"ghost-{i}.sng")
+        recorder.save(path, 0, f"ghost{i}")
+        paths.append((path, f"ghost{i}"))
+    return paths
+
+
+def bench_web(count, frames, seed=0, ghosts=0):
+    import airplane_game_web as web
+    from particles import ParticlePool
+    from simulation import OBSTACLE_W, OBSTACLE_H, ITEM_TYPES, ITEM_TYPE_NAMES
+
+    web.load_game(telemetry_dir=None)
+    rng = np.random.default_rng(seed)
+    sim = web.sim
+    sim.reset(seed)
+    populate_store(sim.obstacles, count, rng, web.WIDTH, web.HEIGHT,
+                   lambda x, y: sim.obstacles.add(x, y, OBSTACLE_W, OBSTACLE_H))
+
+    def add_item(x, y):
+        kind = int(rng.integers(0, len(ITEM_TYPE_NAMES)))
+        size = ITEM_TYPES[ITEM_TYPE_NAMES[kind]]["size"]
+        sim.items.add(x, y, size, size, kind)
+    populate_store(sim.items, count, rng, web.WIDTH, web.HEIGHT, add_item)
+
+    web.particle_pool = ParticlePool(max(count, 1), seed)
+    for _ in range(count // 10 + 1):
+        web.particle_pool.emit(web.WIDTH // 2, web.HEIGHT // 2, [web.RED, web.GOLD, web.WHITE], 10)
+
+    snapshot = {store: [column[:store.count].copy() for column in
+                        (store.x, store.y, store.w, store.h, store.kind)] + [store.count]
+                for store in (sim.obstacles, sim.items)}
+    freq, speed, alias = sim.table[60]
+    web.renderer.invalidate()
+
+    # ゴーストは一時ディレクトリに書いたファイルを mmap で再生する（開くのは計測外）
+    ghost_dir = tempfile.TemporaryDirectory()
+    web.open_ghosts(write_ghosts(ghost_dir.name, ghosts, frames + 1, rng))
+
+    timer = PhaseTimer()
+    for frame in range(frames):
+        # 盤面を元に戻す（計測外）
+        for store, saved in snapshot.items():
+            n = saved[-1]
+            for column, values in zip((store.x, store.y, store.w, store.h, store.kind), saved[:-1]):
+                column[:n] = values
+            store.count = n
+            store.y_sorted = True
+        sim.game_over = False
+        if web.particle_pool.alive_count() == 0:
+            web.particle_pool.emit(web.WIDTH // 2, web.HEIGHT // 2, [web.RED, web.GOLD, web.WHITE], count)
+
+        started = time.perf_counter()
+        timer.run("spawn", sim.spawn, freq, alias)
+        timer.run("move", sim.move, speed)
+        timer.run("collide", sim.collide, [])
+        timer.run("particles", web.particle_pool.update)
+        timer.run("draw_bg", web.renderer.begin_frame, True)
+        timer.run("draw_entities", web.draw_entities)
+        if ghosts:
+            timer.run("draw_ghosts", web.draw_ghosts, 1.0, frame + 1)
+        timer.run("draw_particles", web.draw_particles)
+        timer.run("draw_hud", web.draw_hud)
+        timer.run("present", web.renderer.present)
+        timer.samples.setdefault("frame", []).append(time.perf_counter() - started)
+    web.close_ghosts()
+    ghost_dir.cleanup()
+    return timer.results()
+
+
+def bench_web_ghosts(count, frames, seed=0):
+    return bench_web(count, frames, seed, ghosts=GHOST_BENCH_COUNT)
+
+
+def bench_native(count, frames, seed=0):
+    import game
+
+    rng = np.random.default_rng(seed)
+    kinds = list(game.ITEMS)
+    obstacles = [[int(rng.integers(50, game.WIDTH - 50)), y, 60, 40]
+                 for y in sorted(rng.integers(-40, game.HEIGHT, count).tolist(), reverse=True)]
+    items = [[int(rng.integers(50, game.WIDTH - 50)), y, 20, 20, kinds[int(rng.integers(0, len(kinds)))]]
+             for y in sorted(rng.integers(-40, game.HEIGHT, count).tolist(), reverse=True)]
+    game.reset_game()
+
+    timer = PhaseTimer()
+    for _ in range(frames):
+        game.obstacles[:] = [list(obs) for obs in obstacles]
+        game.items[:] = [list(item) for item in items]
+        game.game_over = False
+
+        started = time.perf_counter()
+        timer.run("update", game.update_game)
+        timer.run("collide", game.check_collisions)
+        timer.run("draw_bg", game.draw_background)
+        timer.run("draw_entities", game.draw_sprites)
+        timer.run("draw_hud", game.draw_ui)
+        timer.run("present", pygame.display.flip)
+        timer.samples.setdefault("frame", []).append(time.perf_counter() - started)
+    return timer.results()
+
+
+BUILDS = {"web": bench_web, "web+ghosts": bench_web_ghosts, "native": bench_native}
+
+
+def compare(results, baseline_path, threshold):
+    # 中央値が threshold 倍を超えて悪化したフェーズを報告する
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["build"], r["entities"]): r["phases"] for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get((result["build"], result["entities"]))
+        if not old:
+            continue
+        for phase, stats in result["phases"].items():
+            if phase in old and old[phase]["p50"] > 0:
+                ratio = stats["p50"] / old[phase]["p50"]
+                if ratio > threshold:
+                    regressions.append((result["build"], result["entities"], phase, ratio))
+    for build, count, phase, ratio in regressions:
+        print(f"REGRESSION {build} {count:,} {phase}: p50 x{ratio:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator frame-time benchmark")
+    parser.add_argument("--counts", type=int, nargs="+", default=list(DEFAULT_COUNTS))
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--builds", nargs="+", choices=sorted(BUILDS), default=sorted(BUILDS))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="以前の結果 JSON と比較する")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    results = []
+    for build in args.builds:
+        for count in args.counts:
+            phases = BUILDS[build](count, args.frames)
+            results.append({"build": build, "entities": count, "frames": args.frames, "phases": phases})
+            frame = phases["frame"]
+            print(f"{build:>6} {count:>7,}  frame p50 {frame['p50']:8.3f}ms  "
+                  f"p99 {frame['p99']:8.3f}ms  max {frame['max']:8.3f}ms")
+            for phase, stats in phases.items():
+                if phase != "frame":
+                    print(f"{'':>16}{phase:<15} p50 {stats['p50']:8.3f}ms  p99 {stats['p99']:8.3f}ms")
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "video_driver": os.environ.get("SDL_VIDEODRIVER"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+    # ゴーストの有無によるフレーム時間の差
+    frame_p50 = {(r["build"], r["entities"]): r["phases"]["frame"]["p50"] for r in results}
+    for count in args.counts:
+        if ("web", count) in frame_p50 and ("web+ghosts", count) in frame_p50:
+            base, with_ghosts = frame_p50["web", count], frame_p50["web+ghosts", count]
+            print(f"{GHOST_BENCH_COUNT} ghosts at {count:,} entities: frame p50 {base:.3f}ms -> "
+                  f"{with_ghosts:.3f}ms ({with_ghosts - base:+.3f}ms, {with_ghosts / base - 1:+.1%})")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
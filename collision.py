@@ -0,0 +1,101 @@
+import sys
+import time
+
+import numpy as np
+
+# 衝突判定（ブロードフェーズ + 一括ナローフェーズ）
+# EntityStore の列配列をそのまま使い、フレームごとに pygame.Rect を作らない。
+# ブロードフェーズは y 軸のスイープ：全エンティティが縦にスクロールするので、
+# 問い合わせ矩形と y 範囲が重なりうる区間だけを二分探索で切り出し、
+# その区間に対してだけ AABB 判定をまとめて行う。
+# 候補が少ないときは NumPy 演算の固定コストの方が高くつくので、
+# 区間を Python のリストに取り出して直接判定する。
+# 数千件程度までは全件を一括判定しても演算 1 回あたりの固定コストが支配的で、
+# 二分探索の分だけ遅くなる（--stress で実測）。スイープは SWEEP_MIN 件以上でだけ使う。
+
+SMALL_RANGE = 32
+SWEEP_MIN = 4096
+
+
+def _candidate_range(store, y, h):
+    # 問い合わせ矩形 [y, y+h) と y 範囲が重なりうる添字区間 [lo, hi) を返す
+    n = store.count
+    if n < SWEEP_MIN or not store.y_sorted:
+        return 0, n
+    # y は添字順に非増加なので、反転ビューは昇順。
+    # キーは列と同じ int32 で渡す（Python の int だと searchsorted が列全体を変換・コピーして O(n) になる）。
+    # y は整数なので「y - max_h より大きい最初の位置」は「y - max_h + 1 以上の最初の位置」で、1 回の探索にまとめられる
+    ys = store.y[:n][::-1]
+    first, last = np.searchsorted(ys, np.array((y - store.max_h + 1, y + h), dtype=np.int32)).tolist()
+    return n - last, n - first
+
+
+def collide_all(store, x, y, w, h):
+    # pygame.Rect.collidelistall と同じく、重なる要素の添字を昇順のリストで返す
+    lo, hi = _candidate_range(store, y, h)
+    if lo >= hi:
+        return []
+    if hi - lo <= SMALL_RANGE:
+        return [i for i, ex, ey, ew, eh in zip(range(lo, hi), store.x[lo:hi].tolist(),
+                                              store.y[lo:hi].tolist(), store.w[lo:hi].tolist(),
+                                              store.h[lo:hi].tolist())
+                if ex < x + w and x < ex + ew and ey < y + h and y < ey + eh]
+    ex = store.x[lo:hi]
+    ey = store.y[lo:hi]
+    hit = ((ex < x + w) & (x < ex + store.w[lo:hi]) &
+           (ey < y + h) & (y < ey + store.h[lo:hi]))
+    return (np.flatnonzero(hit) + lo).tolist()
+
+
+def collide_any(store, x, y, w, h):
+    return len(collide_all(store, x, y, w, h)) > 0
+
+
+def _fill_stress_store(store, count, rng):
+    # ゲームと同じく上から順に積まれた状態を作る
+    ys = np.sort(rng.integers(-50, 600, count))[::-1]
+    xs = rng.integers(50, 750, count)
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        store.add(x, y, 60, 40)
+
+
+def run_stress(counts=(100, 1000, 10000, 100000), queries=1000):
+    # 大量エンティティでの問い合わせ時間を、従来の Rect ループと比べる
+    import pygame
+    from entities import EntityStore
+
+    rng = np.random.default_rng(0)
+    print(f"{'entities':>9} {'rect loop':>12} {'sweep':>12} {'no sweep':>12} {'speedup':>8}")
+    for count in counts:
+        store = EntityStore()
+        _fill_stress_store(store, count, rng)
+        rows = store.rows()
+        probes = [(int(px), 500) for px in rng.integers(25, 775, queries)]
+
+        started = time.perf_counter()
+        loop_queries = max(1, min(queries, 2_000_000 // count))
+        for px, py in probes[:loop_queries]:
+            plane_rect = pygame.Rect(px - 12, py, 24, 50)
+            [i for i, r in enumerate(rows) if plane_rect.colliderect(pygame.Rect(r[0], r[1], r[2], r[3]))]
+        loop_us = (time.perf_counter() - started) / loop_queries * 1e6
+
+        started = time.perf_counter()
+        for px, py in probes:
+            collide_all(store, px - 12, py, 24, 50)
+        sweep_us = (time.perf_counter() - started) / queries * 1e6
+
+        store.y_sorted = False
+        started = time.perf_counter()
+        for px, py in probes:
+            collide_all(store, px - 12, py, 24, 50)
+        flat_us = (time.perf_counter() - started) / queries * 1e6
+
+        print(f"{count:>9,} {loop_us:>10.1f}us {sweep_us:>10.1f}us {flat_us:>10.1f}us "
+              f"{loop_us / sweep_us:>7.0f}x")
+
+
+if __name__ == "__main__":
+    if "--stress" in sys.argv:
+        run_stress()
+    else:
+        print("usage: python collision.py --stress")
@@ -0,0 +1,100 @@
+import numpy as np
+
+# 構造体配列（SoA）方式のエンティティ置き場
+# 障害物・アイテムを [x, y, w, h, kind] のリストで持つ代わりに、列ごとの
+# NumPy 配列に詰めて持つ。移動は配列全体への一回の加算、画面外の除去は
+# マスクによる一回の詰め直しで済むので、1フレームのコストが個数に比例した
+# Python ループにならない。詰め直しは順序を保つので結果は従来と同じ。
+#
+# 全要素が同じ速度で縦に流れるので、上から追加していく限り y は添字順に
+# 非増加になる。y_sorted はその性質が保たれているかを表し、collision.py の
+# 二分探索による候補絞り込みに使う。
+
+
+class EntityStore:
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.w = np.zeros(capacity, dtype=np.int32)
+        self.h = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.y_sorted = True
+        self.max_h = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self.x) * 2
+        for name in ("x", "y", "w", "h", "kind"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, x, y, w, h, kind=0):
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        if i and y > self.y[i - 1]:
+            self.y_sorted = False
+        if h > self.max_h:
+            self.max_h = h
+        self.x[i] = x
+        self.y[i] = y
+        self.w[i] = w
+        self.h[i] = h
+        self.kind[i] = kind
+        self.count += 1
+        return i
+
+    def clear(self):
+        self.count = 0
+        self.y_sorted = True
+        self.max_h = 0
+
+    def swap_remove(self, i):
+        # 末尾の要素で穴を埋める O(1) 削除（順序は保たれない）
+        last = self.count - 1
+        if i != last:
+            for column in (self.x, self.y, self.w, self.h, self.kind):
+                column[i] = column[last]
+            self.y_sorted = False
+        self.count = last
+
+    def compact(self, keep):
+        # keep（長さ count の bool 配列）が True の要素だけを前に詰める
+        n = int(keep.sum())
+        if n != self.count:
+            for column in (self.x, self.y, self.w, self.h, self.kind):
+                column[:n] = column[:self.count][keep]
+            self.count = n
+            if n == 0:
+                self.y_sorted = True
+
+    def remove_indices(self, indices):
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        self.compact(keep)
+
+    def move(self, dy):
+        self.y[:self.count] += dy
+
+    def cull_below(self, limit, culled=None):
+        # y が limit を超えたものを除去し、除去した数を返す。
+        # culled にリストを渡すと、除去したものの (x, y, kind) の配列を追加する
+        off = self.y[:self.count] > limit
+        removed = int(np.count_nonzero(off))
+        if removed:
+            if culled is not None:
+                n = self.count
+                culled.append((self.x[:n][off], self.y[:n][off], self.kind[:n][off]))
+            self.compact(~off)
+        return removed
+
+    def rows(self):
+        # 描画用： (x, y, w, h, kind) のタプル列
+        n = self.count
+        return list(zip(self.x[:n].tolist(), self.y[:n].tolist(), self.w[:n].tolist(),
+                        self.h[:n].tolist(), self.kind[:n].tolist()))
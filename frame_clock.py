@@ -0,0 +1,67 @@
+from simulation import DT
+
+# 固定ステップの時計
+# ・advance(経過秒) で経過時間を貯め、DT ごとに何ティック進めるかを返す。
+#   遅れが大きいときも1フレームで進めるのは MAX_CATCHUP_STEPS ティックまでで、
+#   残りは捨てる（タブが裏に回った直後などに何百ティックも一気に回さない）
+# ・alpha は貯まっている端数（0〜1）。描画は直前のティックと今のティックの間を
+#   この割合で補間する
+# ・end_frame(処理秒数) で描画の目標フレームレートを 60 → 30 → 20 と自動で下げ、
+#   余裕が戻れば上げる。ゲームの速さはティック数で決まるので変わらない
+
+FRAME_RATES = (60, 30, 20)
+MAX_CATCHUP_STEPS = 8
+# 処理時間がフレーム予算のこの割合を超えたら下げる／一段上の予算のこの割合を
+# RECOVER_FRAMES フレーム続けて下回ったら上げる
+DROP_RATIO = 0.9
+RECOVER_RATIO = 0.6
+RECOVER_FRAMES = 60
+
+
+class FixedStepClock:
+    def __init__(self, step=DT, max_catchup=MAX_CATCHUP_STEPS, rates=FRAME_RATES, smoothing=0.1):
+        self.step = step
+        self.max_catchup = max_catchup
+        self.rates = rates
+        self.smoothing = smoothing
+        self.rate_index = 0
+        self.work = 0.0
+        self.recover_count = 0
+        self.dropped_steps = 0
+        self.reset()
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    @property
+    def target_fps(self):
+        return self.rates[self.rate_index]
+
+    @property
+    def alpha(self):
+        return min(self.accumulator / self.step, 1.0)
+
+    def advance(self, seconds):
+        self.accumulator += seconds
+        steps = int(self.accumulator / self.step + 1e-9)
+        if steps > self.max_catchup:
+            self.dropped_steps += steps - self.max_catchup
+            steps = self.max_catchup
+            self.accumulator = 0.0
+        else:
+            self.accumulator = max(self.accumulator - steps * self.step, 0.0)
+        return steps
+
+    def end_frame(self, work_seconds):
+        # 描画・更新にかかった時間（待ち時間を除く）の移動平均で目標フレームレートを決める
+        self.work += (work_seconds - self.work) * self.smoothing
+        if self.rate_index < len(self.rates) - 1 and self.work > DROP_RATIO / self.target_fps:
+            self.rate_index += 1
+            self.recover_count = 0
+        elif self.rate_index > 0 and self.work < RECOVER_RATIO / self.rates[self.rate_index - 1]:
+            self.recover_count += 1
+            if self.recover_count >= RECOVER_FRAMES:
+                self.rate_index -= 1
+                self.recover_count = 0
+        else:
+            self.recover_count = 0
@@ -2,6 +2,10 @@ import asyncio
 import pygame
 import random
 import math
+import time
+from frame_clock import FixedStepClock
+from simulation import DT
+from sprites import SpriteAtlas, make_sprite
 
 # 初期化
 pygame.init()
@@ -9,6 +13,8 @@ WIDTH, HEIGHT = 800, 600
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("ANA Sky Navigator")
 clock = pygame.time.Clock()
+# 更新は 60Hz 固定、描画は間に合うフレームレートで（frame_clock.py）
+frame_clock = FixedStepClock()
 
 # 色定義
 BLUE = (0, 51, 153)
@@ -27,7 +33,8 @@ obstacles = []
 items = []
 score = 0
 game_time = 0
-start_time = 0
+# 進めた固定ティックの合計秒（時計ではなくティック数で時間を数える）
+elapsed = 0.0
 game_over = False
 
 # アイテムタイプ
@@ -37,15 +44,29 @@ ITEMS = {
     "star": {"points": 100, "color": PINK}
 }
 
+def build_sprite_atlas():
+    atlas = SpriteAtlas()
+    
+    def plane(surface):
+        pygame.draw.polygon(surface, BLUE, [(15, 0), (0, 40), (30, 40)])
+        pygame.draw.polygon(surface, WHITE, [(15, 10), (5, 30), (25, 30)])
+    atlas.add("plane", make_sprite(31, 41, plane), (-15, 0))
+    atlas.add("obstacle", make_sprite(60, 40, lambda surface: pygame.draw.ellipse(surface, WHITE, [0, 0, 60, 40])))
+    for name, item in ITEMS.items():
+        atlas.add(name, make_sprite(20, 20, lambda surface, color=item["color"]: pygame.draw.circle(surface, color, (10, 10), 10)))
+    return atlas.build()
+
+sprite_atlas = build_sprite_atlas()
+
 def reset_game():
-    global plane_x, plane_y, obstacles, items, score, game_time, start_time, game_over
+    global plane_x, plane_y, obstacles, items, score, game_time, elapsed, game_over
     plane_x = WIDTH // 2
     plane_y = HEIGHT - 100
     obstacles.clear()
     items.clear()
     score = 0
     game_time = 0
-    start_time = pygame.time.get_ticks()
+    elapsed = 0.0
     game_over = False
 
 def create_obstacle():
@@ -74,6 +95,14 @@ def draw_items():
         color = ITEMS[item_type]["color"]
         pygame.draw.circle(screen, color, (item[0] + 10, item[1] + 10), 10)
 
+def draw_sprites():
+    # 障害物・アイテム・飛行機をアトラスから一括転送
+    entry = sprite_atlas.entry
+    batch = [entry("obstacle", obs[0], obs[1]) for obs in obstacles]
+    batch += [entry(item[4], item[0], item[1]) for item in items]
+    batch.append(entry("plane", plane_x, plane_y))
+    screen.blits(batch, doreturn=False)
+
 def check_collisions():
     global game_over, score
     
@@ -93,10 +122,12 @@ def check_collisions():
             items.remove(item)
 
 def update_game():
-    global game_time
+    global game_time, elapsed, score
     
     if not game_over:
-        game_time = (pygame.time.get_ticks() - start_time) // 1000
+        # simulation.Simulation と同じく、ティック開始時点の経過秒
+        game_time = int(elapsed + 1e-9)
+        elapsed += DT
         
         # 障害物移動
         for obs in obstacles[:]:
@@ -142,33 +173,36 @@ async def main():
     running = True
     
     while running:
+        frame_started = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE and game_over:
                     reset_game()
+                    frame_clock.reset()
         
-        if not game_over:
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] and plane_x > 20:
-                plane_x -= 8
-            if keys[pygame.K_RIGHT] and plane_x < WIDTH - 20:
-                plane_x += 8
-        
-        update_game()
-        check_collisions()
+        # 経過時間ぶんの固定ティック（描画が 30/20fps に落ちても進む速さは同じ）
+        for _ in range(frame_clock.advance(clock.get_time() / 1000)):
+            if not game_over:
+                keys = pygame.key.get_pressed()
+                if keys[pygame.K_LEFT] and plane_x > 20:
+                    plane_x -= 8
+                if keys[pygame.K_RIGHT] and plane_x < WIDTH - 20:
+                    plane_x += 8
+            
+            update_game()
+            check_collisions()
         
         # 描画
         draw_background()
-        draw_obstacles()
-        draw_items()
-        draw_plane()
+        draw_sprites()
         draw_ui()
         
         pygame.display.flip()
+        frame_clock.end_frame(time.perf_counter() - frame_started)
         await asyncio.sleep(0)
-        clock.tick(60)
+        clock.tick(frame_clock.target_fps)
     
     pygame.quit()
 
@@ -0,0 +1,585 @@
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+import time
+from collections import deque
+
+from replay import ReplayRecorder, encode_text, verify
+from simulation import (INPUT_LEFT, INPUT_RIGHT, ITEM_START_Y, ITEM_TYPE_NAMES, ITEM_TYPES, HEIGHT,
+                        OBSTACLE_START_Y, PLANE_START_X, TICK_RATE, EVENT_PICKUP, Simulation)
+
+# 権威サーバー：1プロセスで多数のヘッドレス・セッションを同時に進める
+# airplane_game_web.py の main() はモジュール変数を使う1人用ループなので、
+# サーバーではセッションごとに Simulation と ReplayRecorder を持ち、共有の
+# 固定レート・スケジューラが全セッションを同じティックでまとめて進める。
+# ルールはサーバーでだけ回るので、終わったプレイはそのままランキングに載せられる
+# （--data を指定したとき。リプレイ付きで Leaderboard に登録する）。
+#
+# 接続1本につきセッション1つ。通信はローカルホストの TCP、バイナリ形式:
+# クライアント → サーバー
+#   0x00〜0x03            次のティックの入力（INPUT_* のビット和）。1ティック1バイト
+#   'J' 長さ(u8) 名前     新しいプレイを始める（名前は UTF-8。空ならランキングに載せない）
+#   'S'                   統計を問い合わせる
+# サーバー → クライアント（どれも 長さ(u16) + 本体）
+#   'W' seed(u32)                          プレイ開始
+#   'D' tick(u32) flags(u8) ...            1ティック分の差分（下記）
+#   'E' score(u32) time(u32) ticks(u32) リプレイ   プレイ終了（墜落）
+#   'S' JSON                               統計
+# 差分は flags で立っている項目だけをこの順に続ける:
+#   F_PLANE    plane_x(i16)
+#   F_SPEED    移動量(u8)
+#   F_OBSTACLE 個数(u8) + x(i16) × 個数       このティックに生成された障害物
+#   F_ITEM     個数(u8) + (x(i16), 種類(u8)) × 個数
+#   F_PICKUP   個数(u8) + 添字(u16) × 個数    取得されたアイテム（画面外の除去後の添字）
+#   F_CRASH    （本体なし）
+# 全エンティティが同じ移動量で流れるので、生成・移動量・取得だけ送れば
+# クライアント（GameMirror）は Simulation.step と同じ順で盤面を組み立て直せる。
+# 何も起きないティックは 8 バイト、飛行機が動いても 10 バイト。
+#
+# 入力はセッションごとのバッファに溜め、ティックごとに1つ取り出す。届いていなければ
+# 直前の入力を保つので、クライアントは入力が変わったティックだけ送ればよい
+# （毎ティック送れば1ティック単位で正確に指定できる）。実際に使った入力だけを
+# 記録するので、リプレイはサーバーで起きたことそのもの。
+# 送信は接続ごとに溜めておき、send_every ティックに一度まとめて書く。接続ごとの
+# システムコールがティックあたりの主なコストなので、2 にすると差分は 30 Hz で届く。
+#
+# python game_server.py serve --port 8766 --data leaderboard_data
+# python game_server.py loadtest --sessions 500 --seconds 20
+
+MSG_JOIN = ord("J")
+MSG_STATS = ord("S")
+MSG_WELCOME = ord("W")
+MSG_DELTA = ord("D")
+MSG_END = ord("E")
+INPUT_MASK = INPUT_LEFT | INPUT_RIGHT
+
+F_PLANE = 1
+F_SPEED = 2
+F_OBSTACLE = 4
+F_ITEM = 8
+F_PICKUP = 16
+F_CRASH = 32
+
+FRAME_HEAD = struct.Struct("<HB")
+DELTA_HEAD = struct.Struct("<IB")
+WELCOME = struct.Struct("<I")
+END = struct.Struct("<III")
+
+# 先に届いた入力を何ティック分まで溜めるか（超えたら古いものを捨てる）
+INPUT_BUFFER = 8
+# 送信待ちがこれを超えたクライアントは追いつけないものとして切る
+MAX_BUFFERED = 256 * 1024
+# これ以上遅れたティックは進めずに捨てる（セッションの時間がその分遅れる）
+MAX_LATE_TICKS = 4
+
+
+def frame(kind, body=b""):
+    return FRAME_HEAD.pack(len(body) + 1, kind) + body
+
+
+def _new_tail(store, start_y):
+    # このティックに生成されたもの（末尾にあり、y が生成位置 + 移動量ちょうど）の添字
+    n = store.count
+    i = n
+    while i and store.y[i - 1] == start_y:
+        i -= 1
+    return range(i, n)
+
+
+class Session:
+    def __init__(self, server, connection, name):
+        self.server = server
+        self.connection = connection
+        self.name = name
+        self.sim = None
+        self.pending = bytearray()
+        self.last_input = 0
+        self.sent_x = self.sent_speed = None
+
+    def start(self, name):
+        self.name = name
+        if self.sim is None:
+            self.sim = Simulation()
+        else:
+            self.sim.reset()
+        self.recorder = ReplayRecorder(self.sim.seed)
+        self.pending.clear()
+        self.last_input = 0
+        self.sent_x = self.sent_speed = None
+        self.connection.send(frame(MSG_WELCOME, WELCOME.pack(self.sim.seed)))
+
+    def push_input(self, inputs):
+        pending = self.pending
+        pending.append(inputs)
+        if len(pending) > INPUT_BUFFER:
+            del pending[0]
+            self.server.stats["dropped_inputs"] += 1
+
+    def step(self):
+        # 1ティック進めて差分を送る。墜落したら True
+        sim = self.sim
+        pending = self.pending
+        if pending:
+            inputs = self.last_input = pending[0]
+            del pending[0]
+        else:
+            inputs = self.last_input
+        self.recorder.record(inputs)
+        events = sim.step(inputs)
+
+        flags = 0
+        body = []
+        if sim.plane_x != self.sent_x:
+            flags |= F_PLANE
+            body.append(struct.pack("<h", sim.plane_x))
+            self.sent_x = sim.plane_x
+        speed = sim.last_speed
+        if speed != self.sent_speed:
+            flags |= F_SPEED
+            body.append(bytes((speed,)))
+            self.sent_speed = speed
+        new = _new_tail(sim.obstacles, OBSTACLE_START_Y + speed)
+        if new:
+            flags |= F_OBSTACLE
+            x = sim.obstacles.x
+            body.append(struct.pack(f"<B{len(new)}h", len(new), *(int(x[i]) for i in new)))
+        new = _new_tail(sim.items, ITEM_START_Y + speed)
+        if new:
+            flags |= F_ITEM
+            items = sim.items
+            body.append(bytes((len(new),)))
+            body.extend(struct.pack("<hB", int(items.x[i]), int(items.kind[i])) for i in new)
+        picked = [event[4] for event in events if event[0] == EVENT_PICKUP]
+        if picked:
+            flags |= F_PICKUP
+            body.append(struct.pack(f"<B{len(picked)}H", len(picked), *picked))
+        if sim.game_over:
+            flags |= F_CRASH
+        self.connection.send(frame(MSG_DELTA, DELTA_HEAD.pack(sim.tick, flags) + b"".join(body)))
+        return sim.game_over
+
+    def finish(self):
+        sim = self.sim
+        data = self.recorder.encode(sim.score, sim.game_time)
+        self.connection.send(frame(MSG_END, END.pack(sim.score, sim.game_time, sim.tick) + data))
+        self.server.submit(self.name, sim.score, sim.game_time, data)
+
+
+class Connection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.outgoing = []
+        self.session = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.stats["connections"] += 1
+
+    def connection_lost(self, exc):
+        self.server.sessions.discard(self.session)
+        self.transport = None
+
+    def send(self, data):
+        if not self.outgoing:
+            self.server.writers.append(self)
+        self.outgoing.append(data)
+
+    def flush(self):
+        transport = self.transport
+        data = b"".join(self.outgoing)
+        self.outgoing.clear()
+        if transport is None:
+            return
+        transport.write(data)
+        self.server.stats["writes"] += 1
+        self.server.stats["bytes"] += len(data)
+        if transport.get_write_buffer_size() > MAX_BUFFERED:
+            self.server.stats["slow_clients"] += 1
+            transport.abort()
+            self.transport = None
+
+    def data_received(self, data):
+        self.server.stats["bytes_in"] += len(data)
+        buffer = self.buffer
+        buffer += data
+        n = len(buffer)
+        pos = 0
+        while pos < n:
+            code = buffer[pos]
+            if code <= INPUT_MASK:
+                if self.session is not None:
+                    self.session.push_input(code)
+                pos += 1
+            elif code == MSG_JOIN:
+                if n - pos < 2 or n - pos < 2 + buffer[pos + 1]:
+                    break
+                end = pos + 2 + buffer[pos + 1]
+                name = bytes(buffer[pos + 2:end]).decode("utf-8", "replace")
+                pos = end
+                if self.session is None:
+                    self.session = Session(self.server, self, name)
+                self.session.start(name)
+                self.server.sessions.add(self.session)
+            elif code == MSG_STATS:
+                pos += 1
+                self.send(frame(MSG_STATS, json.dumps(self.server.report()).encode("utf-8")))
+            else:
+                self.transport.abort()
+                return
+        del buffer[:pos]
+
+
+class GameServer:
+    def __init__(self, leaderboard=None, tick_rate=TICK_RATE, send_every=1):
+        self.leaderboard = leaderboard
+        self.tick_rate = tick_rate
+        self.send_every = send_every
+        self.sessions = set()
+        # 送信待ちのある接続
+        self.writers = []
+        self.tick = 0
+        self.stats = {"connections": 0, "session_ticks": 0, "runs": 0, "dropped_ticks": 0, "dropped_inputs": 0,
+                      "slow_clients": 0, "writes": 0, "bytes": 0, "bytes_in": 0}
+        # 直近のティックの処理時間（秒）
+        self.tick_times = deque(maxlen=tick_rate * 10)
+        self.started = time.monotonic()
+
+    def submit(self, name, score, game_time, data):
+        self.stats["runs"] += 1
+        if self.leaderboard is not None and name:
+            from leaderboard import make_entry
+            self.leaderboard.submit(make_entry(name, score, game_time, replay=encode_text(data)))
+
+    def step(self):
+        finished = [session for session in self.sessions if session.step()]
+        self.stats["session_ticks"] += len(self.sessions)
+        for session in finished:
+            self.sessions.discard(session)
+            session.finish()
+        self.tick += 1
+        if self.tick % self.send_every == 0:
+            self.flush()
+
+    def flush(self):
+        writers, self.writers = self.writers, []
+        for connection in writers:
+            connection.flush()
+
+    async def run(self):
+        # 全セッション共有の固定レート・スケジューラ。予定時刻を DT ずつ進めて待つので
+        # 処理時間のぶれがあっても平均のレートは保たれる。大きく遅れたら追いつこうとせず捨てる
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_time = loop.time()
+        while True:
+            next_time += interval
+            delay = next_time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                late = int(-delay / interval)
+                if late > MAX_LATE_TICKS:
+                    self.stats["dropped_ticks"] += late
+                    next_time += late * interval
+                # 入力の受信を挟む
+                await asyncio.sleep(0)
+            started = time.perf_counter()
+            self.step()
+            self.tick_times.append(time.perf_counter() - started)
+
+    def report(self):
+        times = sorted(self.tick_times)
+        pick = lambda q: times[min(len(times) - 1, int(len(times) * q))] * 1000 if times else 0.0
+        return {"sessions": len(self.sessions), "ticks": self.tick, "tick_rate": self.tick_rate,
+                "cpu": time.process_time(), "wall": time.monotonic() - self.started,
+                "tick_p50_ms": pick(0.5), "tick_p99_ms": pick(0.99),
+                "tick_max_ms": times[-1] * 1000 if times else 0.0, **self.stats}
+
+
+async def start_server(host, port, leaderboard=None, tick_rate=TICK_RATE, send_every=1):
+    loop = asyncio.get_running_loop()
+    game = GameServer(leaderboard, tick_rate, send_every)
+    server = await loop.create_server(lambda: Connection(game), host, port, backlog=4096)
+    ticker = asyncio.ensure_future(game.run())
+    return game, server, ticker
+
+
+async def serve(args):
+    leaderboard = None
+    if args.data:
+        from leaderboard import Leaderboard
+        leaderboard = Leaderboard(args.data, k=args.top, index=True)
+    game, server, ticker = await start_server(args.host, args.port, leaderboard, args.tick_rate, args.send_every)
+    port = server.sockets[0].getsockname()[1]
+    print(f"serving on {args.host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ticker.cancel()
+        if leaderboard is not None:
+            leaderboard.close()
+
+
+# ---- クライアント側 ----
+
+class GameMirror:
+    # 差分から盤面を組み立て直す（Simulation.step と同じ順：生成 → 移動 → 画面外の除去 → 取得）
+    def __init__(self, seed):
+        self.seed = seed
+        self.tick = 0
+        self.plane_x = PLANE_START_X
+        self.speed = 0
+        self.score = 0
+        self.obstacles = []
+        self.items = []
+        self.crashed = False
+
+    def apply(self, data, pos):
+        tick, flags = DELTA_HEAD.unpack_from(data, pos)
+        pos += DELTA_HEAD.size
+        if tick != self.tick + 1:
+            raise ValueError(f"delta for tick {tick} after tick {self.tick}")
+        self.tick = tick
+        if flags & F_PLANE:
+            self.plane_x, = struct.unpack_from("<h", data, pos)
+            pos += 2
+        if flags & F_SPEED:
+            self.speed = data[pos]
+            pos += 1
+        if flags & F_OBSTACLE:
+            count = data[pos]
+            self.obstacles.extend([x, OBSTACLE_START_Y] for x in struct.unpack_from(f"<{count}h", data, pos + 1))
+            pos += 1 + count * 2
+        if flags & F_ITEM:
+            count = data[pos]
+            pos += 1
+            for _ in range(count):
+                x, kind = struct.unpack_from("<hB", data, pos)
+                self.items.append([x, ITEM_START_Y, kind])
+                pos += 3
+        speed = self.speed
+        for entity in self.obstacles:
+            entity[1] += speed
+        for entity in self.items:
+            entity[1] += speed
+        kept = [entity for entity in self.obstacles if entity[1] <= HEIGHT]
+        self.score += 10 * (len(self.obstacles) - len(kept))
+        self.obstacles = kept
+        self.items = [entity for entity in self.items if entity[1] <= HEIGHT]
+        if flags & F_PICKUP:
+            count = data[pos]
+            picked = struct.unpack_from(f"<{count}H", data, pos + 1)
+            pos += 1 + count * 2
+            for index in sorted(picked, reverse=True):
+                self.score += ITEM_TYPES[ITEM_TYPE_NAMES[self.items.pop(index)[2]]]["points"]
+        self.crashed = bool(flags & F_CRASH)
+        return pos
+
+    def snapshot_size(self):
+        # 同じ盤面を丸ごと送った場合の大きさ（比較用。差分と同じ詰め方で数える）
+        return FRAME_HEAD.size + DELTA_HEAD.size + 2 + 1 + 4 + 4 * len(self.obstacles) + 5 * len(self.items)
+
+
+class Bot(asyncio.Protocol):
+    # 負荷生成用のクライアント：差分を受けるたびに次の入力を決め、変わったときだけ送る。
+    # 入力は平均10ティックごとに向きを変えるランダム操作。プレイが終わったらすぐ次を始める
+    def __init__(self, name, rng, totals):
+        self.name = name.encode("utf-8")
+        self.rng = rng
+        self.totals = totals
+        self.buffer = bytearray()
+        self.transport = None
+        self.mirror = None
+        self.inputs = 0
+        self.running = True
+        self.stats_waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.join()
+
+    def join(self):
+        self.transport.write(bytes((MSG_JOIN, len(self.name))) + self.name)
+
+    def steer(self):
+        if self.rng.random() < 0.1:
+            inputs = self.rng.choice((0, INPUT_LEFT, INPUT_RIGHT))
+            if inputs != self.inputs:
+                self.inputs = inputs
+                self.transport.write(bytes((inputs,)))
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        pos = 0
+        n = len(buffer)
+        totals = self.totals
+        while n - pos >= 2:
+            length, = struct.unpack_from("<H", buffer, pos)
+            if n - pos - 2 < length:
+                break
+            start = pos + 2
+            pos = start + length
+            kind = buffer[start]
+            if kind == MSG_DELTA:
+                mirror = self.mirror
+                mirror.apply(buffer, start + 1)
+                totals["deltas"] += 1
+                totals["delta_bytes"] += length + 2
+                totals["snapshot_bytes"] += mirror.snapshot_size()
+                if not mirror.crashed:
+                    self.steer()
+            elif kind == MSG_WELCOME:
+                seed, = WELCOME.unpack_from(buffer, start + 1)
+                self.mirror = GameMirror(seed)
+                self.inputs = 0
+            elif kind == MSG_END:
+                score, game_time, ticks = END.unpack_from(buffer, start + 1)
+                totals["runs"] += 1
+                if score != self.mirror.score or ticks != self.mirror.tick:
+                    totals["mismatches"] += 1
+                if len(totals["replays"]) < totals["keep_replays"]:
+                    totals["replays"].append((bytes(buffer[start + 1 + END.size:pos]), score, game_time))
+                if self.running:
+                    self.join()
+            elif kind == MSG_STATS and self.stats_waiter is not None:
+                self.stats_waiter.set_result(json.loads(bytes(buffer[start + 1:pos])))
+                self.stats_waiter = None
+        del buffer[:pos]
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self.running:
+            self.totals["disconnects"] += 1
+
+    async def query_stats(self):
+        self.stats_waiter = asyncio.get_running_loop().create_future()
+        self.transport.write(bytes((MSG_STATS,)))
+        return await self.stats_waiter
+
+
+class StatsClient(Bot):
+    # 統計の問い合わせだけに使う接続（プレイはしない）
+    def connection_made(self, transport):
+        self.transport = transport
+
+
+async def start_subprocess_server(host, send_every):
+    # サーバーを別プロセスで起こす（負荷生成側の CPU が計測に混ざらないように）
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "serve", "--host", host, "--port", "0", "--send-every", str(send_every),
+        stdout=asyncio.subprocess.PIPE)
+    line = (await process.stdout.readline()).decode()
+    if not line.startswith("serving on"):
+        process.kill()
+        raise RuntimeError(f"server did not start: {line!r}")
+    return process, int(line.rsplit(":", 1)[1])
+
+
+async def loadtest(args):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, args.sessions * 2 + 256)), hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    loop = asyncio.get_running_loop()
+    process = None
+    host, port = args.host, args.port
+    if not args.external:
+        process, port = await start_subprocess_server(host, args.send_every)
+
+    totals = {"deltas": 0, "delta_bytes": 0, "snapshot_bytes": 0, "runs": 0, "mismatches": 0,
+              "disconnects": 0, "replays": [], "keep_replays": args.verify}
+    rng = random.Random(0)
+    bots = []
+    try:
+        _, control = await loop.create_connection(lambda: StatsClient("", rng, totals), host, port)
+        for i in range(args.sessions):
+            _, bot = await loop.create_connection(
+                lambda: Bot(f"bot{i}", random.Random(rng.random()), totals), host, port)
+            bots.append(bot)
+        # 全セッションが揃ってから warmup 秒待って計測を始める
+        await asyncio.sleep(args.warmup)
+        before = await control.query_stats()
+        deltas_before = totals["deltas"]
+        await asyncio.sleep(args.seconds)
+        after = await control.query_stats()
+        deltas = totals["deltas"] - deltas_before
+        for bot in bots:
+            bot.running = False
+            if bot.transport is not None:
+                bot.transport.close()
+        control.running = False
+        control.transport.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+    wall = after["wall"] - before["wall"]
+    cpu = after["cpu"] - before["cpu"]
+    ticks = after["ticks"] - before["ticks"]
+    session_ticks = after["session_ticks"] - before["session_ticks"]
+    print(f"{args.sessions} sessions for {wall:.1f}s: {ticks / wall:.1f} ticks/s "
+          f"(target {after['tick_rate']}), {session_ticks / wall:,.0f} session-ticks/s")
+    print(f"server cpu {cpu / wall * 100:.0f}% of a core -> "
+          f"{session_ticks / max(cpu, 1e-9) / after['tick_rate']:,.0f} sessions per core")
+    print(f"tick work p50 {after['tick_p50_ms']:.2f}ms  p99 {after['tick_p99_ms']:.2f}ms  "
+          f"max {after['tick_max_ms']:.2f}ms  (budget {1000 / after['tick_rate']:.2f}ms)")
+    print(f"dropped ticks {after['dropped_ticks'] - before['dropped_ticks']}, "
+          f"dropped inputs {after['dropped_inputs'] - before['dropped_inputs']}, "
+          f"slow clients {after['slow_clients']}, disconnects {totals['disconnects']}")
+    per_session = wall * max(args.sessions, 1)
+    print(f"per session: down {(after['bytes'] - before['bytes']) / per_session:,.0f} B/s in "
+          f"{(after['writes'] - before['writes']) / per_session:.0f} writes/s, "
+          f"up {(after['bytes_in'] - before['bytes_in']) / per_session:,.1f} B/s; "
+          f"delta {totals['delta_bytes'] / max(totals['deltas'], 1):.1f} B/tick vs snapshot "
+          f"{totals['snapshot_bytes'] / max(totals['deltas'], 1):.1f} B/tick, {deltas:,} deltas received")
+
+    failed = 0
+    for data, score, game_time in totals["replays"]:
+        if not verify(data, score, game_time)["ok"]:
+            failed += 1
+    print(f"{totals['runs']} runs finished, {totals['mismatches']} mirror mismatches, "
+          f"{len(totals['replays'])} replays verified ({failed} failed)")
+    return 1 if failed or totals["mismatches"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator multi-session game server")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve")
+    serve_parser.add_argument("--data", help="終わったプレイを登録するランキングのディレクトリ")
+    serve_parser.add_argument("--top", type=int, default=100, help="保持する上位件数")
+    serve_parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    serve_parser.add_argument("--send-every", type=int, default=1, help="何ティックごとに差分を書き出すか")
+    load_parser = sub.add_parser("loadtest")
+    load_parser.add_argument("--sessions", type=int, default=500)
+    load_parser.add_argument("--seconds", type=float, default=10.0)
+    load_parser.add_argument("--warmup", type=float, default=2.0)
+    load_parser.add_argument("--verify", type=int, default=50, help="再生して確かめるリプレイの数")
+    load_parser.add_argument("--send-every", type=int, default=1, help="起動するサーバーの --send-every")
+    load_parser.add_argument("--external", action="store_true", help="起動済みのサーバーに接続する")
+    for p in (serve_parser, load_parser):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return asyncio.run(loadtest(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
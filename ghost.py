@@ -0,0 +1,267 @@
+import heapq
+import os
+import queue
+import struct
+import sys
+import threading
+from array import array
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+# ゴースト（過去のプレイの飛行機の軌跡）
+# 1プレイ分の飛行機の x をティックごとに int16 の差分列として保存する。
+# KEYFRAME_INTERVAL ティックごとに差分ではなく絶対座標（キーフレーム）を置くので、
+# 途中のティックへ飛ぶときも直前のキーフレームから足し上げるだけで済む。
+# 再生側（GhostTrack）はファイルを mmap して int16 のビュー（memoryview.cast）を
+# 添字で読むだけなので、毎フレームのファイル I/O やバッファの確保はなく、
+# ページは OS が必要になった分だけ読み込む。
+#
+# ファイル名は登録番号（seq）、ヘッダに得点と名前を持つので、どの軌跡を
+# 再生するかはヘッダだけ読めば決められる（best_ghosts）。
+# GhostStore は上位 n 件の軌跡だけを残す：圏外のプレイは書かず、押し出された
+# ファイルは消す（起動時に読むヘッダの数がプレイ回数に比例して増えないように）。
+# 書き込みと削除は書き込みスレッドで行い、ゲームオーバーのフレームを止めない。
+#
+# 形式（リトルエンディアン）: MAGIC, version(u16), キーフレーム間隔(u16), ticks(u32),
+#       score(u32), 名前(UTF-8, 32バイトまで0埋め), int16 × ticks
+# i 番目の値は i+1 ティック目を終えたときの x（i がキーフレーム間隔の倍数なら絶対値）
+
+MAGIC = b"SNG\0"
+VERSION = 1
+KEYFRAME_INTERVAL = 64
+NAME_BYTES = 32
+HEADER = struct.Struct(f"<4sHHII{NAME_BYTES}s")
+GHOST_SUFFIX = ".sng"
+
+
+class GhostError(ValueError):
+    pass
+
+
+def _encode_name(name):
+    # 32バイトに収まるように文字単位で切る
+    data = name.encode("utf-8")
+    while len(data) > NAME_BYTES:
+        name = name[:-1]
+        data = name.encode("utf-8")
+    return data
+
+
+def _unpack_header(data, path):
+    if len(data) < HEADER.size:
+        raise GhostError(f"{path}: truncated ghost")
+    magic, version, interval, ticks, score, name = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or not interval:
+        raise GhostError(f"{path}: not a ghost file")
+    return interval, ticks, score, name.rstrip(b"\0").decode("utf-8", "replace")
+
+
+def read_header(path):
+    # (キーフレーム間隔, ticks, score, 名前)
+    with open(path, "rb") as f:
+        return _unpack_header(f.read(HEADER.size), path)
+
+
+def write_atomic(path, data):
+    # 一時ファイルに書いてから置き換える（再生中のファイルを途中で壊さない）
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def ghost_sort_key(ghost):
+    # (score, seq, ...) を上位から並べるキー。同点なら先に登録した方（seq が小さい方）が上
+    return -ghost[0], ghost[1]
+
+
+def best_ghosts(directory, n):
+    # directory の軌跡から上位 n 件（None なら全件）の (score, seq, path, 名前)
+    found = []
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            stem, suffix = os.path.splitext(filename)
+            if suffix != GHOST_SUFFIX or not stem.isdigit():
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                _, _, score, name = read_header(path)
+            except (OSError, GhostError):
+                continue
+            found.append((score, int(stem), path, name))
+    if n is None:
+        return sorted(found, key=ghost_sort_key)
+    return heapq.nsmallest(n, found, key=ghost_sort_key)
+
+
+class GhostStore:
+    def __init__(self, directory, n, background=True):
+        # 上位 n 件を読み、それ以外の軌跡（以前の版が残したものなど）は消す
+        self.directory = directory
+        self.n = n
+        found = best_ghosts(directory, None)
+        self.best = found[:n]
+        self.queue = queue.Queue()
+        self.writer = None
+        if background:
+            try:
+                self.writer = threading.Thread(target=self._writer_loop, name="ghost-writer", daemon=True)
+                self.writer.start()
+            except RuntimeError:
+                # Pyodide など、スレッドが使えない環境
+                self.writer = None
+        if found[n:]:
+            self._submit(None, None, [path for _, _, path, _ in found[n:]])
+
+    def path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{GHOST_SUFFIX}")
+
+    def qualifies(self, score, seq):
+        return len(self.best) < self.n or ghost_sort_key((score, seq)) < ghost_sort_key(self.best[-1])
+
+    def save(self, recorder, seq, score, name):
+        # 上位 n 件に入るときだけ保存し、押し出された軌跡を消す。入ったら True
+        if not self.qualifies(score, seq):
+            return False
+        path = self.path(seq)
+        self.best.append((score, seq, path, name))
+        self.best.sort(key=ghost_sort_key)
+        dropped = [ghost[2] for ghost in self.best[self.n:]]
+        del self.best[self.n:]
+        # 中身はここで確定させる（recorder はすぐ次のプレイに使い回されうる）
+        self._submit(path, recorder.encode(score, name), dropped)
+        return True
+
+    def _submit(self, path, data, dropped):
+        if self.writer is None:
+            self._write(path, data, dropped)
+        else:
+            self.queue.put((path, data, dropped))
+
+    def _write(self, path, data, dropped):
+        if path is not None:
+            try:
+                write_atomic(path, data)
+            except OSError:
+                pass
+        for old in dropped:
+            try:
+                os.remove(old)
+            except OSError:
+                # 再生中で消せない（Windows）などは次の起動時に消す
+                pass
+
+    def _writer_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            self._write(*item)
+            self.queue.task_done()
+
+    def wait(self):
+        # 書き込み待ちがなくなるまで待つ（保存したばかりの軌跡を開く前に）
+        if self.writer is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+class GhostRecorder:
+    def __init__(self, interval=KEYFRAME_INTERVAL):
+        self.interval = interval
+        self.values = array("h")
+        self.last = 0
+
+    def record(self, x):
+        if len(self.values) % self.interval == 0:
+            self.values.append(x)
+        else:
+            self.values.append(x - self.last)
+        self.last = x
+
+    def encode(self, score=0, name=""):
+        values = self.values
+        if sys.byteorder != "little":
+            values = array("h", values)
+            values.byteswap()
+        header = HEADER.pack(MAGIC, VERSION, self.interval, len(values), score, _encode_name(name))
+        return header + values.tobytes()
+
+    def save(self, path, score=0, name=""):
+        write_atomic(path, self.encode(score, name))
+
+
+class GhostTrack:
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise GhostError("ghost playback needs a little-endian host")
+        self.file = open(path, "rb")
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            # mmap が使えない環境（Pyodide の一部など）では開くときに一度だけ読む
+            self.buffer = self.file.read()
+        try:
+            interval, ticks, score, name = _unpack_header(self.buffer, path)
+            if len(self.buffer) < HEADER.size + ticks * 2:
+                raise GhostError(f"{path}: truncated ghost")
+        except GhostError:
+            self.close()
+            raise
+        self.interval = interval
+        self.ticks = ticks
+        self.score = score
+        self.name = name
+        self.values = memoryview(self.buffer)[HEADER.size:HEADER.size + ticks * 2].cast("h")
+        self.index = -1
+        # 最初のキーフレームの位置から始める（0 だと画面左端から飛んでくる）
+        self.x = self.prev_x = self.values[0] if ticks else 0
+
+    def seek(self, index):
+        # index を含む区間のキーフレームから足し上げる
+        values = self.values
+        interval = self.interval
+        start = index - index % interval
+        x = values[start]
+        prev_x = x
+        for i in range(start + 1, index + 1):
+            prev_x = x
+            x += values[i]
+        self.index = index
+        self.x, self.prev_x = x, prev_x
+
+    def advance(self, index):
+        # index 番目（ティック index+1）の位置へ進めて True。軌跡が終わっていれば False。
+        # 前回の続きなら差分を足すだけ、戻ったり大きく飛んだりしたときは seek する
+        if index >= self.ticks:
+            return False
+        if index < self.index or index - self.index > self.interval:
+            self.seek(index)
+            return True
+        values = self.values
+        interval = self.interval
+        while self.index < index:
+            self.index += 1
+            self.prev_x = self.x
+            value = values[self.index]
+            self.x = value if self.index % interval == 0 else self.x + value
+        return True
+
+    def close(self):
+        values = getattr(self, "values", None)
+        if values is not None:
+            values.release()
+            self.values = None
+        if mmap is not None and isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.file.close()
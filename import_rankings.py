@@ -0,0 +1,422 @@
+import argparse
+import glob
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from leaderboard import Leaderboard, history_paths, iter_log, load_ranking_file, make_entry
+
+# ランキングの一括取り込み
+# 次のどの形のエクスポートも、ファイル全体を読み込まずに先頭から1回だけ読んで
+# save_web_score / get_web_ranking と同じ Leaderboard（追記ログ + 上位表）へ登録する。
+# ・ranking-data.json / ranking.json：{"name", "score", "time", "date"} の配列
+# ・game.html の localStorage：skyNavigatorRanking / skyNavigatorOnlineBackup の値
+#   （配列そのもの、または localStorage を丸ごと書き出した {"キー": "JSON 文字列"}）
+# ・DynamoDB の sky-navigator-ranking：{"playerId", "playerName", "score", "time",
+#   "date", "timestamp"}。scan の出力 {"Items": [...]}、S3 エクスポートの JSON Lines
+#   （1行 {"Item": {...}}）、型付きの属性値 {"N": "485"} のどれでもよい
+# JSON（1つの値）と JSON Lines（値の並び）は区別せずに、値を順に読む。配列は要素ごとに、
+# 大きなオブジェクトはキーごとに読むので、メモリはチャンク（1 MiB）と記録1件分で済む
+# （重複判定のために記録ごとにキーの 64 ビットハッシュを1つ持つ分だけは件数に比例する。SeenKeys）。
+#
+# 重複は playerId、なければ 名前 + timestamp（game.html の playerId と同じ
+# "名前_timestamp" の形）、どちらもなければ 名前・得点・時間・日付の組で判定する。
+# 判定キーは登録する記録の "id" に残すので、同じエクスポートをもう一度取り込んでも増えない。
+#
+# python import_rankings.py ranking-data.json export/*.json.gz --data leaderboard_data
+
+CHUNK_CHARS = 1 << 20
+# これより大きい配列以外の値は、まとめて読まずにキーごとに読む
+WHOLE_VALUE_CHARS = 4 << 20
+# 記録1件（と、丸ごと読む値）の上限
+MAX_VALUE_CHARS = 64 << 20
+
+NAME_FIELDS = ("name", "playerName", "player_name", "player")
+TIME_FIELDS = ("time", "time_survived", "survived")
+ID_FIELDS = ("id", "playerId", "player_id")
+TIMESTAMP_FIELDS = ("timestamp", "ts")
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class _TooLarge(Exception):
+    pass
+
+
+class JsonStream:
+    # テキストを CHUNK_CHARS ずつ読み、json.JSONDecoder.raw_decode で値を1つずつ取り出す
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        # これまでに捨てた文字数（buffer[0] のファイル先頭からの位置）
+        self.offset = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        # 読み終えた部分を捨てて1チャンク足す。もう読むものがなければ False
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.offset += self.pos
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # 空白を飛ばして次の文字（終わりなら ""）
+        pos = self.pos
+        if pos < len(self.buffer) and self.buffer[pos] not in " \t\r\n":
+            return self.buffer[pos]
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ImportFormatError(f"expected {char!r} near {self.buffer[self.pos:self.pos + 40]!r}")
+        self.pos += 1
+
+    def value(self, limit=MAX_VALUE_CHARS):
+        # 次の値を丸ごと読む。途中で切れていれば読み足し、limit を超えたら _TooLarge
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if len(self.buffer) - self.pos > limit:
+                    raise _TooLarge()
+                if not self.fill():
+                    raise ImportFormatError(str(e)) from None
+                continue
+            # 数値はチャンクの境目で切れていても読めてしまう（"12" | "3"）
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def array_values(self):
+        # 配列を要素ごとに
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ImportFormatError(f"expected ',' or ']' in array, got {char!r}")
+
+    def records(self):
+        # 先頭から値を順に読み、記録の候補（dict）を返す
+        while self.peek():
+            yield from self._records_in_value()
+
+    def _records_in_value(self):
+        char = self.peek()
+        if char == "[":
+            for value in self.array_values():
+                yield from expand(value)
+        elif char == "{":
+            # 読み足すと buffer の先頭が捨てられてずれるので、位置はファイル先頭から数える
+            start = self.offset + self.pos
+            try:
+                value = self.value(WHOLE_VALUE_CHARS)
+            except _TooLarge:
+                # scan の出力などの大きな入れ物：キーごとに読み、値の配列は要素ごとに流す
+                self.pos = start - self.offset
+                yield from self._object_records()
+            else:
+                yield from expand(value)
+        else:
+            try:
+                yield from expand(self.value())
+            except _TooLarge:
+                raise ImportFormatError("value too large") from None
+
+    def _object_records(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ImportFormatError("object key is not a string")
+            self.expect(":")
+            yield from self._records_in_value()
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ImportFormatError(f"expected ',' or '}}' in object, got {char!r}")
+
+
+def expand(value):
+    # 読んだ値から記録の候補を取り出す
+    if isinstance(value, list):
+        for item in value:
+            yield from expand(item)
+    elif isinstance(value, dict):
+        if "score" in value:
+            yield value
+        elif isinstance(value.get("Item"), dict):
+            yield value["Item"]
+        else:
+            # {"Items": [...]} や localStorage の書き出し（値が JSON 文字列）
+            for item in value.values():
+                yield from expand(item)
+    elif isinstance(value, str) and value.lstrip()[:1] in ("[", "{"):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return
+        yield from expand(parsed)
+
+
+def _plain(value):
+    # DynamoDB の型付き属性値をふつうの値に
+    if isinstance(value, dict) and len(value) == 1:
+        (tag, inner), = value.items()
+        if tag in ("S", "N", "BOOL"):
+            return inner
+        if tag == "NULL":
+            return None
+    return value
+
+
+def _first(record, fields):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and value != "":
+            return value
+    return None
+
+
+def _integer(value):
+    if type(value) is int:
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None
+
+
+def normalize(record):
+    # (重複判定キー, 登録する記録) を返す。ランキングに載せられない記録なら None
+    if isinstance(record.get("score"), dict):
+        record = {field: _plain(value) for field, value in record.items()}
+    name = record.get("name") or _first(record, NAME_FIELDS)
+    score = _integer(record["score"])
+    if not isinstance(name, str) or not name.strip() or score is None or score < 0:
+        return None
+    time_survived = _integer(_first(record, TIME_FIELDS))
+    if time_survived is None or time_survived < 0:
+        time_survived = 0
+    date = record.get("date")
+    timestamp = _integer(_first(record, TIMESTAMP_FIELDS))
+    player_id = _first(record, ID_FIELDS)
+    if player_id is not None:
+        key = str(player_id)
+    elif timestamp is not None:
+        key = f"{name}_{timestamp}"
+    else:
+        key = f"{name}\0{score}\0{time_survived}\0{date}"
+    if not isinstance(date, str) or not date:
+        date = None
+        if timestamp is not None:
+            try:
+                date = datetime.fromtimestamp(timestamp / 1000, timezone.utc).strftime("%Y-%m-%d")
+            except (OverflowError, OSError, ValueError):
+                pass
+    entry = make_entry(name, score, time_survived, date)
+    entry["id"] = key
+    return key, entry
+
+
+def open_text(path):
+    # (生のファイル, テキスト) を返す。.gz は展開しながら読む。"-" は標準入力
+    raw = sys.stdin.buffer if path == "-" else open(path, "rb")
+    stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+    return raw, io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+
+
+class SeenKeys:
+    # 重複判定キーの 64 ビットハッシュの集合。整列済みの int64 配列（ラン）をいくつか持ち、
+    # 同じくらいの大きさのランが並んだら併合する（LSM 木と同じ考え方で、ランの数は
+    # 件数の対数程度）。1件 8 バイトなので、Python の set（1件 70 バイトほど）と比べて
+    # 数千万件のエクスポートでもメモリに収まる
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def add_new(self, hashes):
+        # hashes のうちまだ見ていないもの（同じ配列の中では最初の1つ）の添字を元の順で返し、集合に加える
+        unique, first = np.unique(np.asarray(hashes, dtype=np.int64), return_index=True)
+        fresh = np.ones(len(unique), dtype=bool)
+        for run in self.runs:
+            found = np.minimum(np.searchsorted(run, unique), len(run) - 1)
+            fresh &= run[found] != unique
+        unique = unique[fresh]
+        if len(unique):
+            while self.runs and len(self.runs[-1]) <= len(unique):
+                unique = np.sort(np.concatenate((self.runs.pop(), unique)))
+            self.runs.append(unique)
+        return np.sort(first[fresh])
+
+
+class Importer:
+    # 記録は batch_size 件ごとにまとめて、重複を除いてから Leaderboard に登録する
+    def __init__(self, leaderboard, batch_size=10000, progress=2.0):
+        self.leaderboard = leaderboard
+        self.batch_size = batch_size
+        self.progress = progress
+        self.seen = SeenKeys()
+        self.keys = []
+        self.batch = []
+        self.stats = {"records": 0, "imported": 0, "duplicates": 0, "skipped": 0}
+
+    def remember_existing(self, seed_files=()):
+        # 取り込み済みの記録（"id" 付き）と初回の取り込みファイルを重複判定に入れる
+        keys = []
+        for path in history_paths(self.leaderboard.directory) + [self.leaderboard.log_path]:
+            for record, _ in iter_log(path):
+                key = record["entry"].get("id")
+                if key is not None:
+                    keys.append(hash(key))
+                    if len(keys) >= self.batch_size:
+                        self.seen.add_new(keys)
+                        keys = []
+        for path in seed_files:
+            if os.path.exists(path):
+                for record in load_ranking_file(path):
+                    normalized = normalize(record)
+                    if normalized:
+                        keys.append(hash(normalized[0]))
+        self.seen.add_new(keys)
+
+    def add(self, record):
+        stats = self.stats
+        stats["records"] += 1
+        normalized = normalize(record) if isinstance(record, dict) and "score" in record else None
+        if normalized is None:
+            stats["skipped"] += 1
+            return
+        self.keys.append(hash(normalized[0]))
+        self.batch.append(normalized[1])
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            fresh = self.seen.add_new(self.keys)
+            entries = [self.batch[i] for i in fresh.tolist()]
+            self.stats["duplicates"] += len(self.batch) - len(entries)
+            self.keys = []
+            self.batch = []
+            if entries:
+                self.leaderboard.submit_many(entries)
+                self.stats["imported"] += len(entries)
+
+    def import_file(self, path):
+        raw, text = open_text(path)
+        size = os.path.getsize(path) if path != "-" else 0
+        started = time.perf_counter()
+        last_report = started
+        records_before = self.stats["records"]
+        try:
+            for record in JsonStream(text).records():
+                self.add(record)
+                if self.stats["records"] & 4095 == 0:
+                    now = time.perf_counter()
+                    if now - last_report >= self.progress:
+                        last_report = now
+                        self.report(path, raw, size, now - started, self.stats["records"] - records_before)
+            self.flush()
+        finally:
+            if raw is not sys.stdin.buffer:
+                text.close()
+                raw.close()
+        elapsed = time.perf_counter() - started
+        self.report(path, raw, size, elapsed, self.stats["records"] - records_before, done=True)
+
+    def report(self, path, raw, size, elapsed, records, done=False):
+        position = size if done else (raw.tell() if size else 0)
+        where = f"{position / size:6.1%}" if size else "      "
+        stats = self.stats
+        print(f"{path}: {where} {records:,} records in {elapsed:.1f}s "
+              f"({records / max(elapsed, 1e-9):,.0f}/s, {position / max(elapsed, 1e-9) / 2 ** 20:.1f} MiB/s)  "
+              f"imported {stats['imported']:,}  duplicates {stats['duplicates']:,}  "
+              f"skipped {stats['skipped']:,}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator ranking bulk importer")
+    parser.add_argument("paths", nargs="+", help="JSON / JSON Lines files (.gz ok), globs or - for stdin")
+    parser.add_argument("--data", default="leaderboard_data")
+    parser.add_argument("--top", type=int, default=100, help="保持する上位件数")
+    parser.add_argument("--seed", nargs="*", default=["ranking-data.json"],
+                        help="Leaderboard が初回起動時に取り込むランキングファイル")
+    parser.add_argument("--batch", type=int, default=10000, help="まとめて登録する件数")
+    parser.add_argument("--progress", type=float, default=2.0, help="経過を表示する間隔（秒）")
+    args = parser.parse_args(argv)
+
+    paths = [p for pattern in args.paths for p in (sorted(glob.glob(pattern)) or [pattern])]
+    # 書き込みスレッドを使わない：登録はバッチごとにその場で書くので、読むのが速くても
+    # 書き込み待ちの記録がメモリに溜まらない
+    leaderboard = Leaderboard(args.data, k=args.top, seed_files=args.seed, background=False)
+    importer = Importer(leaderboard, args.batch, args.progress)
+    failed = 0
+    started = time.perf_counter()
+    try:
+        importer.remember_existing(args.seed)
+        for path in paths:
+            try:
+                importer.import_file(path)
+            except (OSError, EOFError, ImportFormatError) as e:
+                importer.flush()
+                failed += 1
+                print(f"{path}: {e}", file=sys.stderr)
+    finally:
+        leaderboard.close()
+    elapsed = time.perf_counter() - started
+    stats = importer.stats
+    print(f"{len(paths)} files, {stats['records']:,} records in {elapsed:.1f}s "
+          f"({stats['records'] / max(elapsed, 1e-9):,.0f}/s): imported {stats['imported']:,}, "
+          f"duplicates {stats['duplicates']:,}, skipped {stats['skipped']:,}, failed files {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
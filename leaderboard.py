@@ -0,0 +1,327 @@
+import glob
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from rank_index import RankIndex
+
+# 永続ランキングストア
+# ・登録はすべて追記ログ（JSON Lines）に書く。fsync は件数か時間でまとめて行う
+# ・メモリ上には上位 K 件だけを最小ヒープで持つので、登録は O(log K)
+# ・上位 K 件のスナップショットは一時ファイル + os.replace で原子的に書き換える
+# ・ログが大きくなったら、スナップショットを書いたうえで history/ へ丸ごと
+#   移す（圧縮）。起動時に読むのはスナップショットと現行ログだけで済み、
+#   過去ログは全履歴が必要な処理のために残る
+# ・index=True なら過去ログも含む全記録から RankIndex（全体順位・自己ベスト）を作る
+# ・ディスク書き込みは専用スレッドで行い、ゲームオーバー時にフレームを止めない
+#   （スレッドが使えない環境では登録時にその場で書く）
+
+SNAPSHOT_FILE = "top.json"
+LOG_FILE = "scores.log"
+HISTORY_DIR = "history"
+
+
+def make_entry(name, score, time_survived, date=None, replay=None):
+    # ランキング1件の形式（save_web_score と leaderboard_service で共通）
+    if not isinstance(name, str) or not name:
+        raise ValueError("name must be a non-empty string")
+    # bool は int のサブクラスなので明示的に弾く
+    for value in (score, time_survived):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError("score and time must be non-negative integers")
+    entry = {
+        "name": name,
+        "score": score,
+        "time": time_survived,
+        "date": date or datetime.now().strftime("%m-%d %H:%M")
+    }
+    if replay:
+        entry["replay"] = replay
+    return entry
+
+
+def _ranking_key(entry, seq):
+    # 同点なら先に登録した方が上位
+    return (entry["score"], -seq)
+
+
+def _push_top(heap, k, entry, seq):
+    # 上位 k 件の最小ヒープ heap に入れる。上位に入ったら True
+    item = (_ranking_key(entry, seq), seq, entry)
+    if len(heap) < k:
+        heapq.heappush(heap, item)
+    elif item[0] > heap[0][0]:
+        heapq.heapreplace(heap, item)
+    else:
+        return False
+    return True
+
+
+def atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def iter_log(path):
+    # 正しく読めた行の (レコード, 行末のオフセット) を順に返す。途中で壊れた
+    # （書き込み中に落ちた）行があればそこで打ち切る
+    if not os.path.exists(path):
+        return
+    good_offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            good_offset += len(line)
+            yield record, good_offset
+
+
+def read_log(path):
+    records = []
+    good_offset = 0
+    for record, good_offset in iter_log(path):
+        records.append(record)
+    return records, good_offset
+
+
+def history_paths(directory):
+    # 古い順の過去ログ（ファイル名の seq でゼロ埋めしているので名前順でよい）
+    return sorted(glob.glob(os.path.join(directory, HISTORY_DIR, "scores-*.log")))
+
+
+def load_ranking_file(path):
+    # ranking-data.json 形式（{"name", "score", "time", "date"} の配列）
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return [entry for entry in data if isinstance(entry, dict) and "score" in entry]
+
+
+class Leaderboard:
+    def __init__(self, directory, k=10, seed_files=(), fsync_every=32, fsync_interval=1.0,
+                 snapshot_interval=2.0, rotate_bytes=4 * 1024 * 1024, background=True, index=False):
+        self.directory = directory
+        self.k = k
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.rotate_bytes = rotate_bytes
+        self.heap = []
+        # 上位表が変わるたびに増える（キャッシュの無効化用）
+        self.version = 0
+        self.next_seq = 1
+        self.snapshot_seq = 0
+        self.lock = threading.Lock()
+        self.index = RankIndex() if index else None
+        os.makedirs(os.path.join(directory, HISTORY_DIR), exist_ok=True)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self._load(seed_files)
+
+        self.log = open(self.log_path, "ab")
+        self.pending_sync = 0
+        # ログに書き終えた最大の seq と、そこまでの記録だけで作った上位表。
+        # スナップショットはこちらから作る（self.heap には書き込み待ちの分も入っているので、
+        # 書き込み前に落ちるとログにない記録がスナップショットにだけ残ってしまう）
+        self.written_seq = self.next_seq - 1
+        self.written_heap = list(self.heap)
+        self.last_sync = self.last_snapshot = time.monotonic()
+        self.dirty = False
+        self.queue = queue.Queue()
+        self.writer = None
+        if background:
+            try:
+                self.writer = threading.Thread(target=self._writer_loop, name="leaderboard-writer", daemon=True)
+                self.writer.start()
+            except RuntimeError:
+                # Pyodide / pygbag などスレッドが使えない環境
+                self.writer = None
+
+    def _push(self, entry, seq):
+        if not _push_top(self.heap, self.k, entry, seq):
+            return False
+        self.version += 1
+        return True
+
+    def _load(self, seed_files):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.snapshot_seq = snapshot["seq"]
+            for seq, entry in snapshot["top"]:
+                self._push(entry, seq)
+            self.next_seq = self.snapshot_seq + 1
+        else:
+            # 初回起動：既存のランキングファイルを取り込む（ログには書かない）
+            for path in seed_files:
+                if os.path.exists(path):
+                    for entry in load_ranking_file(path):
+                        self._push(entry, self.next_seq)
+                        self.next_seq += 1
+
+        records, good_offset = read_log(self.log_path)
+        if os.path.exists(self.log_path) and good_offset != os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good_offset)
+        for record in records:
+            seq = record["seq"]
+            if seq > self.snapshot_seq:
+                self._push(record["entry"], seq)
+            self.next_seq = max(self.next_seq, seq + 1)
+        if self.index is not None:
+            self._load_index(seed_files, records)
+
+    def _load_index(self, seed_files, records):
+        self.index.add_many(self._history_records(seed_files, records))
+
+    def _history_records(self, seed_files, records):
+        # 過去ログ → 現行ログの順に全記録を返す。ログに載らない初回の取り込み分は
+        # 最初のログ記録より前の seq なので、取り込みをやり直して補う
+        first_seq = None
+        for path in history_paths(self.directory):
+            for record, _ in iter_log(path):
+                if first_seq is None:
+                    first_seq = record["seq"]
+                yield record["entry"], record["seq"]
+        for record in records:
+            if first_seq is None:
+                first_seq = record["seq"]
+            yield record["entry"], record["seq"]
+        if first_seq is None:
+            first_seq = self.next_seq
+        seq = 1
+        for path in seed_files:
+            if os.path.exists(path):
+                for entry in load_ranking_file(path):
+                    if seq >= first_seq:
+                        return
+                    yield entry, seq
+                    seq += 1
+
+    def submit(self, entry):
+        # 上位表への反映はその場で、ディスクへの書き込みは書き込みスレッドで
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self._push(entry, seq)
+            if self.index is not None:
+                self.index.add(entry, seq)
+        record = {"seq": seq, "entry": entry}
+        if self.writer is not None:
+            self.queue.put(record)
+        else:
+            self._write_batch([record])
+            self._maintain(force_sync=True)
+        return seq
+
+    def submit_many(self, entries):
+        # まとめて登録（ロックは一度だけ）。登録した seq のリストを返す
+        with self.lock:
+            first = self.next_seq
+            for entry in entries:
+                self._push(entry, self.next_seq)
+                if self.index is not None:
+                    self.index.add(entry, self.next_seq)
+                self.next_seq += 1
+            last = self.next_seq
+        records = [{"seq": seq, "entry": entry} for seq, entry in zip(range(first, last), entries)]
+        if self.writer is not None:
+            for record in records:
+                self.queue.put(record)
+        elif records:
+            self._write_batch(records)
+            self._maintain(force_sync=True)
+        return list(range(first, last))
+
+    def top(self, n=None):
+        with self.lock:
+            ordered = sorted(self.heap, reverse=True)
+        return [entry for _, _, entry in ordered[:n]]
+
+    def _write_batch(self, records):
+        self.log.write(b"".join(
+            json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in records))
+        self.log.flush()
+        for r in records:
+            _push_top(self.written_heap, self.k, r["entry"], r["seq"])
+        self.written_seq = records[-1]["seq"]
+        self.pending_sync += len(records)
+        self.dirty = True
+
+    def _maintain(self, force_sync=False):
+        now = time.monotonic()
+        if self.pending_sync and (force_sync or self.pending_sync >= self.fsync_every
+                                  or now - self.last_sync >= self.fsync_interval):
+            os.fsync(self.log.fileno())
+            self.pending_sync = 0
+            self.last_sync = now
+        if self.dirty and (force_sync or now - self.last_snapshot >= self.snapshot_interval):
+            self.write_snapshot()
+        if self.log.tell() >= self.rotate_bytes:
+            self.compact()
+
+    def write_snapshot(self):
+        # 書き込みスレッド（なければ登録した側）からだけ呼ぶ。written_heap もそこでしか変わらない
+        seq = self.written_seq
+        top = [[s, entry] for _, s, entry in sorted(self.written_heap, reverse=True)]
+        atomic_write_json(self.snapshot_path, {"seq": seq, "top": top})
+        self.snapshot_seq = seq
+        self.dirty = False
+        self.last_snapshot = time.monotonic()
+
+    def compact(self):
+        # スナップショットが現行ログ全体を含む状態にしてからログを履歴へ移す。
+        # ファイル名はログ末尾の seq（= スナップショットの seq）
+        os.fsync(self.log.fileno())
+        self.pending_sync = 0
+        self.write_snapshot()
+        if self.log.tell() == 0:
+            return
+        self.log.close()
+        archived = os.path.join(self.directory, HISTORY_DIR, f"scores-{self.written_seq:012d}.log")
+        os.replace(self.log_path, archived)
+        self.log = open(self.log_path, "ab")
+
+    def _writer_loop(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                self._maintain()
+                continue
+            if record is None:
+                return
+            batch = [record]
+            stop = False
+            while True:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            self._write_batch(batch)
+            self._maintain()
+            if stop:
+                return
+
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        self._maintain(force_sync=True)
+        self.log.close()
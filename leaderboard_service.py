@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from leaderboard import Leaderboard, make_entry
+
+# ランキング HTTP サービス（asyncio のみ、外部ライブラリなし）
+# GET  /ranking?limit=N  上位 N 件を返す。本文は版ごとに一度だけ作ってキャッシュし、
+#                        ETag が一致すれば 304 を返す。ETag は本文のハッシュ
+#                        （version は起動ごとに数え直すので、再起動をまたいで使えない）
+# POST /scores           1件（オブジェクト）または複数件（配列）を受け付けて 202 を返す。
+#                        実際の登録は取り込みタスクがまとめて行う
+# GET  /rank?score=S     S 点のプレイが全体で何位になるか
+# GET  /rank?name=NAME   プレイヤーの自己ベスト順位と前後の順位表（before / after 件）
+# GET  /health           稼働確認
+# 順位付けは airplane_game_web.py の save_web_score / get_web_ranking と同じ
+# Leaderboard クラスを使う。
+#
+# python leaderboard_service.py serve --port 8765
+# python leaderboard_service.py loadtest --clients 2000
+
+MAX_BODY = 1024 * 1024
+STATUS_TEXT = {200: "OK", 202: "Accepted", 304: "Not Modified", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               431: "Request Header Fields Too Large"}
+
+
+class RequestError(Exception):
+    # 返すべきステータスつきのリクエストエラー（応答したら接続を閉じる）
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def http_response(status, body=b"", content_type="application/json", headers=()):
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+             f"Content-Length: {len(body)}",
+             "Connection: keep-alive",
+             "Access-Control-Allow-Origin: *"]
+    if body:
+        lines.append(f"Content-Type: {content_type}")
+    lines.extend(headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def json_response(status, data, headers=()):
+    return http_response(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+
+async def read_request(reader):
+    # (method, path, query, headers, body) を返す。接続が閉じたら None。
+    # 不正な形式は 400、大きすぎるものは 413 / 431 の RequestError
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise RequestError(431, "request header too large")
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    lines = head.decode("latin-1").split("\r\n")[:-2]
+    request_line = lines[0].split(" ")
+    if len(request_line) != 3 or not request_line[2].startswith("HTTP/"):
+        raise RequestError(400, "bad request line")
+    method, target, _ = request_line
+    headers = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(":")
+        if not sep or not key.strip():
+            raise RequestError(400, "bad header")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise RequestError(400, "bad content-length")
+    if length < 0:
+        raise RequestError(400, "bad content-length")
+    if length > MAX_BODY:
+        raise RequestError(413, "request too large")
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    url = urlsplit(target)
+    return method, url.path, parse_qs(url.query), headers, body
+
+
+class LeaderboardService:
+    def __init__(self, leaderboard, batch_size=512, batch_delay=0.02):
+        self.leaderboard = leaderboard
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.cache = {}
+        self.stats = {"requests": 0, "not_modified": 0, "ingested": 0, "batches": 0}
+
+    def ranking(self, limit, if_none_match):
+        limit = max(1, min(limit, self.leaderboard.k))
+        version = self.leaderboard.version
+        cached = self.cache.get(limit)
+        if cached is None or cached[0] != version:
+            body = json.dumps(self.leaderboard.top(limit), ensure_ascii=False).encode("utf-8")
+            etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+            cached = self.cache[limit] = (version, etag, http_response(
+                200, body, headers=(f"ETag: {etag}", "Cache-Control: no-cache")))
+        if if_none_match == cached[1]:
+            self.stats["not_modified"] += 1
+            return http_response(304, headers=(f"ETag: {cached[1]}",))
+        return cached[2]
+
+    def rank(self, query):
+        index = self.leaderboard.index
+        result = {"runs": index.run_count(), "players": index.player_count()}
+        if "score" in query:
+            result["run_rank"] = index.run_rank(int(query["score"][0]))
+        if "name" in query:
+            name = query["name"][0]
+            before = min(int(query.get("before", ["3"])[0]), 50)
+            after = min(int(query.get("after", ["3"])[0]), 50)
+            result["player_rank"] = index.player_rank(name)
+            result["best"] = index.player_best(name)
+            result["window"] = [{"rank": rank, **entry} for rank, entry in index.window(name, before, after)]
+        return json_response(200, result)
+
+    def accept(self, body):
+        data = json.loads(body)
+        submissions = data if isinstance(data, list) else [data]
+        entries = [make_entry(s["name"], s["score"], s["time"], s.get("date"), s.get("replay"))
+                   for s in submissions]
+        self.pending.extend(entries)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.wakeup.set()
+        return len(entries)
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.leaderboard.submit_many(batch)
+            self.stats["ingested"] += len(batch)
+            self.stats["batches"] += 1
+
+    async def ingest_loop(self):
+        # 少し待ってから溜まった分をまとめて登録する
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            await asyncio.sleep(self.batch_delay)
+            self.flush()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except RequestError as e:
+                    writer.write(json_response(e.status, {"error": str(e)}))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                self.stats["requests"] += 1
+                if path == "/ranking" and method == "GET":
+                    try:
+                        limit = int(query.get("limit", ["10"])[0])
+                    except ValueError:
+                        limit = 10
+                    writer.write(self.ranking(limit, headers.get("if-none-match")))
+                elif path == "/rank" and method == "GET":
+                    try:
+                        writer.write(self.rank(query))
+                    except ValueError as e:
+                        writer.write(json_response(400, {"error": str(e)}))
+                elif path == "/scores" and method == "POST":
+                    try:
+                        accepted = self.accept(body)
+                    except (ValueError, KeyError, TypeError) as e:
+                        writer.write(json_response(400, {"error": str(e)}))
+                    else:
+                        writer.write(json_response(202, {"accepted": accepted}))
+                elif path == "/health":
+                    writer.write(json_response(200, {"ok": True, **self.stats}))
+                elif path in ("/ranking", "/rank", "/scores"):
+                    writer.write(json_response(405, {"error": "method not allowed"}))
+                else:
+                    writer.write(json_response(404, {"error": "not found"}))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def start_service(leaderboard, host, port):
+    service = LeaderboardService(leaderboard)
+    server = await asyncio.start_server(service.handle, host, port, backlog=4096)
+    ingest = asyncio.ensure_future(service.ingest_loop())
+    return service, server, ingest
+
+
+async def serve(args):
+    leaderboard = Leaderboard(args.data, k=args.top, seed_files=args.seed, index=True)
+    service, server, ingest = await start_service(leaderboard, args.host, args.port)
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ingest.cancel()
+        service.flush()
+        leaderboard.close()
+
+
+# ---- 負荷試験 ----
+
+async def load_client(host, port, requests, write_ratio, latencies, counts, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    etag = None
+    try:
+        for _ in range(requests):
+            if rng.random() < write_ratio:
+                body = json.dumps({"name": f"bot{rng.randrange(100000)}", "score": rng.randrange(1000),
+                                   "time": rng.randrange(300)}).encode("utf-8")
+                request = (f"POST /scores HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+            else:
+                conditional = f"If-None-Match: {etag}\r\n" if etag else ""
+                request = f"GET /ranking?limit=30 HTTP/1.1\r\nHost: {host}\r\n{conditional}\r\n".encode("latin-1")
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head[9:12])
+            length = 0
+            for line in head.split(b"\r\n"):
+                lower = line.lower()
+                if lower.startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+                elif lower.startswith(b"etag:"):
+                    etag = line.split(b":", 1)[1].strip().decode("latin-1")
+            if length:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            counts[status] = counts.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def loadtest(args):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, args.clients * 2 + 256)), hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    leaderboard = server = ingest = service = scratch = None
+    host, port = args.host, args.port
+    if not args.external:
+        # --data がなければ使い捨てのディレクトリに書く（ゲームの本物のランキングに bot を混ぜない）
+        data = args.data
+        if not data:
+            data = scratch = tempfile.mkdtemp(prefix="leaderboard-loadtest-")
+        leaderboard = Leaderboard(data, k=args.top, fsync_interval=0.5, index=True)
+        service, server, ingest = await start_service(leaderboard, host, 0)
+        port = server.sockets[0].getsockname()[1]
+
+    try:
+        latencies = []
+        counts = {}
+        rng = random.Random(0)
+        started = time.perf_counter()
+        await asyncio.gather(*(load_client(host, port, args.requests, args.write_ratio, latencies, counts,
+                                           random.Random(rng.random())) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+        print(f"{args.clients:,} clients x {args.requests} requests: {len(latencies):,} responses "
+              f"in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f} req/s)")
+        print(f"latency p50 {pick(0.5):.2f}ms  p90 {pick(0.9):.2f}ms  p99 {pick(0.99):.2f}ms  "
+              f"max {latencies[-1] * 1000:.2f}ms")
+        print("status " + "  ".join(f"{code}: {n:,}" for code, n in sorted(counts.items())))
+        if service:
+            # 取り込み待ちの分を登録し終えてから数える
+            server.close()
+            await server.wait_closed()
+            ingest.cancel()
+            service.flush()
+            leaderboard.close()
+            print(f"ingested {service.stats['ingested']:,} scores in {service.stats['batches']:,} batches")
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator leaderboard service")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve")
+    serve_parser.add_argument("--seed", nargs="*", default=["ranking-data.json"],
+                              help="初回起動時に取り込むランキングファイル")
+    load_parser = sub.add_parser("loadtest")
+    load_parser.add_argument("--clients", type=int, default=2000)
+    load_parser.add_argument("--requests", type=int, default=10)
+    load_parser.add_argument("--write-ratio", type=float, default=0.1)
+    load_parser.add_argument("--external", action="store_true", help="起動済みのサーバーに接続する")
+    serve_parser.add_argument("--data", default="leaderboard_data")
+    load_parser.add_argument("--data", help="保存先（省略時は一時ディレクトリに書いて最後に消す）")
+    for p in (serve_parser, load_parser):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8765)
+        p.add_argument("--top", type=int, default=100, help="保持する上位件数")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args) if args.command == "serve" else loadtest(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import numpy as np
+import pygame
+
+# パーティクルプール
+# 位置・速度・寿命を固定長の配列に確保しておき、リングバッファとして使い回す。
+# 上限を超えて発生させた場合は一番古いものを上書きするので、アイテムを連続で
+# 取っても粒子数（＝1フレームの処理量）は capacity を超えない。
+# set_budget() で使うスロットを先頭の一部に絞れる（画質を下げるとき）。
+# 更新は配列全体への一括演算、描画は色ごとに作っておいたスプライトを
+# Surface.blits でまとめて転送する。
+
+PARTICLE_LIFE = 30
+PARTICLE_RADIUS = 3
+
+
+class ParticlePool:
+    def __init__(self, capacity=256, seed=None):
+        self.capacity = capacity
+        self.budget = capacity
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)
+        self.head = 0
+        self.rng = np.random.default_rng(seed)
+        self.colors = []
+        self.color_index = {}
+        self.sprites = []
+
+    def _color_id(self, color):
+        index = self.color_index.get(color)
+        if index is None:
+            index = len(self.colors)
+            self.colors.append(color)
+            self.color_index[color] = index
+            size = PARTICLE_RADIUS * 2 + 1
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, color, (PARTICLE_RADIUS, PARTICLE_RADIUS), PARTICLE_RADIUS)
+            self.sprites.append(sprite)
+        return index
+
+    def set_budget(self, budget):
+        # 使うスロットを先頭 budget 個にする。外れたスロットの粒子は消す
+        budget = max(1, min(budget, self.capacity))
+        if budget < self.budget:
+            self.life[budget:] = 0
+            self.head %= budget
+        self.budget = budget
+
+    def emit(self, x, y, colors, count):
+        # colors の中からランダムに色を選んで count 個発生させる
+        count = min(count, self.budget)
+        slots = (self.head + np.arange(count)) % self.budget
+        self.head = (self.head + count) % self.budget
+        color_ids = np.array([self._color_id(c) for c in colors], dtype=np.int16)
+        self.x[slots] = x
+        self.y[slots] = y
+        self.vx[slots] = self.rng.uniform(-2, 2, count)
+        self.vy[slots] = self.rng.uniform(-3, -1, count)
+        self.life[slots] = PARTICLE_LIFE
+        self.color[slots] = color_ids[self.rng.integers(0, len(color_ids), count)]
+
+    def clear(self):
+        self.life[:] = 0
+
+    def alive_count(self):
+        return int(np.count_nonzero(self.life))
+
+    def update(self):
+        n = self.budget
+        alive = self.life[:n] > 0
+        self.x[:n] += self.vx[:n] * alive
+        self.y[:n] += self.vy[:n] * alive
+        self.life[:n] -= alive
+
+    def draw(self, surface):
+        # 生きている粒子をまとめて描画し、描画した矩形のリストを返す
+        alive = np.flatnonzero(self.life[:self.budget])
+        if not len(alive):
+            return []
+        xs = (self.x[alive].astype(np.int32) - PARTICLE_RADIUS).tolist()
+        ys = (self.y[alive].astype(np.int32) - PARTICLE_RADIUS).tolist()
+        sprites = self.sprites
+        return surface.blits([(sprites[c], (px, py))
+                              for c, px, py in zip(self.color[alive].tolist(), xs, ys)])
@@ -0,0 +1,142 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+# フレームプロファイラ
+# フレーム内の区切りで mark(フェーズ名) を呼ぶと、前の区切りからの経過時間を
+# そのフェーズの時間として記録する。フェーズごとに直近 window フレーム分の
+# リングバッファと、起動からの累積ヒストグラムを持つ。記録は perf_counter と
+# リストへの代入だけなので、常時有効にしておいても負荷はほぼない。
+# dump() は Chrome のトレース形式（chrome://tracing / Perfetto で開ける）で
+# 直近のフレームと集計を書き出す。
+
+# ヒストグラムの区切り（ミリ秒）。最後の区間はそれ以上すべて
+HISTOGRAM_BOUNDS_MS = (0.25, 0.5, 1, 2, 4, 8, 16.7, 33.3, 66.7)
+FRAME_BUDGET_MS = 1000 / 60
+OVERLAY_REFRESH_FRAMES = 15
+
+
+class PhaseStats:
+    def __init__(self, window):
+        self.samples = [0.0] * window
+        self.index = 0
+        self.count = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, ms):
+        self.samples[self.index] = ms
+        self.index = (self.index + 1) % len(self.samples)
+        if self.count < len(self.samples):
+            self.count += 1
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if ms < bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def summary(self):
+        recent = sorted(self.samples[:self.count])
+        if not recent:
+            return {"mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "mean": sum(recent) / len(recent),
+            "p50": recent[len(recent) // 2],
+            "p99": recent[min(len(recent) - 1, int(len(recent) * 0.99))],
+            "max": recent[-1],
+        }
+
+
+class FrameProfiler:
+    def __init__(self, window=240, trace_frames=600):
+        self.window = window
+        self.phases = {}
+        self.frame = PhaseStats(window)
+        self.trace = deque(maxlen=trace_frames)
+        self.events = []
+        self.frame_start = self.last = time.perf_counter()
+        self.frame_index = 0
+        self.origin = self.frame_start
+        self.overlay_visible = False
+        self.overlay_surface = None
+
+    def begin_frame(self):
+        self.frame_start = self.last = time.perf_counter()
+        self.events = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        ms = (now - self.last) * 1000
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats(self.window)
+        stats.add(ms)
+        self.events.append((phase, self.last, now))
+        self.last = now
+
+    def end_frame(self):
+        self.frame.add((self.last - self.frame_start) * 1000)
+        self.trace.append(self.events)
+        self.frame_index += 1
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_surface = None
+
+    def summary(self):
+        result = {phase: stats.summary() for phase, stats in self.phases.items()}
+        result["frame"] = self.frame.summary()
+        return result
+
+    def build_overlay(self, font):
+        summary = self.summary()
+        rows = [(phase, summary[phase]) for phase in self.phases] + [("frame", summary["frame"])]
+        line_h = font.get_linesize()
+        surface = pygame.Surface((260, line_h * (len(rows) + 1) + 8), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        header = font.render("phase        p50    p99 (ms)", True, (255, 255, 255))
+        surface.blit(header, (6, 4))
+        for i, (phase, stats) in enumerate(rows):
+            y = 4 + line_h * (i + 1)
+            # フレーム予算に対する割合のバー
+            bar = int(min(stats["p50"] / FRAME_BUDGET_MS, 1.0) * 248)
+            color = (80, 200, 120) if stats["p99"] < FRAME_BUDGET_MS / 2 else (230, 160, 40)
+            pygame.draw.rect(surface, color, (6, y + line_h - 3, max(bar, 1), 2))
+            text = font.render(f"{phase:<12}{stats['p50']:6.2f} {stats['p99']:6.2f}", True, (255, 255, 255))
+            surface.blit(text, (6, y))
+        return surface
+
+    def draw_overlay(self, screen, font):
+        # 表示は数フレームごとに作り直す。描いた矩形を返す
+        if not self.overlay_visible:
+            return None
+        if self.overlay_surface is None or self.frame_index % OVERLAY_REFRESH_FRAMES == 0:
+            self.overlay_surface = self.build_overlay(font)
+        rect = self.overlay_surface.get_rect(topright=(screen.get_width() - 10, 10))
+        return screen.blit(self.overlay_surface, rect)
+
+    def dump(self, path):
+        trace_events = []
+        for frame in self.trace:
+            for phase, start, end in frame:
+                trace_events.append({
+                    "name": phase, "ph": "X", "pid": 1, "tid": 1,
+                    "ts": round((start - self.origin) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                })
+        histograms = {phase: stats.histogram for phase, stats in self.phases.items()}
+        histograms["frame"] = self.frame.histogram
+        report = {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "frames": self.frame_index,
+                "summary_ms": self.summary(),
+                "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "histograms": histograms,
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        return path
@@ -0,0 +1,72 @@
+from collections import deque
+
+# 画質ガバナー
+# 直近 window フレームの処理時間（待ち時間を除く）の平均を見て、重ければ
+# QUALITY_TIERS を一段ずつ下げ、余裕が続けば一段ずつ戻す。
+# frame_clock.py が描画フレームレートを落とすのは即効の逃げ道で、こちらは
+# 60fps に戻れるところまで描画の中身を軽くする側。
+# ・切り替えの直後 SETTLE_FRAMES は結果を見るだけで動かない
+# ・上げてすぐに下げることになったら、次に上げるまでの待ちを倍にする（往復の抑制）
+
+# 上から順に重い。particles はパーティクルの上限、gradient が False なら単色背景、
+# labels が False ならアイテムの得点表示なし、scale はプレイ画面の内部解像度の縮小率
+QUALITY_TIERS = (
+    {"name": "high", "particles": 256, "gradient": True, "labels": True, "scale": 1},
+    {"name": "fewer-particles", "particles": 96, "gradient": True, "labels": True, "scale": 1},
+    {"name": "flat-background", "particles": 96, "gradient": False, "labels": True, "scale": 1},
+    {"name": "no-labels", "particles": 64, "gradient": False, "labels": False, "scale": 1},
+    {"name": "half-resolution", "particles": 64, "gradient": False, "labels": False, "scale": 2},
+)
+DEGRADE_RATIO = 0.8
+UPGRADE_RATIO = 0.5
+SETTLE_FRAMES = 30
+UPGRADE_FRAMES = 120
+MAX_UPGRADE_FRAMES = 1920
+
+
+class QualityGovernor:
+    def __init__(self, tiers=QUALITY_TIERS, budget=1 / 60, window=30):
+        self.tiers = tiers
+        self.budget = budget
+        self.recent = deque(maxlen=window)
+        self.level = 0
+        self.since_change = 0
+        self.calm_frames = 0
+        self.upgrade_frames = UPGRADE_FRAMES
+        self.upgraded = False
+
+    @property
+    def tier(self):
+        return self.tiers[self.level]
+
+    def update(self, work_seconds):
+        # 1フレーム分の処理時間を渡す。段が変わったら True
+        self.recent.append(work_seconds)
+        self.since_change += 1
+        if self.since_change < SETTLE_FRAMES:
+            return False
+        average = sum(self.recent) / len(self.recent)
+        if average > self.budget * DEGRADE_RATIO:
+            self.calm_frames = 0
+            if self.level == len(self.tiers) - 1:
+                return False
+            if self.upgraded and self.since_change < SETTLE_FRAMES * 2:
+                self.upgrade_frames = min(self.upgrade_frames * 2, MAX_UPGRADE_FRAMES)
+            self._set_level(self.level + 1)
+            return True
+        if average < self.budget * UPGRADE_RATIO and self.level > 0:
+            self.calm_frames += 1
+            if self.calm_frames >= self.upgrade_frames:
+                self._set_level(self.level - 1)
+                self.upgraded = True
+                return True
+        else:
+            self.calm_frames = 0
+        return False
+
+    def _set_level(self, level):
+        self.level = level
+        self.since_change = 0
+        self.calm_frames = 0
+        self.upgraded = False
+        self.recent.clear()
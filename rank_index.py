@@ -0,0 +1,206 @@
+from bisect import bisect_left, bisect_right, insort
+
+# 全履歴に対する順位インデックス
+# ・SortedKeyList はキーを最大 BUCKET_SIZE 件ずつのソート済みバケットに分けて持ち、
+#   バケットの件数を Fenwick 木で数える。追加・削除・「キーより前に何件あるか」・
+#   「k 番目のキー」がどれも O(log n)（バケット内の挿入は小さな memmove だけ）
+# ・RankIndex は全プレイのキー (-score, seq) と、プレイヤーごとの自己ベストの
+#   キー (-score, seq, name) の2本を持つ。同点は先に登録した方が上位で、
+#   Leaderboard の並びと一致する
+
+BUCKET_SIZE = 1024
+
+
+class SortedKeyList:
+    def __init__(self):
+        self.buckets = []
+        self.maxes = []
+        self.tree = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _rebuild_tree(self):
+        # Fenwick 木（1始まり）をバケットの件数から作り直す
+        tree = [0] * (len(self.buckets) + 1)
+        for i, bucket in enumerate(self.buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, index, delta):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def _count_before(self, index):
+        # buckets[:index] の件数
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def _locate(self, position):
+        # 全体で position 番目（0始まり）が入っているバケットと、その中の位置
+        index = 0
+        step = 1 << (len(self.tree).bit_length() - 1)
+        while step:
+            nxt = index + step
+            if nxt < len(self.tree) and self.tree[nxt] <= position:
+                index = nxt
+                position -= self.tree[nxt]
+            step >>= 1
+        return index, position
+
+    def update(self, keys):
+        # まとめて追加（起動時の読み込み用）。一度ソートしてバケットを作り直す
+        keys = sorted([key for bucket in self.buckets for key in bucket] + list(keys))
+        self.buckets = [keys[i:i + BUCKET_SIZE] for i in range(0, len(keys), BUCKET_SIZE)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.size = len(keys)
+        self._rebuild_tree()
+
+    def add(self, key):
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            self._rebuild_tree()
+        else:
+            index = min(bisect_left(self.maxes, key), len(self.buckets) - 1)
+            bucket = self.buckets[index]
+            insort(bucket, key)
+            self.maxes[index] = bucket[-1]
+            if len(bucket) > BUCKET_SIZE * 2:
+                half = len(bucket) // 2
+                self.buckets[index:index + 1] = [bucket[:half], bucket[half:]]
+                self.maxes[index:index + 1] = [bucket[half - 1], bucket[-1]]
+                self._rebuild_tree()
+            else:
+                self._tree_add(index, 1)
+        self.size += 1
+
+    def remove(self, key):
+        index = bisect_left(self.maxes, key)
+        bucket = self.buckets[index] if index < len(self.buckets) else []
+        pos = bisect_left(bucket, key)
+        if pos == len(bucket) or bucket[pos] != key:
+            raise KeyError(key)
+        del bucket[pos]
+        self.size -= 1
+        if bucket:
+            self.maxes[index] = bucket[-1]
+            self._tree_add(index, -1)
+        else:
+            del self.buckets[index]
+            del self.maxes[index]
+            self._rebuild_tree()
+
+    def bisect_left(self, key):
+        index = bisect_left(self.maxes, key)
+        if index == len(self.buckets):
+            return self.size
+        return self._count_before(index) + bisect_left(self.buckets[index], key)
+
+    def bisect_right(self, key):
+        index = bisect_right(self.maxes, key)
+        if index == len(self.buckets):
+            return self.size
+        return self._count_before(index) + bisect_right(self.buckets[index], key)
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        index, offset = self._locate(position)
+        return self.buckets[index][offset]
+
+    def slice(self, start, stop):
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        result = []
+        if start >= stop:
+            return result
+        index, offset = self._locate(start)
+        while len(result) < stop - start:
+            bucket = self.buckets[index]
+            result.extend(bucket[offset:offset + stop - start - len(result)])
+            index += 1
+            offset = 0
+        return result
+
+
+class RankIndex:
+    def __init__(self):
+        self.runs = SortedKeyList()
+        self.players = SortedKeyList()
+        # name -> (自己ベストのキー, エントリ)
+        self.best = {}
+
+    def add(self, entry, seq):
+        score = entry["score"]
+        self.runs.add((-score, seq))
+        name = entry["name"]
+        current = self.best.get(name)
+        key = (-score, seq, name)
+        if current is None or key < current[0]:
+            if current is not None:
+                self.players.remove(current[0])
+            self.players.add(key)
+            self.best[name] = (key, entry)
+
+    def add_many(self, records):
+        # (entry, seq) の並びをまとめて追加する
+        runs = []
+        best = dict(self.best)
+        for entry, seq in records:
+            score = entry["score"]
+            runs.append((-score, seq))
+            key = (-score, seq, entry["name"])
+            current = best.get(key[2])
+            if current is None or key < current[0]:
+                best[key[2]] = (key, entry)
+        self.runs.update(runs)
+        self.players = SortedKeyList()
+        self.players.update(current[0] for current in best.values())
+        self.best = best
+
+    def run_count(self):
+        return len(self.runs)
+
+    def player_count(self):
+        return len(self.best)
+
+    def run_rank(self, score, seq=None):
+        # seq 付きなら登録済みのプレイの順位、なしならこれから登録する得点の順位
+        # （同点の既存記録より下）。どちらも1始まり
+        if seq is not None:
+            return self.runs.bisect_left((-score, seq)) + 1
+        # (1 - score,) は「得点が score 以上」のキーすべてより大きい
+        return self.runs.bisect_left((1 - score,)) + 1
+
+    def player_best(self, name):
+        current = self.best.get(name)
+        return current[1] if current else None
+
+    def player_rank(self, name):
+        current = self.best.get(name)
+        if current is None:
+            return None
+        return self.players.bisect_left(current[0]) + 1
+
+    def page(self, start_rank, count):
+        # 自己ベスト順位表の start_rank 位から count 件を (順位, エントリ) で返す
+        keys = self.players.slice(start_rank - 1, start_rank - 1 + count)
+        return [(start_rank + i, self.best[key[2]][1]) for i, key in enumerate(keys)]
+
+    def window(self, name, before=3, after=3):
+        # プレイヤーの前後 before / after 件を含む自己ベスト順位表の一部
+        rank = self.player_rank(name)
+        if rank is None:
+            return []
+        start = max(rank - before, 1)
+        return self.page(start, rank - start + 1 + after)
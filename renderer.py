@@ -0,0 +1,69 @@
+import pygame
+
+# ダーティ矩形レンダラ
+# 背景は一度だけ描いたサーフェスを使い回し、前フレームで描いた領域だけを
+# 背景で塗り戻してから pygame.display.update(rects) で変更部分だけを送る。
+# enabled=False のときは毎フレーム全面を塗り直して display.flip() する。
+# 背景は set_background() で差し替えられる（画質の切り替え用）。
+
+
+def make_gradient_surface(width, height, top, bottom):
+    surface = pygame.Surface((width, height))
+    for y in range(height):
+        ratio = y / height
+        color = tuple(int(top[i] + (bottom[i] - top[i]) * ratio) for i in range(3))
+        pygame.draw.line(surface, color, (0, y), (width, y))
+    return surface
+
+
+class DirtyRenderer:
+    def __init__(self, screen, background, enabled=True):
+        self.screen = screen
+        self.background = background
+        self.enabled = enabled
+        self.screen_rect = screen.get_rect()
+        self.prev_rects = []
+        self.rects = []
+        self.full = True
+        self.was_partial = False
+
+    def invalidate(self):
+        # 画面遷移などで全面を描き直す必要があるとき
+        self.full = True
+
+    def set_background(self, background):
+        self.background = background
+        self.full = True
+
+    def begin_frame(self, partial=True, clear=True):
+        # partial=False の画面（メニュー等）は背景ごと全面を描き直す。
+        # clear=False は呼び出し側が画面全体を上書きするので背景を塗らない
+        partial = partial and self.enabled
+        if self.full or not partial or not self.was_partial:
+            if clear:
+                self.screen.blit(self.background, (0, 0))
+            self.full = True
+        else:
+            for rect in self.prev_rects:
+                self.screen.blit(self.background, rect, rect)
+        self.was_partial = partial
+        self.rects = []
+
+    def mark(self, rect):
+        # 今フレームで描いた領域を登録（描画関数の戻り値をそのまま渡せる）
+        if rect is None:
+            return rect
+        rect = self.screen_rect.clip(rect)
+        if rect.width and rect.height:
+            self.rects.append(rect)
+        return rect
+
+    def present(self):
+        if self.full:
+            pygame.display.flip()
+            # 次フレームは今回の描画領域だけ戻せばよい
+            self.full = False
+        else:
+            pygame.display.update(self.prev_rects + self.rects)
+        self.prev_rects = self.rects
+        self.rects = []
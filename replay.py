@@ -0,0 +1,208 @@
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from simulation import Simulation
+
+# 入力記録とリプレイ検証
+# 1プレイ分の乱数シードと、ティックごとの入力を記録する。
+# ティックは固定の DT で進む（frame_clock.py）ので経過時間は記録しない。
+# 入力はほとんど変わらないので「同じ値が何ティック続いたか」のランレングスで
+# 持ち、可変長整数で詰める。
+# 検証側は記録から Simulation を描画なしで回し、申告されたスコアと
+# 生存時間が再現できるかを確かめる。
+#
+# 形式: MAGIC, version, seed, ticks, 申告スコア, 申告時間,
+#       入力ラン数, (ラン長, 入力)...
+
+MAGIC = b"SNR"
+# 2: 生成を先読みキュー方式にした（1 の記録とは乱数の使い方が違い、再現できない）
+# 3: ティックを固定 DT にして経過ミリ秒のランをなくした
+VERSION = 3
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+class ReplayRecorder:
+    def __init__(self, seed):
+        self.seed = seed
+        self.ticks = 0
+        self.input_runs = []
+
+    def record(self, inputs):
+        self.ticks += 1
+        if self.input_runs and self.input_runs[-1][1] == inputs:
+            self.input_runs[-1][0] += 1
+        else:
+            self.input_runs.append([1, inputs])
+
+    def encode(self, score, game_time):
+        out = bytearray(MAGIC)
+        for value in (VERSION, self.seed, self.ticks, score, game_time, len(self.input_runs)):
+            write_varint(out, value)
+        for length, inputs in self.input_runs:
+            write_varint(out, length)
+            write_varint(out, inputs)
+        return bytes(out)
+
+
+def decode(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ReplayError("not a replay")
+    pos = len(MAGIC)
+    header = []
+    for _ in range(6):
+        value, pos = read_varint(data, pos)
+        header.append(value)
+    version, seed, ticks, score, game_time, input_run_count = header
+    if version != VERSION:
+        raise ReplayError(f"unsupported replay version {version}")
+
+    inputs = []
+    for _ in range(input_run_count):
+        length, pos = read_varint(data, pos)
+        value, pos = read_varint(data, pos)
+        inputs.append((length, value))
+    if pos != len(data):
+        raise ReplayError("trailing bytes")
+    if sum(n for n, _ in inputs) != ticks:
+        raise ReplayError("run lengths do not match tick count")
+    return {"seed": seed, "ticks": ticks, "score": score, "time": game_time, "inputs": inputs}
+
+
+def expand_runs(runs):
+    for length, value in runs:
+        for _ in range(length):
+            yield value
+
+
+def replay(data):
+    # 記録どおりにシミュレーションを回し、終了時の Simulation を返す
+    record = decode(data) if isinstance(data, (bytes, bytearray)) else data
+    sim = Simulation(record["seed"])
+    for inputs in expand_runs(record["inputs"]):
+        if sim.game_over:
+            raise ReplayError(f"inputs continue after the crash at tick {sim.tick}")
+        sim.step(inputs)
+    return sim
+
+
+def verify(data, claimed_score=None, claimed_time=None):
+    # 申告値（省略時は記録内の値）と再現結果を比べる
+    try:
+        record = decode(data)
+        claimed_score = record["score"] if claimed_score is None else claimed_score
+        claimed_time = record["time"] if claimed_time is None else claimed_time
+        sim = replay(record)
+    except ReplayError as e:
+        return {"ok": False, "reason": str(e)}
+    result = {"ok": True, "score": sim.score, "time": sim.game_time, "ticks": sim.tick}
+    if not sim.game_over:
+        result.update(ok=False, reason="run did not end in a crash")
+    elif sim.score != claimed_score:
+        result.update(ok=False, reason=f"score {claimed_score} claimed, {sim.score} replayed")
+    elif sim.game_time != claimed_time:
+        result.update(ok=False, reason=f"time {claimed_time} claimed, {sim.game_time} replayed")
+    return result
+
+
+def encode_text(data):
+    # JSON やランキングに載せるための文字列表現
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_text(text):
+    return base64.b64decode(text)
+
+
+def verify_submission(submission):
+    # {"name", "score", "time", "replay"(base64)} 形式の1件を検証
+    try:
+        data = decode_text(submission["replay"])
+    except (KeyError, ValueError) as e:
+        return {"name": submission.get("name"), "ok": False, "reason": f"bad replay field: {e}"}
+    result = verify(data, submission.get("score"), submission.get("time"))
+    result["name"] = submission.get("name")
+    return result
+
+
+def load_submissions(paths):
+    # .jsonl はそのまま、.snr は記録内の申告値を使う
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(path, "rb") as f:
+                yield {"name": os.path.basename(path), "replay": encode_text(f.read())}
+
+
+def verify_batch(submissions, workers=None, chunksize=16):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(verify_submission, submissions, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator replay verifier")
+    parser.add_argument("paths", nargs="+", help=".snr files, .jsonl submission queues or globs")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="write one JSON result per line")
+    args = parser.parse_args(argv)
+
+    paths = [p for pattern in args.paths for p in (sorted(glob.glob(pattern)) or [pattern])]
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    started = time.perf_counter()
+    checked = rejected = ticks = 0
+    try:
+        for result in verify_batch(load_submissions(paths), args.workers):
+            checked += 1
+            ticks += result.get("ticks", 0)
+            if not result["ok"]:
+                rejected += 1
+                print(f"REJECT {result['name']}: {result['reason']}")
+            if out:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"{checked} runs checked, {rejected} rejected, {ticks:,} ticks in {elapsed:.2f}s "
+          f"({ticks / max(elapsed, 1e-9) / 60:,.0f}x real time)")
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import heapq
+import math
+import random
+import time
+
+# ヘッドレス・シミュレーション本体
+# airplane_game_web.py の "playing" ルールを描画・pygame から切り離したもの。
+# 状態はすべて Simulation インスタンスが持ち、乱数もインスタンス専用なので
+# 同じシードと同じ入力列からは必ず同じ結果になる。
+# 生成はティックごとのサイコロではなく、次に生成するティックを幾何分布で
+# 先に引いてキューに積んでおく方式（確率はティックごとに 1/freq で振るのと同じ）。
+
+WIDTH, HEIGHT = 800, 600
+TICK_RATE = 60
+DT = 1.0 / TICK_RATE
+
+# ANA風カラーパレット（アイテム定義で使用）
+GOLD = (255, 215, 0)
+CYAN = (0, 255, 255)
+PINK = (255, 105, 180)
+WHITE = (255, 255, 255)
+
+# 入力ビット
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+
+# 飛行機
+PLANE_START_X, PLANE_START_Y = WIDTH // 2, HEIGHT - 100
+PLANE_SPEED = 6
+PLANE_W, PLANE_H = 24, 50
+
+# 障害物
+OBSTACLE_W, OBSTACLE_H = 60, 40
+# 生成位置の y（画面の上の外）
+OBSTACLE_START_Y = -50
+ITEM_START_Y = -30
+
+# アイテムタイプ定義
+ITEM_TYPES = {
+    "coin": {"points": 10, "color": GOLD, "size": 15},
+    "gem": {"points": 50, "color": CYAN, "size": 18},
+    "star": {"points": 100, "color": PINK, "size": 20},
+    "diamond": {"points": 200, "color": WHITE, "size": 22}
+}
+# EntityStore の kind 列はこの並びのインデックス
+ITEM_TYPE_NAMES = list(ITEM_TYPES)
+ITEM_KIND = {name: i for i, name in enumerate(ITEM_TYPE_NAMES)}
+
+# イベント種別（step() の戻り値）
+# (EVENT_CRASH, x, y) / (EVENT_PICKUP, アイテム種別, x, y, 取得前の items での添字)
+EVENT_CRASH = "crash"
+EVENT_PICKUP = "pickup"
+
+# テレメトリの記録種別（telemetry.py のレコードの event 列）と、障害物を表す kind
+TELEMETRY_SPAWN = 1
+TELEMETRY_DESPAWN = 2
+TELEMETRY_PICKUP = 3
+TELEMETRY_CRASH = 4
+TELEMETRY_OBSTACLE = 255
+
+
+# 難易度の定数：初期値、何秒ごとに1段階変わるか、限界値（balance.py で差し替えて比較する）
+DIFFICULTY = {
+    "freq_start": 30, "freq_every": 10, "freq_min": 10,
+    "speed_start": 3, "speed_every": 15, "speed_max": 8,
+    "scroll_start": 2, "scroll_every": 20, "scroll_max": 5,
+}
+# HUD に出す難易度レベル
+LEVEL_SECONDS = 15
+MAX_LEVEL = 10
+
+
+def get_difficulty_settings(time_elapsed, params=DIFFICULTY):
+    base_obstacle_freq = max(params["freq_start"] - time_elapsed // params["freq_every"], params["freq_min"])
+    base_obstacle_speed = min(params["speed_start"] + time_elapsed // params["speed_every"], params["speed_max"])
+    base_scroll_speed = min(params["scroll_start"] + time_elapsed // params["scroll_every"], params["scroll_max"])
+
+    return {
+        "obstacle_freq": base_obstacle_freq,
+        "obstacle_speed": base_obstacle_speed,
+        "scroll_speed": base_scroll_speed
+    }
+
+
+# 経過秒数がしきい値を超えていれば適用するアイテム出現重み（上から順に判定）
+ITEM_WEIGHTS = (
+    (60, ("coin", "gem", "star", "diamond"), (40, 30, 20, 10)),
+    (30, ("coin", "gem", "star"), (50, 30, 20)),
+    (-1, ("coin", "gem"), (70, 30)),
+)
+
+
+def difficulty_level(game_time):
+    return min(game_time // LEVEL_SECONDS + 1, MAX_LEVEL)
+
+
+class AliasTable:
+    # Vose の alias 法：重み付きの選択を乱数1個と比較1回で行う
+    def __init__(self, names, weights):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [weight * n / total for weight in weights]
+        self.names = names
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+
+    def choose(self, rng):
+        u = rng.random() * len(self.prob)
+        i = int(u)
+        return self.names[i] if u - i < self.prob[i] else self.names[self.alias[i]]
+
+
+def build_difficulty_table(params=DIFFICULTY, item_weights=ITEM_WEIGHTS):
+    # 経過秒数ごとの (障害物の生成間隔の期待値 freq, 移動量, アイテムの AliasTable)。
+    # どの値も変わらなくなる秒まで作り、それ以降は最後の行を使う
+    last = max(params["freq_every"] * max(params["freq_start"] - params["freq_min"], 0),
+               params["speed_every"] * max(params["speed_max"] - params["speed_start"], 0),
+               params["scroll_every"] * max(params["scroll_max"] - params["scroll_start"], 0),
+               max(threshold for threshold, _, _ in item_weights) + 1)
+    aliases = [AliasTable(names, weights) for _, names, weights in item_weights]
+    table = []
+    for second in range(last + 1):
+        settings = get_difficulty_settings(second, params)
+        stage = next(i for i, (threshold, _, _) in enumerate(item_weights) if second > threshold)
+        table.append((settings["obstacle_freq"], settings["obstacle_speed"] + settings["scroll_speed"],
+                      aliases[stage]))
+    return table
+
+
+# collision / entities は NumPy を読み込むので、最初の Simulation を作るときに読む
+# （Web 版は定数だけを先に使い、NumPy の読み込みをメニュー表示の後に回す）
+collide_all = collide_any = EntityStore = None
+
+
+def _load_entity_modules():
+    global collide_all, collide_any, EntityStore
+    if EntityStore is None:
+        from collision import collide_all, collide_any
+        from entities import EntityStore
+
+
+# 生成キューの種類（同じティックなら障害物が先）
+SPAWN_OBSTACLE = 0
+SPAWN_ITEM = 1
+
+
+class Simulation:
+    def __init__(self, seed=None, profiler=None, difficulty=DIFFICULTY, item_weights=ITEM_WEIGHTS,
+                 telemetry=None):
+        # profiler を渡すとフェーズごとに profiler.mark() を呼ぶ（profiler.py）
+        # telemetry を渡すと生成・取得・消滅・墜落ごとに telemetry.record() を呼ぶ（telemetry.py）
+        # difficulty / item_weights はバランス調整用の差し替え
+        self.profiler = profiler
+        self.telemetry = telemetry
+        self.difficulty = difficulty
+        self.item_weights = item_weights
+        self.table = build_difficulty_table(difficulty, item_weights)
+        _load_entity_modules()
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # シードを省略したら新しく決めて記録しておく（リプレイ用）
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.plane_x, self.plane_y = PLANE_START_X, PLANE_START_Y
+        # 直前のティック開始時の飛行機の x と、そのティックの移動量（描画の補間用）
+        self.prev_plane_x = self.plane_x
+        self.last_speed = 0
+        self.obstacles = EntityStore()
+        self.items = EntityStore()
+        self.score = 0
+        self.elapsed = 0.0
+        self.game_time = 0
+        self.tick = 0
+        self.game_over = False
+        # (生成するティック, 種類) の最小ヒープと、それを引いたときの freq
+        self.spawn_queue = []
+        self.spawn_freq = None
+
+    def create_obstacle(self):
+        x = self.rng.randint(50, WIDTH - 50)
+        self.obstacles.add(x, OBSTACLE_START_Y, OBSTACLE_W, OBSTACLE_H)
+        if self.telemetry:
+            self.record(TELEMETRY_SPAWN, x, OBSTACLE_START_Y, TELEMETRY_OBSTACLE)
+
+    def create_item(self, alias):
+        x = self.rng.randint(50, WIDTH - 50)
+        item_type = alias.choose(self.rng)
+        size = ITEM_TYPES[item_type]["size"]
+        self.items.add(x, ITEM_START_Y, size, size, ITEM_KIND[item_type])
+        if self.telemetry:
+            self.record(TELEMETRY_SPAWN, x, ITEM_START_Y, ITEM_KIND[item_type])
+
+    def record(self, event, x, y, kind):
+        self.telemetry.record(event, self.tick, x, y, kind, self.obstacles.count + self.items.count)
+
+    def record_culled(self, culled, kind=None):
+        # cull_below() が返した消えた分を記録する。kind を省けばエンティティの kind
+        for xs, ys, kinds in culled:
+            kinds = kinds.tolist() if kind is None else [kind] * len(xs)
+            for x, y, entity_kind in zip(xs.tolist(), ys.tolist(), kinds):
+                self.record(TELEMETRY_DESPAWN, x, y, entity_kind)
+
+    def schedule(self, kind, p, start):
+        # 確率 p のベルヌーイ試行を start ティックから続けたとき、最初に当たるティック
+        if p >= 1:
+            gap = 0
+        else:
+            gap = int(math.log(1.0 - self.rng.random()) / math.log(1.0 - p))
+        heapq.heappush(self.spawn_queue, (start + gap, kind))
+
+    def spawn(self, freq, alias):
+        # 生成確率が変わったら引き直す（幾何分布は無記憶なので、途中で引き直しても
+        # ティックごとに振るのと同じ分布になる）
+        queue = self.spawn_queue
+        if freq != self.spawn_freq:
+            self.spawn_freq = freq
+            queue.clear()
+            self.schedule(SPAWN_OBSTACLE, 1 / freq, self.tick)
+            self.schedule(SPAWN_ITEM, 1 / (freq * 2), self.tick)
+        while queue[0][0] <= self.tick:
+            _, kind = heapq.heappop(queue)
+            if kind == SPAWN_OBSTACLE:
+                self.create_obstacle()
+                self.schedule(SPAWN_OBSTACLE, 1 / freq, self.tick + 1)
+            else:
+                self.create_item(alias)
+                self.schedule(SPAWN_ITEM, 1 / (freq * 2), self.tick + 1)
+
+    def move(self, speed):
+        # 障害物移動（画面外に出た障害物1つにつき10点）
+        # テレメトリがあるときだけ、消えた分を受け取って記録する
+        culled = [] if self.telemetry else None
+        self.obstacles.move(speed)
+        self.score += 10 * self.obstacles.cull_below(HEIGHT, culled)
+        if culled:
+            self.record_culled(culled, TELEMETRY_OBSTACLE)
+            culled.clear()
+
+        # アイテム移動
+        self.items.move(speed)
+        self.items.cull_below(HEIGHT, culled)
+        if culled:
+            self.record_culled(culled)
+
+    def collide(self, events):
+        # 衝突判定
+        plane_left = self.plane_x - PLANE_W // 2
+        if collide_any(self.obstacles, plane_left, self.plane_y, PLANE_W, PLANE_H):
+            self.game_over = True
+            events.append((EVENT_CRASH, self.plane_x, self.plane_y))
+            if self.telemetry:
+                self.record(TELEMETRY_CRASH, self.plane_x, self.plane_y, TELEMETRY_OBSTACLE)
+
+        # アイテム取得（衝突したティックでも取得は有効）
+        collected = collide_all(self.items, plane_left, self.plane_y, PLANE_W, PLANE_H)
+        kinds = self.items.kind[collected].tolist() if collected else []
+        if collected:
+            self.items.remove_indices(collected)
+        for index, kind in zip(reversed(collected), reversed(kinds)):
+            item_type = ITEM_TYPE_NAMES[kind]
+            self.score += ITEM_TYPES[item_type]["points"]
+            events.append((EVENT_PICKUP, item_type, self.plane_x, self.plane_y, index))
+            if self.telemetry:
+                self.record(TELEMETRY_PICKUP, self.plane_x, self.plane_y, kind)
+
+    def step(self, inputs=0, dt=DT):
+        # 1ティック進める。inputs は INPUT_* のビット和、dt は経過秒数。
+        # 発生したイベントのリストを返す（描画側のエフェクト用）。
+        events = []
+        if self.game_over:
+            return events
+
+        # 時間更新（ティック開始時点の経過秒で難易度を決める）
+        profiler = self.profiler
+        self.game_time = int(self.elapsed + 1e-9)
+        table = self.table
+        freq, speed, alias = table[min(self.game_time, len(table) - 1)]
+
+        # 入力
+        self.prev_plane_x = self.plane_x
+        self.last_speed = speed
+        if inputs & INPUT_LEFT and self.plane_x > 25:
+            self.plane_x -= PLANE_SPEED
+        if inputs & INPUT_RIGHT and self.plane_x < WIDTH - 25:
+            self.plane_x += PLANE_SPEED
+        if profiler:
+            profiler.mark("difficulty")
+
+        self.spawn(freq, alias)
+        if profiler:
+            profiler.mark("spawn")
+        self.move(speed)
+        if profiler:
+            profiler.mark("move")
+        self.collide(events)
+        if profiler:
+            profiler.mark("collide")
+
+        self.elapsed += dt
+        self.tick += 1
+        return events
+
+
+def random_policy(sim, rng):
+    # ベンチマーク用：ランダムに左右へ動く
+    return rng.choice((0, INPUT_LEFT, INPUT_RIGHT))
+
+
+def run_headless(seed=None, policy=random_policy, max_ticks=TICK_RATE * 600, dt=DT, **options):
+    # 1ゲームを実時間に縛られずに最後まで回す（options は Simulation へ）
+    sim = Simulation(seed, **options)
+    policy_rng = random.Random(seed)
+    while not sim.game_over and sim.tick < max_ticks:
+        sim.step(policy(sim, policy_rng), dt)
+    return sim
+
+
+if __name__ == "__main__":
+    games = 200
+    total_ticks = 0
+    started = time.perf_counter()
+    for seed in range(games):
+        total_ticks += run_headless(seed).tick
+    elapsed = time.perf_counter() - started
+    print(f"{games} games, {total_ticks} ticks in {elapsed:.2f}s "
+          f"({total_ticks / elapsed:,.0f} ticks/s)")
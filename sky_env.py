@@ -0,0 +1,177 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from simulation import (HEIGHT, INPUT_LEFT, INPUT_RIGHT, ITEM_TYPES, ITEM_TYPE_NAMES, PLANE_H, PLANE_W,
+                        TICK_RATE, WIDTH, Simulation)
+
+# 学習・ベンチマーク用の環境 API（Gym / Gymnasium と同じ reset / step の形）
+# ・行動は 0: そのまま, 1: 左, 2: 右
+# ・ベクトル観測：飛行機の x と、近い順に障害物 K 個・アイテム K 個の相対位置
+# ・画素観測（pixels=True）：縮小した解像度で図形を直接描き、その Surface の
+#   画素を pygame.surfarray.pixels3d のビューとして返す。毎フレームのコピーはない
+# ・pixels=False なら pygame を読み込まず描画もしないので、速さはシミュレーション
+#   だけで決まる
+# 返す観測配列は毎回同じバッファを書き換える。保存するときは呼び出し側で copy() する。
+#
+# python sky_env.py --steps 20000 --pixels --size 84 63
+
+ACTIONS = (0, INPUT_LEFT, INPUT_RIGHT)
+NEAREST = 4
+# ベクトル観測の並び：plane_x, 障害物 NEAREST 個 × (dx, dy, 有無), アイテム NEAREST 個 × (dx, dy, 得点, 有無)
+VECTOR_SIZE = 1 + NEAREST * 3 + NEAREST * 4
+# アイテムの得点は最大値で割って 0〜1 に
+_ITEM_POINTS = [ITEM_TYPES[name]["points"] / max(t["points"] for t in ITEM_TYPES.values())
+                for name in ITEM_TYPE_NAMES]
+
+SKY_COLOR = (135, 206, 235)
+CLOUD_COLOR = (255, 255, 255)
+PLANE_COLOR = (0, 51, 153)
+
+
+class SkyNavigatorEnv:
+    def __init__(self, seed=None, frame_skip=1, pixels=False, size=(WIDTH // 4, HEIGHT // 4),
+                 max_ticks=TICK_RATE * 600):
+        self.frame_skip = frame_skip
+        self.pixels = pixels
+        self.max_ticks = max_ticks
+        self.n_actions = len(ACTIONS)
+        self.sim = Simulation(seed)
+        self.vector = np.zeros(VECTOR_SIZE, dtype=np.float32)
+        self.surface = None
+        self.frame = None
+        if pixels:
+            self._init_pixels(size)
+
+    def _init_pixels(self, size):
+        import pygame
+        self.pygame = pygame
+        # 表示ウィンドウは作らない（Surface は単体で描ける）
+        self.surface = pygame.Surface(size)
+        self.scale_x = size[0] / WIDTH
+        self.scale_y = size[1] / HEIGHT
+        self.item_colors = [self.surface.map_rgb(ITEM_TYPES[name]["color"]) for name in ITEM_TYPE_NAMES]
+        # (幅, 高さ, 3) のビュー。Surface をロックしたままになるので blit はできないが、
+        # fill と pygame.draw はそのまま使える。転置したビュー（高さ, 幅, 3）を観測として返す
+        self.frame = pygame.surfarray.pixels3d(self.surface).transpose(1, 0, 2)
+
+    @property
+    def observation_shape(self):
+        return self.frame.shape if self.pixels else self.vector.shape
+
+    def reset(self, seed=None):
+        self.sim.reset(seed)
+        return self._observe(), self._info()
+
+    def step(self, action):
+        sim = self.sim
+        inputs = ACTIONS[action]
+        score = sim.score
+        for _ in range(self.frame_skip):
+            sim.step(inputs)
+            if sim.game_over or sim.tick >= self.max_ticks:
+                break
+        reward = sim.score - score
+        truncated = not sim.game_over and sim.tick >= self.max_ticks
+        return self._observe(), reward, sim.game_over, truncated, self._info()
+
+    def _info(self):
+        return {"score": self.sim.score, "time": self.sim.game_time, "tick": self.sim.tick}
+
+    def _observe(self):
+        if self.pixels:
+            self._draw()
+            return self.frame
+        return self._fill_vector()
+
+    def _fill_vector(self):
+        sim = self.sim
+        out = self.vector
+        out.fill(0)
+        out[0] = sim.plane_x / WIDTH
+        self._nearest(sim.obstacles, out, 1, 3)
+        self._nearest(sim.items, out, 1 + NEAREST * 3, 4)
+        return out
+
+    def _nearest(self, store, out, offset, width):
+        # 飛行機より上（まだ当たりうる）のものを距離の近い順に NEAREST 個。
+        # 数が少ないので collision.py の小区間と同じく Python のリストで処理する
+        n = store.count
+        if not n:
+            return
+        plane_x = self.sim.plane_x
+        bottom = self.sim.plane_y + PLANE_H
+        found = []
+        for x, y, w, kind in zip(store.x[:n].tolist(), store.y[:n].tolist(),
+                                 store.w[:n].tolist(), store.kind[:n].tolist()):
+            dy = bottom - y
+            if dy > 0:
+                dx = x + w // 2 - plane_x
+                found.append((dx * dx + dy * dy, dx, dy, kind))
+        found.sort()
+        values = []
+        for _, dx, dy, kind in found[:NEAREST]:
+            values += (dx / WIDTH, dy / HEIGHT)
+            values += (_ITEM_POINTS[kind], 1.0) if width == 4 else (1.0,)
+        out[offset:offset + len(values)] = values
+
+    def _draw(self):
+        draw = self.pygame.draw
+        surface = self.surface
+        sim = self.sim
+        sx, sy = self.scale_x, self.scale_y
+        surface.fill(SKY_COLOR)
+        obstacles = sim.obstacles
+        n = obstacles.count
+        for x, y, w, h in zip(obstacles.x[:n].tolist(), obstacles.y[:n].tolist(),
+                              obstacles.w[:n].tolist(), obstacles.h[:n].tolist()):
+            draw.ellipse(surface, CLOUD_COLOR, (x * sx, y * sy, max(w * sx, 1), max(h * sy, 1)))
+        items = sim.items
+        n = items.count
+        for x, y, w, kind in zip(items.x[:n].tolist(), items.y[:n].tolist(),
+                                 items.w[:n].tolist(), items.kind[:n].tolist()):
+            draw.rect(surface, self.item_colors[kind], (x * sx, y * sy, max(w * sx, 1), max(w * sy, 1)))
+        # 飛行機は当たり判定（simulation の PLANE_W × PLANE_H）に内接する三角形
+        px, py = sim.plane_x * sx, sim.plane_y * sy
+        half_w, h = PLANE_W / 2 * sx, PLANE_H * sy
+        draw.polygon(surface, PLANE_COLOR, [(px, py), (px - half_w, py + h), (px + half_w, py + h)])
+
+    def close(self):
+        if self.frame is not None:
+            # ビューを手放して Surface のロックを外す
+            self.frame = None
+            self.surface = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator environment throughput")
+    parser.add_argument("--steps", type=int, default=20000)
+    parser.add_argument("--frame-skip", type=int, default=1)
+    parser.add_argument("--pixels", action="store_true")
+    parser.add_argument("--size", type=int, nargs=2, default=[WIDTH // 4, HEIGHT // 4])
+    args = parser.parse_args(argv)
+
+    env = SkyNavigatorEnv(seed=0, frame_skip=args.frame_skip, pixels=args.pixels, size=tuple(args.size))
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, env.n_actions, args.steps).tolist()
+    env.reset(0)
+    episodes = 0
+    started = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            episodes += 1
+            env.reset()
+    elapsed = time.perf_counter() - started
+    mode = f"pixels {args.size[0]}x{args.size[1]}" if args.pixels else "vector"
+    print(f"{mode}, frame skip {args.frame_skip}: {args.steps:,} steps in {elapsed:.2f}s "
+          f"({args.steps / elapsed:,.0f} steps/s, {args.steps * args.frame_skip / elapsed:,.0f} ticks/s), "
+          f"{episodes} episodes, observation {env.observation_shape}")
+    env.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
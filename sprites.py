@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+
+import pygame
+
+# スプライトアトラス
+# 形が決まっている図形（飛行機・雲・アイテム）は起動時に一度だけ描いて
+# 一枚のサーフェスに並べておき、毎フレームは screen.blits() の一括転送だけで
+# 描く。各スプライトは基準点からのオフセットを持つので、描画側は今までと
+# 同じ座標（飛行機なら機首、アイテムなら中心）を渡せばよい。
+#
+# pygame.draw の図形はアンチエイリアスなしなので、カラーキー + RLE の
+# ページに置く（画素ごとのアルファ合成より数倍速い）。アンチエイリアス付きの
+# 文字などアルファが必要なものだけ別ページに置く。
+
+ATLAS_WIDTH = 512
+ATLAS_PADDING = 1
+COLORKEY = (255, 0, 255)
+
+
+def make_sprite(width, height, draw):
+    # カラーキーで塗ったサーフェスに draw(surface) で描いたものを返す
+    surface = pygame.Surface((width, height))
+    surface.fill(COLORKEY)
+    draw(surface)
+    return surface
+
+
+def _pack(sprites):
+    # 棚詰め（高さ順に左から並べ、幅を超えたら次の段へ）
+    x = y = shelf_h = 0
+    places = []
+    for name, surface, offset in sorted(sprites, key=lambda p: p[1].get_height(), reverse=True):
+        w, h = surface.get_size()
+        if x + w > ATLAS_WIDTH:
+            x, y = 0, y + shelf_h + ATLAS_PADDING
+            shelf_h = 0
+        places.append((name, surface, offset, pygame.Rect(x, y, w, h)))
+        x += w + ATLAS_PADDING
+        shelf_h = max(shelf_h, h)
+    return places, y + shelf_h
+
+
+class SpriteAtlas:
+    def __init__(self):
+        self.pending = {False: [], True: []}
+        self.pages = {}
+        self.areas = {}
+        self.offsets = {}
+
+    def add(self, name, surface, offset=(0, 0), alpha=False):
+        self.pending[alpha].append((name, surface, offset))
+
+    def build(self):
+        has_display = pygame.display.get_surface() is not None
+        for alpha, sprites in self.pending.items():
+            if not sprites:
+                continue
+            places, height = _pack(sprites)
+            if alpha:
+                page = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA)
+            else:
+                page = pygame.Surface((ATLAS_WIDTH, height))
+                page.fill(COLORKEY)
+            for name, surface, offset, area in places:
+                page.blit(surface, area)
+            if has_display:
+                page = page.convert_alpha() if alpha else page.convert()
+            if not alpha:
+                page.set_colorkey(COLORKEY, pygame.RLEACCEL)
+            for name, surface, offset, area in places:
+                self.pages[name] = page
+                self.areas[name] = area
+                self.offsets[name] = offset
+        self.pending = {False: [], True: []}
+        return self
+
+    def entry(self, name, x, y):
+        # screen.blits() にそのまま渡せる (サーフェス, 位置, 切り出し範囲)
+        ox, oy = self.offsets[name]
+        return (self.pages[name], (x + ox, y + oy), self.areas[name])
+
+
+def run_benchmark(counts=(10, 100, 1000), frames=200):
+    # 図形描画とアトラス一括転送の比較（両ビルドの実際の描画関数を使う）
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import airplane_game_web as web
+    import game
+    web.load_game(telemetry_dir=None)
+
+    rng = web.sim.rng
+    print(f"{'build':>6} {'entities':>9} {'primitives':>12} {'atlas':>12} {'speedup':>8}")
+    for count in counts:
+        web.sim.reset(0)
+        for _ in range(count):
+            web.sim.create_obstacle()
+            web.sim.create_item(web.sim.table[-1][2])
+        for store in (web.sim.obstacles, web.sim.items):
+            store.y[:store.count] = [rng.randint(0, web.HEIGHT) for _ in range(store.count)]
+        obstacles = web.sim.obstacles.rows()
+        items = web.sim.items.rows()
+
+        started = time.perf_counter()
+        for _ in range(frames):
+            for obs in obstacles:
+                web.draw_obstacle(obs)
+            for item in items:
+                web.draw_item(item)
+            web.draw_plane(web.sim.plane_x, web.sim.plane_y)
+        primitive = (time.perf_counter() - started) / frames * 1000
+
+        started = time.perf_counter()
+        for _ in range(frames):
+            web.draw_entities()
+        batched = (time.perf_counter() - started) / frames * 1000
+        print(f"{'web':>6} {count:>9,} {primitive:>10.3f}ms {batched:>10.3f}ms {primitive / batched:>7.1f}x")
+
+        game.obstacles[:] = [[rng.randint(50, game.WIDTH - 50), rng.randint(0, game.HEIGHT), 60, 40]
+                             for _ in range(count)]
+        game.items[:] = [[rng.randint(50, game.WIDTH - 50), rng.randint(0, game.HEIGHT), 20, 20,
+                          rng.choice(list(game.ITEMS))] for _ in range(count)]
+
+        started = time.perf_counter()
+        for _ in range(frames):
+            game.draw_obstacles()
+            game.draw_items()
+            game.draw_plane()
+        primitive = (time.perf_counter() - started) / frames * 1000
+
+        started = time.perf_counter()
+        for _ in range(frames):
+            game.draw_sprites()
+        batched = (time.perf_counter() - started) / frames * 1000
+        print(f"{'native':>6} {count:>9,} {primitive:>10.3f}ms {batched:>10.3f}ms {primitive / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        run_benchmark()
+    else:
+        print("usage: python sprites.py --bench")
@@ -0,0 +1,44 @@
+import json
+import sys
+import time
+
+# 起動時間の計測
+# ・first_frame: 最初のフレームを画面に出したとき（time-to-first-frame）
+# ・interactive: プレイ・ランキングに要るものが揃い、入力にすぐ応えられるとき
+#   （time-to-interactive）
+# Pyodide ではページの読み込み開始（performance.now() の原点）から、ネイティブでは
+# このモジュールを読み込んだ時点からのミリ秒。Pyodide 本体・パッケージの
+# ダウンロードも含めた数字になるように、Web 版では最初に import する。
+
+_ORIGIN = time.perf_counter()
+
+
+def now_ms():
+    if sys.platform == "emscripten":
+        import js
+        return js.performance.now()
+    return (time.perf_counter() - _ORIGIN) * 1000
+
+
+class StartupTimer:
+    def __init__(self):
+        self.marks = {}
+
+    def mark(self, name):
+        # 最初の1回だけ記録する
+        if name not in self.marks:
+            self.marks[name] = now_ms()
+
+    def report(self):
+        return {name: round(ms, 1) for name, ms in self.marks.items()}
+
+    def save(self, path):
+        # 1回の起動を1行の JSON として追記し、同じ内容を表示する（ブラウザではコンソールに出る）
+        record = {"platform": sys.platform, "time": time.time(), **self.report()}
+        print("startup " + " ".join(f"{name}={ms}ms" for name, ms in self.report().items()))
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+        return record
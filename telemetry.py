@@ -0,0 +1,304 @@
+import argparse
+import glob
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+from simulation import (ITEM_TYPE_NAMES, LEVEL_SECONDS, MAX_LEVEL, TELEMETRY_CRASH, TELEMETRY_DESPAWN,
+                        TELEMETRY_PICKUP, TELEMETRY_SPAWN, TICK_RATE, WIDTH)
+
+# プレイ中のイベント（生成・取得・画面外へ消えた・墜落）の記録
+# ・1件は固定長 16 バイトのバイナリ。あらかじめ確保した bytearray に
+#   struct.pack_into で詰めるだけなので、プレイ中にオブジェクトやファイル I/O は増えない
+# ・バッファが埋まったら（または flush() で）書き込みスレッドに渡し、空いている
+#   予備のバッファに切り替える。予備がなければ（書き込みが追いつかなければ）
+#   フレームを止めずにその分を捨てて数える。スレッドが使えない環境ではその場で書く
+# ・集計（TelemetrySummary、コマンドライン）はファイルを mmap して NumPy の構造化配列として見るので、
+#   何百万件でも Python のオブジェクトを1件ずつ作らずに数えられる
+#
+# 形式（リトルエンディアン）: MAGIC, version(u16), レコード長(u16), レコード × n
+# レコード: run(u32), tick(u32), x(i16), y(i16), event(u8), kind(u8), 画面内のエンティティ数(u16)
+# kind はアイテムなら ITEM_TYPE_NAMES の添字、障害物（墜落も）なら TELEMETRY_OBSTACLE
+#
+# python telemetry.py leaderboard_data/telemetry/*.snt --bins 16
+
+MAGIC = b"SNT\0"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<IIhhBBH")
+TELEMETRY_SUFFIX = ".snt"
+BUFFER_RECORDS = 4096
+BUFFER_COUNT = 3
+# 集計で一度に NumPy に渡す件数
+ANALYSE_CHUNK = 1 << 20
+EVENT_NAMES = {TELEMETRY_SPAWN: "spawn", TELEMETRY_DESPAWN: "despawn",
+               TELEMETRY_PICKUP: "pickup", TELEMETRY_CRASH: "crash"}
+
+
+class TelemetryError(ValueError):
+    pass
+
+
+class TelemetryRecorder:
+    def __init__(self, directory, buffer_records=BUFFER_RECORDS, buffers=BUFFER_COUNT, background=True):
+        # ファイルは最初に書くときに作る（プレイしなかったセッションは何も残さない）
+        self.directory = directory
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{TELEMETRY_SUFFIX}"
+        self.path = os.path.join(directory, name)
+        self.file = None
+        self.capacity = buffer_records * RECORD.size
+        self.free = queue.Queue()
+        for _ in range(buffers - 1):
+            self.free.put(bytearray(self.capacity))
+        self.buffer = bytearray(self.capacity)
+        self.offset = 0
+        self.run = 0
+        self.stats = {"records": 0, "dropped": 0, "batches": 0}
+        self.queue = queue.Queue()
+        self.writer = None
+        if background:
+            try:
+                self.writer = threading.Thread(target=self._writer_loop, name="telemetry-writer", daemon=True)
+                self.writer.start()
+            except RuntimeError:
+                # Pyodide など、スレッドが使えない環境
+                self.writer = None
+
+    def start_run(self):
+        # 新しいプレイ（以降のレコードの run）
+        self.run += 1
+
+    def record(self, event, tick, x, y, kind, entities):
+        buffer = self.buffer
+        if buffer is None:
+            # 予備が尽きている：書き込みが返したバッファがあれば再開、なければ捨てる
+            try:
+                buffer = self.buffer = self.free.get_nowait()
+            except queue.Empty:
+                self.stats["dropped"] += 1
+                return
+        RECORD.pack_into(buffer, self.offset, self.run, tick, x, y, event, kind, entities)
+        self.offset += RECORD.size
+        if self.offset == self.capacity:
+            self.flush()
+
+    def flush(self):
+        # 今のバッファを書き込みに回し、予備に切り替える
+        if not self.offset or self.buffer is None:
+            return
+        self.stats["records"] += self.offset // RECORD.size
+        self.stats["batches"] += 1
+        if self.writer is None:
+            self._write(self.buffer, self.offset)
+            self.offset = 0
+            return
+        self.queue.put((self.buffer, self.offset))
+        try:
+            self.buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.buffer = None
+        self.offset = 0
+
+    def _write(self, buffer, size):
+        if self.file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = open(self.path, "ab")
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        with memoryview(buffer) as view:
+            self.file.write(view[:size])
+        self.file.flush()
+
+    def _writer_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            buffer, size = item
+            self._write(buffer, size)
+            self.free.put(buffer)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.file is not None:
+            self.file.close()
+
+
+# ---- 集計 ----
+
+def record_dtype():
+    import numpy as np
+    return np.dtype([("run", "<u4"), ("tick", "<u4"), ("x", "<i2"), ("y", "<i2"),
+                     ("event", "u1"), ("kind", "u1"), ("entities", "<u2")])
+
+
+def open_records(path):
+    # レコードの構造化配列を返す。mmap したファイルのビューなので、触ったページだけが
+    # 読み込まれる（mmap が使えなければ一度に読む）
+    import numpy as np
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise TelemetryError(f"{path}: truncated telemetry file")
+        magic, version, size = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            raise TelemetryError(f"{path}: not a telemetry file")
+        # 書き込み途中で切れた最後のレコードは数えない
+        count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        if count == 0:
+            return np.zeros(0, dtype=record_dtype())
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            f.seek(0)
+            buffer = f.read()
+    return np.frombuffer(buffer, dtype=record_dtype(), count=count, offset=HEADER.size)
+
+
+class TelemetrySummary:
+    # ファイルを ANALYSE_CHUNK 件ずつ見て、配列の足し算だけで集計を積み上げる
+    def __init__(self, bins=16):
+        import numpy as np
+        self.np = np
+        self.bins = bins
+        kinds = len(ITEM_TYPE_NAMES)
+        self.events = np.zeros(256, dtype=np.int64)
+        self.deaths_by_x = np.zeros(bins, dtype=np.int64)
+        self.item_spawns = np.zeros((MAX_LEVEL + 1, kinds), dtype=np.int64)
+        self.pickups = np.zeros((MAX_LEVEL + 1, kinds), dtype=np.int64)
+        self.deaths = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+        self.entity_sum = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+        self.entity_samples = np.zeros(MAX_LEVEL + 1, dtype=np.int64)
+        self.seconds = np.zeros(MAX_LEVEL + 1, dtype=np.float64)
+        self.runs = 0
+        self.files = 0
+
+    def add_file(self, path):
+        np = self.np
+        records = open_records(path)
+        # プレイごとの最後のティック（レベルごとのプレイ時間に使う。墜落しなかったプレイは
+        # 最後のイベントまで）。レコードは書いた順に並んでいて run は減らないので、
+        # run の変わり目で区切って最大を取る。
+        # 区切りの最後のプレイは次の区切りに続くかもしれないので持ち越す
+        last_ticks = []
+        last_run = last_end = None
+        for start in range(0, len(records), ANALYSE_CHUNK):
+            chunk = records[start:start + ANALYSE_CHUNK]
+            self._add_chunk(chunk)
+            run = chunk["run"]
+            first = np.concatenate(([0], np.flatnonzero(run[1:] != run[:-1]) + 1))
+            ends = np.maximum.reduceat(chunk["tick"], first).astype(np.int64)
+            if run[0] == last_run:
+                ends[0] = max(ends[0], last_end)
+            elif last_end is not None:
+                last_ticks.append([last_end])
+            last_ticks.append(ends[:-1])
+            last_run, last_end = run[-1], ends[-1]
+        if last_end is not None:
+            last_ticks.append([last_end])
+            last_ticks = np.concatenate(last_ticks)
+            self._add_playtime(last_ticks)
+            self.runs += len(last_ticks)
+        self.files += 1
+
+    def _levels(self, ticks):
+        np = self.np
+        # tick 番目のティックの game_time は tick // TICK_RATE（Simulation.step と同じ）
+        return np.minimum(ticks // TICK_RATE // LEVEL_SECONDS + 1, MAX_LEVEL)
+
+    def _add_chunk(self, chunk):
+        np = self.np
+        event = chunk["event"]
+        kind = chunk["kind"]
+        levels = self._levels(chunk["tick"].astype(np.int64))
+        self.events += np.bincount(event, minlength=256)
+        size = (MAX_LEVEL + 1) * len(ITEM_TYPE_NAMES)
+        for target, code in ((self.item_spawns, TELEMETRY_SPAWN), (self.pickups, TELEMETRY_PICKUP)):
+            mask = (event == code) & (kind < len(ITEM_TYPE_NAMES))
+            cells = levels[mask] * len(ITEM_TYPE_NAMES) + kind[mask]
+            target += np.bincount(cells, minlength=size).reshape(target.shape)
+        crashed = event == TELEMETRY_CRASH
+        x = np.clip(chunk["x"][crashed].astype(np.int64) * self.bins // WIDTH, 0, self.bins - 1)
+        self.deaths_by_x += np.bincount(x, minlength=self.bins)
+        self.deaths += np.bincount(levels[crashed], minlength=MAX_LEVEL + 1)
+        self.entity_sum += np.bincount(levels, weights=chunk["entities"], minlength=MAX_LEVEL + 1).astype(np.int64)
+        self.entity_samples += np.bincount(levels, minlength=MAX_LEVEL + 1)
+
+    def _add_playtime(self, last_ticks):
+        # レベル L の区間 [(L-1) * LEVEL_SECONDS, L * LEVEL_SECONDS) と各プレイの長さの重なり
+        np = self.np
+        seconds = last_ticks / TICK_RATE
+        for level in range(1, MAX_LEVEL + 1):
+            start = (level - 1) * LEVEL_SECONDS
+            stop = level * LEVEL_SECONDS if level < MAX_LEVEL else np.inf
+            self.seconds[level] += np.clip(np.minimum(seconds, stop) - start, 0, None).sum()
+
+    def report(self):
+        total = int(self.events.sum())
+        print(f"{self.files} file(s), {self.runs:,} runs, {total:,} events: " + "  ".join(
+            f"{name} {int(self.events[code]):,}" for code, name in EVENT_NAMES.items()))
+
+        deaths = int(self.deaths_by_x.sum())
+        print(f"\ndeaths by x ({deaths:,})")
+        width = WIDTH / self.bins
+        peak = max(int(self.deaths_by_x.max()), 1)
+        for i, count in enumerate(self.deaths_by_x.tolist()):
+            bar = "#" * round(40 * count / peak)
+            print(f"  {i * width:5.0f}-{(i + 1) * width:5.0f} {count:8,} {count / max(deaths, 1):6.1%} {bar}")
+
+        print("\nper level: seconds played, deaths, mean entities on screen, pickups / spawned items")
+        header = "".join(f"{name:>16}" for name in ITEM_TYPE_NAMES)
+        print(f"  {'lv':>3} {'seconds':>10} {'deaths':>8} {'entities':>9} {'pickups/min':>12}{header}")
+        for level in range(1, MAX_LEVEL + 1):
+            if not self.entity_samples[level]:
+                continue
+            entities = self.entity_sum[level] / self.entity_samples[level]
+            per_minute = self.pickups[level].sum() / max(self.seconds[level], 1e-9) * 60
+            rates = "".join(
+                f"{f'{picked:,}/{spawned:,} {picked / spawned:.0%}' if spawned else '-':>16}"
+                for picked, spawned in zip(self.pickups[level].tolist(), self.item_spawns[level].tolist()))
+            print(f"  {level:>3} {self.seconds[level]:>10,.0f} {int(self.deaths[level]):>8,} "
+                  f"{entities:>9.1f} {per_minute:>12.1f}{rates}")
+        spawned = self.item_spawns.sum(axis=0)
+        picked = self.pickups.sum(axis=0)
+        print("\npickup rate by item: " + "  ".join(
+            f"{name} {p / s:.1%}" if s else f"{name} -"
+            for name, p, s in zip(ITEM_TYPE_NAMES, picked.tolist(), spawned.tolist())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sky Navigator telemetry analyser")
+    parser.add_argument("paths", nargs="+", help="telemetry files (.snt) or globs")
+    parser.add_argument("--bins", type=int, default=16, help="墜落位置のヒストグラムの区間数")
+    args = parser.parse_args(argv)
+
+    paths = [p for pattern in args.paths for p in (sorted(glob.glob(pattern)) or [pattern])]
+    summary = TelemetrySummary(args.bins)
+    started = time.perf_counter()
+    failed = 0
+    for path in paths:
+        try:
+            summary.add_file(path)
+        except (OSError, TelemetryError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            failed += 1
+    summary.report()
+    events = int(summary.events.sum())
+    elapsed = time.perf_counter() - started
+    print(f"\n{events:,} events in {elapsed:.2f}s ({events / max(elapsed, 1e-9):,.0f} events/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
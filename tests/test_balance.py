@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import balance
+
+
+def run(tmp_path, *extra):
+    output = tmp_path / "results.jsonl"
+    argv = ["--games", "4", "--shard-size", "2", "--policies", "random", "--workers", "1",
+            "--output", str(output), "--summary", str(tmp_path / "summary.json"), *extra]
+    assert balance.main(argv) == 0
+    with open(output, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("stages, message", [
+    ([[30, {"coin": 1}]], "negative threshold"),
+    ([[-1, {"ruby": 1}]], "unknown item"),
+    ([[-1, {"coin": 0}]], "positive number"),
+    ([[-1, {}]], "no items"),
+    ([["x", {"coin": 1}]], "not an integer"),
+    ([-1], "list of"),
+])
+def test_bad_item_weights_are_rejected(stages, message):
+    with pytest.raises(ValueError, match=message):
+        balance.parse_item_weights("v", stages)
+
+
+def test_bad_variants_file_is_a_usage_error(tmp_path, capsys):
+    path = tmp_path / "variants.json"
+    path.write_text(json.dumps({"late": {"item_weights": [[30, {"coin": 1}]]}}))
+    with pytest.raises(SystemExit):
+        balance.main(["--variants-file", str(path)])
+    assert "late: item_weights" in capsys.readouterr().err
+
+
+def test_resume_reruns_shards_when_settings_change(tmp_path):
+    rows = run(tmp_path, "--max-ticks", "60")
+    assert len(rows) == 4
+    assert len(run(tmp_path, "--max-ticks", "60", "--resume")) == 4
+    # 打ち切りティック数を変えたら出力済みのシャードを使い回さない
+    rows = run(tmp_path, "--max-ticks", "90", "--resume")
+    assert len(rows) == 8
+    assert len({row["settings"] for row in rows}) == 2
+    with open(tmp_path / "summary.json", encoding="utf-8") as f:
+        assert [group["games"] for group in json.load(f)["groups"]] == [4]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import collision
+from collision import collide_all
+from entities import EntityStore
+
+
+def flat_collide(store, x, y, w, h):
+    return [i for i, (ex, ey, ew, eh, _) in enumerate(store.rows())
+            if ex < x + w and x < ex + ew and ey < y + h and y < ey + eh]
+
+
+@pytest.fixture
+def sweep_always(monkeypatch):
+    # 少ない件数でもスイープ側の二分探索を通す
+    monkeypatch.setattr(collision, "SWEEP_MIN", 0)
+
+
+def test_sweep_matches_a_plain_scan(sweep_always):
+    rng = np.random.default_rng(0)
+    store = EntityStore()
+    ys = np.sort(rng.integers(-50, 600, 300))[::-1]
+    for x, y, h in zip(rng.integers(0, 780, 300).tolist(), ys.tolist(), rng.integers(10, 60, 300).tolist()):
+        store.add(x, y, 40, h)
+    assert store.y_sorted
+    for px, py in zip(rng.integers(0, 800, 200).tolist(), rng.integers(-60, 620, 200).tolist()):
+        assert collide_all(store, px, py, 24, 50) == flat_collide(store, px, py, 24, 50)
+
+
+def test_sweep_edges_touching_do_not_collide(sweep_always):
+    store = EntityStore()
+    for y in range(400, 0, -10):
+        store.add(100, y, 40, 10)
+    # 上端・下端がちょうど接するだけの要素は含まない
+    assert collide_all(store, 100, 200, 40, 10) == [20]
+    assert collide_all(store, 100, 195, 40, 10) == [20, 21]
+    assert collide_all(store, 100, 410, 40, 10) == []
+    assert collide_all(store, 100, 0, 40, 10) == []
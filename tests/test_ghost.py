@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from ghost import GhostRecorder, GhostStore, GhostTrack, best_ghosts
+
+
+def recorded(xs):
+    recorder = GhostRecorder()
+    for x in xs:
+        recorder.record(x)
+    return recorder
+
+
+def ghost_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".sng"))
+
+
+def test_store_drops_leftover_ghosts_on_start(tmp_path):
+    directory = str(tmp_path)
+    store = GhostStore(directory, 5, background=False)
+    for seq, score in enumerate([30, 10, 50, 20, 40]):
+        store.save(recorded([100, 110]), seq, score, f"p{seq}")
+    store.close()
+
+    # 以前に多めに残った軌跡は、次の起動で上位分だけにする
+    store = GhostStore(directory, 2, background=False)
+    assert [(score, seq) for score, seq, _, _ in store.best] == [(50, 2), (40, 4)]
+    assert ghost_files(directory) == ["000000000002.sng", "000000000004.sng"]
+    store.close()
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_store_keeps_only_the_top_runs(tmp_path, background):
+    directory = str(tmp_path)
+    store = GhostStore(directory, 2, background=background)
+    assert store.save(recorded([100, 104, 98]), 1, 30, "a")
+    assert store.save(recorded([200]), 2, 10, "b")
+    # 圏外のプレイ（同点なら後の方が下）は書かない
+    assert not store.save(recorded([300]), 3, 10, "c")
+    assert store.save(recorded([400, 401]), 4, 50, "d")
+    store.wait()
+
+    assert [(score, seq, name) for score, seq, _, name in store.best] == [(50, 4, "d"), (30, 1, "a")]
+    assert ghost_files(directory) == ["000000000001.sng", "000000000004.sng"]
+    assert best_ghosts(directory, 5) == store.best
+    track = GhostTrack(store.best[1][2])
+    assert [track.values[i] for i in range(track.ticks)] == [100, 4, -6]
+    track.close()
+    store.close()
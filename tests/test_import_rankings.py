@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+import import_rankings
+from import_rankings import ImportFormatError, Importer, JsonStream
+from leaderboard import Leaderboard
+
+
+def make_records(n, pad=0):
+    return [{"name": f"p{i}", "score": i, "time": i % 300, "date": "01-01 00:00", "pad": "x" * pad}
+            for i in range(n)]
+
+
+def read_all(text):
+    return list(JsonStream(io.StringIO(text)).records())
+
+
+def test_large_first_object_after_leading_whitespace():
+    # 先頭の空白を読み飛ばしたあと、丸ごと読めない大きさの {"Items": [...]} が
+    # チャンクをまたぐ。読み足しで buffer がずれても、キーごとの読み直しは先頭から始まる
+    records = make_records(80000, pad=80)
+    text = "  \n" + json.dumps({"Items": records})
+    assert len(text) > 2 * import_rankings.WHOLE_VALUE_CHARS
+    assert read_all(text) == records
+
+
+def test_records_across_chunk_boundaries(monkeypatch):
+    # チャンクを数文字にして、数値・文字列・キーの途中で必ず切れるようにする
+    records = make_records(50)
+    typed = [{"Item": {"playerName": {"S": r["name"]}, "score": {"N": str(r["score"])},
+                       "time": {"N": str(r["time"])}}} for r in records]
+    text = ("  \n" + json.dumps(records) + "\n"
+            + "\n".join(json.dumps(item) for item in typed) + "\n"
+            + json.dumps({"Items": records}) + "\n"
+            + json.dumps({"skyNavigatorRanking": json.dumps(records)}))
+    expected = read_all(text)
+    assert len(expected) == 4 * len(records)
+    for chunk in (1, 3, 7, 64):
+        monkeypatch.setattr(import_rankings, "CHUNK_CHARS", chunk)
+        monkeypatch.setattr(import_rankings, "WHOLE_VALUE_CHARS", 100)
+        assert read_all(text) == expected
+
+
+def test_number_split_at_end_of_chunk(monkeypatch):
+    monkeypatch.setattr(import_rankings, "CHUNK_CHARS", 2)
+    stream = JsonStream(io.StringIO("12345 6"))
+    assert stream.value() == 12345
+    assert stream.value() == 6
+
+
+def test_truncated_input_is_an_error(monkeypatch):
+    monkeypatch.setattr(import_rankings, "CHUNK_CHARS", 5)
+    with pytest.raises(ImportFormatError):
+        read_all(json.dumps(make_records(3))[:-10])
+
+
+def test_import_across_chunks_is_idempotent(tmp_path, monkeypatch):
+    monkeypatch.setattr(import_rankings, "CHUNK_CHARS", 7)
+    monkeypatch.setattr(import_rankings, "WHOLE_VALUE_CHARS", 100)
+    path = tmp_path / "scan.json"
+    path.write_text("  \n" + json.dumps({"Items": make_records(500)}), encoding="utf-8")
+    data = tmp_path / "data"
+
+    for expected in (500, 0):
+        leaderboard = Leaderboard(str(data), k=5, background=False)
+        importer = Importer(leaderboard, batch_size=64, progress=60)
+        importer.remember_existing()
+        importer.import_file(str(path))
+        leaderboard.close()
+        assert importer.stats["imported"] == expected
+        assert importer.stats["records"] == 500
+    assert [entry["score"] for entry in leaderboard.top()] == [499, 498, 497, 496, 495]
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from leaderboard import Leaderboard, history_paths, iter_log, make_entry
+
+
+def entries(scores, name="p"):
+    return [make_entry(f"{name}{i}", score, i) for i, score in enumerate(scores)]
+
+
+def all_logged(directory):
+    paths = history_paths(directory) + [os.path.join(directory, "scores.log")]
+    return [record for path in paths for record, _ in iter_log(path)]
+
+
+def test_compact_twice_in_a_row_keeps_every_segment(tmp_path):
+    directory = str(tmp_path)
+    leaderboard = Leaderboard(directory, k=3, background=False)
+    leaderboard.submit_many(entries([5, 9, 1]))
+    leaderboard.compact()
+    # 間に登録がなくても、前の過去ログを空のログで上書きしない
+    leaderboard.compact()
+    leaderboard.submit_many(entries([7, 3], name="q"))
+    leaderboard.compact()
+    leaderboard.compact()
+    leaderboard.close()
+
+    assert [os.path.basename(p) for p in history_paths(directory)] == \
+        ["scores-000000000003.log", "scores-000000000005.log"]
+    assert [record["seq"] for record in all_logged(directory)] == [1, 2, 3, 4, 5]
+
+    reopened = Leaderboard(directory, k=3, background=False)
+    assert [entry["score"] for entry in reopened.top()] == [9, 7, 5]
+    assert reopened.next_seq == 6
+    reopened.close()
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_rotation_by_size_keeps_every_record(tmp_path, background):
+    directory = str(tmp_path)
+    leaderboard = Leaderboard(directory, k=5, rotate_bytes=256, background=background)
+    for entry in entries(range(200)):
+        leaderboard.submit(entry)
+    leaderboard.close()
+
+    if not background:
+        assert len(history_paths(directory)) > 10
+    assert sorted(record["seq"] for record in all_logged(directory)) == list(range(1, 201))
+    reopened = Leaderboard(directory, k=5, background=False, index=True)
+    assert [entry["score"] for entry in reopened.top()] == [199, 198, 197, 196, 195]
+    assert reopened.index.run_count() == 200
+    reopened.close()
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    directory = str(tmp_path)
+    leaderboard = Leaderboard(directory, k=3, background=False)
+    leaderboard.submit_many(entries([4, 8]))
+    leaderboard.close()
+    log_path = os.path.join(directory, "scores.log")
+    size = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:
+        f.write(b'{"seq": 3, "entry": {"na')
+
+    reopened = Leaderboard(directory, k=3, background=False)
+    assert os.path.getsize(log_path) == size
+    assert [entry["score"] for entry in reopened.top()] == [8, 4]
+    assert reopened.submit(make_entry("late", 6, 1)) == 3
+    reopened.close()
+    assert [record["seq"] for record in all_logged(directory)] == [1, 2, 3]
+
+
+
+def test_snapshot_only_holds_written_records(tmp_path):
+    directory = str(tmp_path)
+    leaderboard = Leaderboard(directory, k=2, background=False)
+    leaderboard.submit_many(entries([5, 9]))
+    # 登録済みで書き込み待ちの記録（submit の前半だけ）があるときにスナップショットを書き、
+    # そのまま落ちたことにする
+    with leaderboard.lock:
+        leaderboard._push(make_entry("queued", 20, 1), leaderboard.next_seq)
+        leaderboard.next_seq += 1
+    assert [entry["score"] for entry in leaderboard.top()] == [20, 9]
+    leaderboard.write_snapshot()
+    leaderboard.log.close()
+
+    reopened = Leaderboard(directory, k=2, background=False, index=True)
+    assert [entry["score"] for entry in reopened.top()] == [9, 5]
+    assert reopened.index.run_count() == 2
+    assert reopened.submit(make_entry("next", 1, 1)) == 3
+    reopened.close()
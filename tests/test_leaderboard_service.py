@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from leaderboard import Leaderboard, make_entry
+from leaderboard_service import MAX_BODY, LeaderboardService, RequestError, read_request
+
+
+def parse(raw, limit=2 ** 16):
+    async def run():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(run())
+
+
+def test_request_is_parsed():
+    method, path, query, headers, body = parse(
+        b"POST /scores?x=1 HTTP/1.1\r\nHost: a\r\nContent-Length: 2\r\n\r\n{}")
+    assert (method, path, query, body) == ("POST", "/scores", {"x": ["1"]}, b"{}")
+    assert headers["host"] == "a"
+
+
+def test_closed_connection_returns_none():
+    assert parse(b"") is None
+    assert parse(b"GET / HTTP/1.1\r\n") is None
+    assert parse(b"POST /scores HTTP/1.1\r\nContent-Length: 10\r\n\r\n{}") is None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"GET /ranking\r\n\r\n", 400),
+    (b"GET / HTTP/1.1\r\nno colon\r\n\r\n", 400),
+    (b"POST /scores HTTP/1.1\r\nContent-Length: abc\r\n\r\n", 400),
+    (b"POST /scores HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (f"POST /scores HTTP/1.1\r\nContent-Length: {MAX_BODY + 1}\r\n\r\n".encode(), 413),
+    (b"GET / HTTP/1.1\r\nX: " + b"a" * 300 + b"\r\n\r\n", 431),
+])
+def test_bad_requests_get_a_status(raw, status):
+    with pytest.raises(RequestError) as info:
+        parse(raw, limit=256)
+    assert info.value.status == status
+
+
+@pytest.mark.parametrize("score, time_survived", [(True, 1), (1, False), (-1, 1), (1.5, 1), ("3", 1)])
+def test_make_entry_rejects_non_integers(score, time_survived):
+    with pytest.raises(ValueError):
+        make_entry("p", score, time_survived)
+
+
+def etag_of(response):
+    head = response.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+    return next(line.split(":", 1)[1].strip() for line in head.split("\r\n")
+                if line.lower().startswith("etag:"))
+
+
+def test_etag_from_before_a_restart_does_not_match_other_content(tmp_path):
+    first = Leaderboard(str(tmp_path / "a"), k=5, background=False)
+    first.submit(make_entry("p", 5, 1, date="2024-01-01"))
+    response = LeaderboardService(first).ranking(5, None)
+    old_etag = etag_of(response)
+    assert LeaderboardService(first).ranking(5, old_etag).startswith(b"HTTP/1.1 304")
+    first.close()
+
+    # 版の番号は同じでも中身が違えば 304 にしない
+    second = Leaderboard(str(tmp_path / "b"), k=5, background=False)
+    second.submit(make_entry("q", 7, 1, date="2024-01-01"))
+    assert second.version == first.version
+    assert LeaderboardService(second).ranking(5, old_etag).startswith(b"HTTP/1.1 200")
+    second.close()
@@ -0,0 +1,115 @@
+import bisect
+import random
+
+import pytest
+
+import rank_index
+from rank_index import RankIndex, SortedKeyList
+
+
+def check_against(keys, reference):
+    assert len(keys) == len(reference)
+    assert keys.slice(0, len(keys)) == reference
+    for position in {0, len(reference) - 1, len(reference) // 2} if reference else ():
+        assert keys[position] == reference[position]
+    for probe in set(reference) | {-1, 10 ** 9}:
+        assert keys.bisect_left(probe) == bisect.bisect_left(reference, probe)
+        assert keys.bisect_right(probe) == bisect.bisect_right(reference, probe)
+
+
+@pytest.fixture
+def small_buckets(monkeypatch):
+    # バケットの境目（分割・空になったバケットの削除）を少ない件数で踏むために小さくする
+    monkeypatch.setattr(rank_index, "BUCKET_SIZE", 2)
+
+
+def test_sorted_key_list_matches_a_sorted_list(small_buckets):
+    rng = random.Random(0)
+    reference = sorted(rng.randrange(50) for _ in range(9))
+    keys = SortedKeyList()
+    keys.update(reference)
+    for step in range(600):
+        if reference and rng.random() < 0.4:
+            key = rng.choice(reference)
+            keys.remove(key)
+            reference.remove(key)
+        else:
+            key = rng.randrange(50)
+            keys.add(key)
+            bisect.insort(reference, key)
+        if step % 20 == 0:
+            check_against(keys, reference)
+    check_against(keys, reference)
+    with pytest.raises(KeyError):
+        keys.remove(1000)
+    with pytest.raises(IndexError):
+        keys[len(keys)]
+
+
+@pytest.mark.parametrize("size", [1023, 1024, 1025, 2048, 2049, 4097])
+def test_positions_around_real_bucket_sizes(size):
+    keys = SortedKeyList()
+    keys.update(range(0, 2 * size, 2))
+    reference = list(range(0, 2 * size, 2))
+    for boundary in range(0, size + 1, rank_index.BUCKET_SIZE):
+        for position in (boundary - 1, boundary, boundary + 1):
+            if 0 <= position < size:
+                assert keys[position] == reference[position]
+                assert keys.bisect_left(reference[position]) == position
+                assert keys.bisect_left(reference[position] + 1) == position + 1
+        assert keys.slice(boundary - 2, boundary + 2) == reference[max(boundary - 2, 0):boundary + 2]
+    # 一件ずつの追加でバケットが分割される境目（2 * BUCKET_SIZE + 1 件）も越える
+    for key in range(1, 2 * size, 2):
+        keys.add(key)
+    assert keys.slice(0, len(keys)) == list(range(2 * size))
+    assert [keys[i] for i in range(0, 2 * size, 997)] == list(range(0, 2 * size, 997))
+
+
+def test_run_rank_with_ties_across_buckets(small_buckets):
+    index = RankIndex()
+    scores = [100, 90, 90, 90, 90, 90, 80, 70, 70, 0]
+    index.add_many(({"name": f"p{seq}", "score": score}, seq) for seq, score in enumerate(scores, 1))
+    # これから登録する得点は同点の既存記録より下
+    assert index.run_rank(101) == 1
+    assert index.run_rank(100) == 2
+    assert index.run_rank(90) == 7
+    assert index.run_rank(85) == 7
+    assert index.run_rank(70) == 10
+    assert index.run_rank(0) == 11
+    # 登録済みのプレイは同点なら先に登録した方が上
+    assert [index.run_rank(90, seq) for seq in range(2, 7)] == [2, 3, 4, 5, 6]
+    assert index.run_rank(0, 10) == 10
+
+
+def test_player_best_page_and_window_at_the_edges(small_buckets):
+    index = RankIndex()
+    for seq, (name, score) in enumerate([("a", 5), ("b", 9), ("c", 7), ("a", 8), ("d", 1),
+                                         ("b", 3), ("e", 7), ("f", 6)], 1):
+        index.add({"name": name, "score": score}, seq)
+    assert index.run_count() == 8
+    assert index.player_count() == 6
+    assert index.player_best("a")["score"] == 8
+    ranking = [(rank, entry["name"]) for rank, entry in index.page(1, 10)]
+    assert ranking == [(1, "b"), (2, "a"), (3, "c"), (4, "e"), (5, "f"), (6, "d")]
+    assert [index.player_rank(name) for name in "bacefd"] == [1, 2, 3, 4, 5, 6]
+    assert index.player_rank("nobody") is None
+    assert index.window("nobody") == []
+    assert [rank for rank, _ in index.window("b", before=3, after=1)] == [1, 2]
+    assert [rank for rank, _ in index.window("d", before=2, after=3)] == [4, 5, 6]
+    assert [rank for rank, _ in index.window("c", before=1, after=1)] == [2, 3, 4]
+
+
+def test_add_and_add_many_agree(small_buckets):
+    rng = random.Random(3)
+    records = [({"name": f"p{rng.randrange(20)}", "score": rng.randrange(30)}, seq) for seq in range(1, 200)]
+    one_by_one = RankIndex()
+    for entry, seq in records:
+        one_by_one.add(entry, seq)
+    bulk = RankIndex()
+    bulk.add_many(records[:120])
+    for entry, seq in records[120:]:
+        bulk.add(entry, seq)
+    assert bulk.runs.slice(0, 200) == one_by_one.runs.slice(0, 200)
+    assert bulk.page(1, 50) == one_by_one.page(1, 50)
+    for score in range(-1, 32):
+        assert bulk.run_rank(score) == one_by_one.run_rank(score)
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from replay import (ReplayError, ReplayRecorder, decode, decode_text, encode_text, read_varint, verify,
+                    verify_submission, write_varint)
+from simulation import Simulation, random_policy
+
+
+def play(seed):
+    # 墜落するまでランダムに操作して (記録したリプレイ, 終了時の Simulation) を返す
+    sim = Simulation(seed)
+    recorder = ReplayRecorder(seed)
+    rng = random.Random(seed)
+    while not sim.game_over:
+        inputs = random_policy(sim, rng)
+        recorder.record(inputs)
+        sim.step(inputs)
+    return recorder.encode(sim.score, sim.game_time), sim
+
+
+def test_varint_round_trip():
+    out = bytearray()
+    values = [0, 1, 127, 128, 300, 2 ** 32, 2 ** 63]
+    for value in values:
+        write_varint(out, value)
+    pos = 0
+    for value in values:
+        decoded, pos = read_varint(out, pos)
+        assert decoded == value
+    assert pos == len(out)
+
+
+@pytest.mark.parametrize("seed", [1, 42, 2 ** 31 + 5])
+def test_encode_verify_round_trip(seed):
+    data, sim = play(seed)
+    record = decode(data)
+    assert (record["seed"], record["ticks"], record["score"], record["time"]) == \
+        (seed, sim.tick, sim.score, sim.game_time)
+    assert verify(data) == {"ok": True, "score": sim.score, "time": sim.game_time, "ticks": sim.tick}
+    assert decode_text(encode_text(data)) == data
+
+
+def test_wrong_claims_are_rejected():
+    data, sim = play(7)
+    assert not verify(data, claimed_score=sim.score + 10)["ok"]
+    assert not verify(data, claimed_time=sim.game_time + 1)["ok"]
+    submission = {"name": "pilot", "score": sim.score, "time": sim.game_time, "replay": encode_text(data)}
+    assert verify_submission(submission)["ok"]
+    assert not verify_submission(dict(submission, score=sim.score + 1))["ok"]
+    assert not verify_submission(dict(submission, replay="not base64!"))["ok"]
+
+
+def test_run_that_did_not_crash_is_rejected():
+    recorder = ReplayRecorder(3)
+    for _ in range(10):
+        recorder.record(0)
+    result = verify(recorder.encode(0, 0))
+    assert not result["ok"]
+    assert "crash" in result["reason"]
+
+
+def test_inputs_after_the_crash_are_rejected():
+    data, sim = play(11)
+    record = decode(data)
+    recorder = ReplayRecorder(11)
+    for length, inputs in record["inputs"]:
+        for _ in range(length):
+            recorder.record(inputs)
+    recorder.record(0)
+    assert not verify(recorder.encode(sim.score, sim.game_time))["ok"]
+
+
+def test_corrupt_data_is_rejected():
+    data, _ = play(5)
+    with pytest.raises(ReplayError):
+        decode(b"XXX" + data[3:])
+    with pytest.raises(ReplayError):
+        decode(data + b"\0")
+    assert not verify(data[:-1])["ok"]
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import telemetry
+from simulation import (EVENT_CRASH, EVENT_PICKUP, ITEM_KIND, TELEMETRY_CRASH, TELEMETRY_DESPAWN,
+                        TELEMETRY_OBSTACLE, TELEMETRY_PICKUP, TELEMETRY_SPAWN, Simulation, random_policy)
+from telemetry import TelemetryError, TelemetryRecorder, TelemetrySummary, open_records
+
+
+def play(seeds, recorder=None):
+    # ゲームを回し、(seed, score, tick) と step() が返したイベントの数を返す
+    results = []
+    counts = {EVENT_CRASH: 0, EVENT_PICKUP: 0}
+    for seed in seeds:
+        if recorder:
+            recorder.start_run()
+        sim = Simulation(seed, telemetry=recorder)
+        rng = random.Random(seed)
+        while not sim.game_over:
+            for event in sim.step(random_policy(sim, rng)):
+                counts[event[0]] += 1
+        results.append((seed, sim.score, sim.tick))
+    return results, counts
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_records_match_the_simulation(tmp_path, background):
+    recorder = TelemetryRecorder(str(tmp_path), buffer_records=64, background=background)
+    results, counts = play(range(20), recorder)
+    recorder.close()
+    # 記録してもゲームの結果は変わらない
+    assert play(range(20))[0] == results
+
+    records = open_records(recorder.path)
+    assert len(records) == recorder.stats["records"] > 64 * 3
+    assert recorder.stats["dropped"] == 0
+    event = records["event"]
+    assert (event == TELEMETRY_CRASH).sum() == counts[EVENT_CRASH] == 20
+    assert (event == TELEMETRY_PICKUP).sum() == counts[EVENT_PICKUP]
+    assert set(records["run"].tolist()) == set(range(1, 21))
+    # プレイごとに最後のレコードが墜落で、その tick は墜落したティック
+    for run, (_, _, ticks) in enumerate(results, 1):
+        mine = records[records["run"] == run]
+        assert mine["event"][-1] == TELEMETRY_CRASH
+        assert mine["tick"][-1] == ticks - 1
+    spawned = records[event == TELEMETRY_SPAWN]
+    assert set(spawned["kind"].tolist()) <= set(ITEM_KIND.values()) | {TELEMETRY_OBSTACLE}
+    # 消えたものはどれも先に生成されている
+    despawned = records[event == TELEMETRY_DESPAWN]
+    assert len(despawned) < len(spawned)
+
+
+def test_summary_is_the_same_across_chunk_boundaries(tmp_path, monkeypatch):
+    recorder = TelemetryRecorder(str(tmp_path), buffer_records=50)
+    play(range(30), recorder)
+    recorder.close()
+    whole = TelemetrySummary(bins=8)
+    whole.add_file(recorder.path)
+    monkeypatch.setattr(telemetry, "ANALYSE_CHUNK", 7)
+    chunked = TelemetrySummary(bins=8)
+    chunked.add_file(recorder.path)
+
+    assert whole.runs == chunked.runs == 30
+    assert whole.deaths_by_x.sum() == 30
+    for name in ("events", "deaths_by_x", "item_spawns", "pickups", "deaths", "entity_sum", "seconds"):
+        assert (getattr(whole, name) == getattr(chunked, name)).all(), name
+
+
+def test_playtime_per_level(tmp_path):
+    recorder = TelemetryRecorder(str(tmp_path))
+    results, _ = play(range(10), recorder)
+    recorder.close()
+    summary = TelemetrySummary()
+    summary.add_file(recorder.path)
+    # 墜落したティックまで遊んだ秒数の合計
+    assert summary.seconds.sum() == pytest.approx(sum(ticks - 1 for _, _, ticks in results) / 60)
+
+
+def test_torn_last_record_and_bad_files(tmp_path):
+    recorder = TelemetryRecorder(str(tmp_path), background=False)
+    play([1], recorder)
+    recorder.close()
+    count = len(open_records(recorder.path))
+    with open(recorder.path, "ab") as f:
+        f.write(b"\1\2\3")
+    assert len(open_records(recorder.path)) == count
+
+    other = tmp_path / "other.snt"
+    other.write_bytes(b"nope")
+    with pytest.raises(TelemetryError):
+        open_records(str(other))
+
+
+def test_no_file_without_records(tmp_path):
+    recorder = TelemetryRecorder(str(tmp_path / "telemetry"))
+    recorder.start_run()
+    recorder.close()
+    assert not (tmp_path / "telemetry").exists()
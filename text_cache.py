@@ -0,0 +1,33 @@
+from collections import OrderedDict
+
+# 文字列サーフェスのキャッシュ
+# font.render() は毎回ラスタライズするので、(フォント, 文字列, 色) ごとに
+# 描画結果を保持する。上限を超えたら最も古く使われたものから捨てる（LRU）。
+
+
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0